@@ -1,16 +1,47 @@
 from django.conf import settings
 
 
+# Models that live on their own database, mapped to the name of the
+# setting holding the alias of that database.
+MODEL_DATABASES = {
+    ('changes', 'snapshot'): 'SNAPSHOT_DB',
+    ('changes', 'archivedchange'): 'HISTORY_DB',
+    ('changes', 'archivedchangegroup'): 'HISTORY_DB',
+    ('changes', 'archivedchangegrouplink'): 'HISTORY_DB',
+}
+
+
 class GeneralRouter:
     """
     A router to control all database operations on models in the
-    spatial application.
+    spatial application and on the models listed in ``MODEL_DATABASES``.
     """
+    @staticmethod
+    def _get_model_db(app_label, model_name):
+        setting = MODEL_DATABASES.get((app_label, model_name))
+        return getattr(settings, setting) if setting is not None else None
+
+    def db_for_read(self, model, **hints):
+        """
+        Attempts to read the models in ``MODEL_DATABASES`` go to their database.
+        """
+        return self._get_model_db(model._meta.app_label, model._meta.model_name)
+
+    def db_for_write(self, model, **hints):
+        """
+        Attempts to write the models in ``MODEL_DATABASES`` go to their database.
+        """
+        return self._get_model_db(model._meta.app_label, model._meta.model_name)
+
     def allow_migrate(self, db, app_label, model_name=None, **hints):
         """
-        Make sure the auth app only appears in the settings.SPATIAL_DB
+        Make sure the spatial app only appears in the settings.SPATIAL_DB
+        database and the models in ``MODEL_DATABASES`` only appear in their
         database.
         """
         if app_label == 'spatial':
             return db == settings.SPATIAL_DB
+        model_db = self._get_model_db(app_label, model_name)
+        if model_db is not None:
+            return db == model_db
         return True
@@ -61,6 +61,7 @@ LOCAL_APPS = [
     'voto_studio_backend.users',
     'voto_studio_backend.permissions',
     'voto_studio_backend.changes',
+    'voto_studio_backend.jobs',
     'voto_studio_backend.forms',
     'voto_studio_backend.search',
     'voto_studio_backend.spatial',
@@ -68,6 +69,7 @@ LOCAL_APPS = [
     'voto_studio_backend.corruption',
     'voto_studio_backend.political',
     'voto_studio_backend.voting',
+    'voto_studio_backend.network',
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -217,6 +219,8 @@ STUDIO_DB = 'default'
 HISTORY_DB = 'history'
 MAIN_SITE_DB = 'main_site'
 SPATIAL_DB = 'spatial'
+# Change snapshots are kept out of the workshop tables, see config.router.GeneralRouter.
+SNAPSHOT_DB = env('SNAPSHOT_DB', default=STUDIO_DB)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -266,6 +270,7 @@ BASE_HIDDEN_FIELDS = (
     'rels_dict',
     'published',
     'date_last_published',
+    'date_modified',
     'location_id',
     'location_id_name',
     'views',
@@ -278,5 +283,47 @@ DATABASE_ROUTERS = ['config.router.GeneralRouter']
 
 TEXT_FIELD_DEFAULT = '<p></p>'
 
+# Every n-th snapshot of an instance stores its full state
+# rather than only the fields that changed.
+SNAPSHOT_KEYFRAME_INTERVAL = env.int('SNAPSHOT_KEYFRAME_INTERVAL', default=10)
+
+# Failed jobs are retried up to JOB_MAX_ATTEMPTS times, waiting
+# JOB_RETRY_DELAY seconds before the first retry and doubling after that.
+JOB_MAX_ATTEMPTS = env.int('JOB_MAX_ATTEMPTS', default=3)
+JOB_RETRY_DELAY = env.int('JOB_RETRY_DELAY', default=10)
+# Running jobs beat every JOB_HEARTBEAT_INTERVAL seconds. A job that hasn't beaten for
+# JOB_HEARTBEAT_TIMEOUT seconds lost its worker and is queued again by the next worker.
+JOB_HEARTBEAT_INTERVAL = env.int('JOB_HEARTBEAT_INTERVAL', default=30)
+JOB_HEARTBEAT_TIMEOUT = env.int('JOB_HEARTBEAT_TIMEOUT', default=300)
+
+# Limits of the relationship graph neighborhoods served to the workshop: how
+# many hops away from an instance, how many relationships followed from each
+# instance and how many instances returned at most.
+GRAPH_MAX_DEPTH = env.int('GRAPH_MAX_DEPTH', default=3)
+GRAPH_MAX_FAN_OUT = env.int('GRAPH_MAX_FAN_OUT', default=50)
+GRAPH_MAX_NODES = env.int('GRAPH_MAX_NODES', default=500)
+
+# The in-memory relationship network is built from the many to many fields
+# of the models of NETWORK_APPS. It refuses to hold more than
+# NETWORK_GRAPH_MAX_EDGES relationships and is refreshed from the committed
+# changes at most every NETWORK_GRAPH_REFRESH_INTERVAL seconds.
+NETWORK_APPS = ('political', 'corruption')
+NETWORK_GRAPH_MAX_EDGES = env.int('NETWORK_GRAPH_MAX_EDGES', default=5000000)
+NETWORK_GRAPH_REFRESH_INTERVAL = env.int('NETWORK_GRAPH_REFRESH_INTERVAL', default=60)
+
+# An outbox entry whose document fails to index OUTBOX_MAX_ATTEMPTS times is
+# parked, so it no longer holds back the entries queued after it.
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=5)
+
+# Each instance gives the autocomplete at most AUTOCOMPLETE_MAX_INPUTS inputs, which
+# are indexed by their prefixes of up to AUTOCOMPLETE_MAX_GRAM characters. Suggestions
+# come from Elasticsearch unless it takes longer than AUTOCOMPLETE_TIMEOUT seconds,
+# then from a prefix trie each process rebuilds from the database at most every
+# AUTOCOMPLETE_TRIE_REFRESH_INTERVAL seconds.
+AUTOCOMPLETE_MAX_INPUTS = env.int('AUTOCOMPLETE_MAX_INPUTS', default=5)
+AUTOCOMPLETE_MAX_GRAM = env.int('AUTOCOMPLETE_MAX_GRAM', default=15)
+AUTOCOMPLETE_TIMEOUT = env.float('AUTOCOMPLETE_TIMEOUT', default=0.3)
+AUTOCOMPLETE_TRIE_REFRESH_INTERVAL = env.int('AUTOCOMPLETE_TRIE_REFRESH_INTERVAL', default=300)
+
 NUMBER_OF_SHARDS = env('NUMBER_OF_SHARDS', default=1)
 NUMBER_OF_REPLICAS = env('NUMBER_OF_REPLICAS', default=0)
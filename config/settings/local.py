@@ -118,6 +118,8 @@ DATABASES = {
     },
 }
 
+SNAPSHOT_DB = HISTORY_DB  # noqa F405
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -88,6 +88,21 @@ DATABASES = {
             'DEPENDENCIES': [],
         },
         'ATOMIC_REQUESTS': True,
+    },
+    'history': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'OPTIONS': {
+            'options': '-c search_path=history,public',
+        },
+        'NAME': env('DJANGO_DATABASE_NAME'),
+        'USER': env('DJANGO_DATABASE_USER'),
+        'PASSWORD': env('DJANGO_DATABASE_PASSWORD'),
+        'HOST': env('DJANGO_DATABASE_HOST'),
+        'PORT': env('DJANGO_DATABASE_PORT'),
+        'TEST': {
+            'NAME': 'history',
+            'DEPENDENCIES': [],
+        },
     }
 }
 
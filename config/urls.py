@@ -32,6 +32,14 @@ urlpatterns = [
         'media/',
         include('voto_studio_backend.media.urls', namespace='media'),
     ),
+    path(
+        'search/',
+        include('voto_studio_backend.search.urls', namespace='search'),
+    ),
+    path(
+        'network/',
+        include('voto_studio_backend.network.urls', namespace='network'),
+    ),
 ] + static(
     settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
 )
@@ -1,12 +1,11 @@
-import copy
 import math
 import pandas as pd
 import re
 
 from django.conf import settings
-from django.db.models.fields.related import ManyToOneRel
 from django.test import RequestFactory
-from voto_studio_backend.changes.models import Change, Statistics, get_rels_dict_default
+from voto_studio_backend.changes.models import Change, Statistics
+from voto_studio_backend.changes.utils import migrate_rels_dict
 from voto_studio_backend.political.models import Individual, Law, Organization, Controversy
 from voto_studio_backend.users.models import User
 
@@ -311,76 +310,11 @@ class UpdateError(Exception):
 
 
 def update_rels_dict(model_class, using=settings.STUDIO_DB):
-    user = User.objects.get(email='migration@bot.com')
-    request = RequestFactory()
-    request.user = user
-    instances = model_class.objects.using(using).filter(tracked=True)
-    if not instances.count():
-        raise UpdateError(f"No '{model_class._meta.label}' instances")
-    for index, instance in enumerate(instances):
-        if not index % math.ceil(instances.count() / 10):
-            print(f'{round(index / instances.count() * 100)}%')
-        rels_dict = copy.deepcopy(instance.rels_dict)
-        for key in list(rels_dict.keys()):
-            if not FIELD_MODEL_MAP[key].startswith('media'):
-                rels_dict[key].update({
-                    'model_label': FIELD_MODEL_MAP[key],
-                    'type': instance._meta.get_field(key).get_internal_type(),
-                })
-            else:
-                rels_dict.pop(key)
-
-        if not instance.rels_dict == rels_dict:
-            print('Updating rels_dict on ', instance)
-            instance.rels_dict = rels_dict
-            instance.save(using=settings.STUDIO_DB)
-            Change.objects.stage_updated(instance, request)
-    print('100%')
+    return migrate_rels_dict(model_class, using=using, logging=True)
 
 
 def rebuild_rels_dict(model_class, using=settings.STUDIO_DB, to_index=True):
-    instances = model_class.objects \
-        .using(using) \
-        .filter(tracked=True)
-
-    if not instances.count():
-        print('No instances')
-        return
-    for index, instance in enumerate(instances):
-        if not index % math.ceil(instances.count() / 10):
-            print(f'{round(index / instances.count() * 100)}%')
-        rels_dict = {}
-        for field in model_class.objects._get_fields():
-            if field.name not in instance.rels_dict.keys():
-                rels_dict.update({
-                    field.name: get_rels_dict_default(field=field),
-                })
-            else:
-                field_type = field.get_internal_type()
-                inner_rels_dict = get_rels_dict_default(field=field)
-                if field_type == 'OneToOneField':
-                    id_ = getattr(getattr(instance, field.name, None), 'id', None)
-                    inner_rels_dict['id'] = id_
-                elif field_type == 'ForeignKey':
-                    if isinstance(field, ManyToOneRel):
-                        ids = [obj.id for obj in getattr(instance, f'{field.name}_set').filter(tracked=True)]
-                    else:
-                        ids = getattr(getattr(instance, field.name, None), 'id', None)
-                        ids = [ids] if ids is not None else []
-                    inner_rels_dict['ids'] = ids
-                elif field_type == 'ManyToManyField':
-                    ids = [obj.id for obj in getattr(instance, field.name).all()]
-                    inner_rels_dict['rels'] = ids
-
-                rels_dict[field.name] = inner_rels_dict
-
-        instance.rels_dict = rels_dict
-        instance.save(using=using, to_index=to_index)
-        user = User.objects.get(email='migration@bot.com')
-        request = RequestFactory()
-        request.user = user
-        Change.objects.stage_updated(instance, request)
-    print('100%')
+    return migrate_rels_dict(model_class, using=using, to_index=to_index, logging=True)
 
 
 def remove_field_from_rels_dict(model_class, field_name):
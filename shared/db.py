@@ -0,0 +1,113 @@
+import io
+
+from django.db import connections
+
+
+def bulk_upsert(model_class, instances, using, unique_fields=None, preserved_fields=(), batch_size=500):
+    """
+    Insert or update a list of instances using ``INSERT ... ON CONFLICT DO UPDATE``
+    statements, one per batch. By default conflicts are detected on the primary key,
+    which must already be set. If ``unique_fields`` is given conflicts are detected on
+    those fields instead and the primary key is left to the database. An instance must
+    not appear twice in the same call. The fields in ``preserved_fields`` are only
+    written when a row is inserted, existing rows keep their values. Like ``bulk_create``,
+    ``save()`` is not called and no signals are sent.
+    """
+    if not len(instances):
+        return
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    fields = model_class._meta.concrete_fields
+    if unique_fields is None:
+        conflict_columns = [model_class._meta.pk.column]
+    else:
+        fields = [field for field in fields if not field.primary_key]
+        conflict_columns = [model_class._meta.get_field(name).column for name in unique_fields]
+
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    updates = ', '.join(f'{quote_name(field.column)} = EXCLUDED.{quote_name(field.column)}'
+                        for field in fields if not (field.primary_key or field.column in conflict_columns or
+                                                    field.name in preserved_fields))
+    row_placeholder = f'({", ".join(["%s"] * len(fields))})'
+    conflict = ', '.join(quote_name(column) for column in conflict_columns)
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(instances), batch_size):
+            batch = instances[i:i + batch_size]
+            params = []
+            for instance in batch:
+                params.extend(field.get_db_prep_save(field.pre_save(instance, False), connection)
+                              for field in fields)
+            cursor.execute(
+                f'INSERT INTO {quote_name(model_class._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([row_placeholder] * len(batch))} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def copy_rows(source_model, destination_model, column, values, source, destination):
+    """
+    Copy the rows of ``source_model`` whose ``column`` is in ``values`` from the ``source``
+    database into the table of ``destination_model`` on the ``destination`` database.
+    Rows are streamed with ``COPY ... TO STDOUT`` and ``COPY ... FROM STDIN`` rather than
+    being built into instances. Every column of ``destination_model`` must also exist on
+    ``source_model``. Like ``bulk_create``, no signals are sent.
+    """
+    if not len(values):
+        return
+
+    source_connection = connections[source]
+    quote_name = source_connection.ops.quote_name
+    columns = ', '.join(quote_name(field.column) for field in destination_model._meta.concrete_fields)
+
+    buffer = io.StringIO()
+    with source_connection.cursor() as cursor:
+        query = cursor.mogrify(
+            f'SELECT {columns} FROM {quote_name(source_model._meta.db_table)} '
+            f'WHERE {quote_name(column)} IN %s',
+            [tuple(values)],
+        ).decode()
+        cursor.copy_expert(f'COPY ({query}) TO STDOUT', buffer)
+
+    buffer.seek(0)
+    with connections[destination].cursor() as cursor:
+        cursor.copy_expert(f'COPY {quote_name(destination_model._meta.db_table)} ({columns}) FROM STDIN', buffer)
+
+
+def bulk_update(model_class, instances, fields, using, batch_size=500):
+    """
+    Update ``fields`` on a list of instances with one ``UPDATE ... FROM (VALUES ...)``
+    statement per batch, matching rows on the primary key. Like ``QuerySet.update``,
+    ``save()`` is not called and no signals are sent.
+    """
+    if not len(instances):
+        return
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    pk = model_class._meta.pk
+    fields = [model_class._meta.get_field(name) for name in fields]
+    table = quote_name(model_class._meta.db_table)
+
+    columns = ', '.join(quote_name(field.column) for field in [pk, *fields])
+    updates = ', '.join(f'{quote_name(field.column)} = v.{quote_name(field.column)}' for field in fields)
+    # The values need explicit types, e.g. jsonb, as Postgres can't infer them from the placeholders.
+    row_placeholder = f'(%s::{pk.rel_db_type(connection)}, ' \
+                      f'{", ".join(f"%s::{field.db_type(connection)}" for field in fields)})'
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(instances), batch_size):
+            batch = instances[i:i + batch_size]
+            params = []
+            for instance in batch:
+                params.append(pk.get_db_prep_save(instance.pk, connection))
+                params.extend(field.get_db_prep_save(getattr(instance, field.attname), connection)
+                              for field in fields)
+            cursor.execute(
+                f'UPDATE {table} SET {updates} '
+                f'FROM (VALUES {", ".join([row_placeholder] * len(batch))}) AS v ({columns}) '
+                f'WHERE {table}.{quote_name(pk.column)} = v.{quote_name(pk.column)}',
+                params,
+            )
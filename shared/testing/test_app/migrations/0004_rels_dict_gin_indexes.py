@@ -0,0 +1,19 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0003_basicmodel_views'),
+    ]
+
+    # ``jsonb_path_ops`` GIN indexes serve the ``@>`` containment
+    # queries of ``TrackedWorkshopModelManager.referencing()``.
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX test_app_basicmodel_rels_dict_gin ON test_app_basicmodel USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX test_app_basicmodel_rels_dict_gin',
+        ),
+    ]
@@ -19,6 +19,22 @@ def hidden_fields(fields_tuple=(), defaults=True):
         return fields_tuple
 
 
+def get_int_param(request, name, default=None, maximum=None):
+    """
+    Read the integer query parameter ``name``, clamped to ``1..maximum`` when ``maximum``
+    is given. Raises ``ValueError`` if the parameter is missing or isn't an integer.
+    """
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer.")
+
+    if maximum is not None:
+        value = max(1, min(value, maximum))
+
+    return value
+
+
 def create_slice(page, size):
     page = int(page)
     size = int(size)
@@ -2,4 +2,6 @@ from config.admin import register_models
 
 register_models(app_label='changes', models={
     'Change': ['default'],
+    'ArchivedChange': ['history'],
+    'ArchivedChangeGroup': ['history'],
 })
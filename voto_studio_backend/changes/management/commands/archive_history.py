@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from voto_studio_backend.changes.models import archive_history
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--days', action='store', dest='days', type=int, default=90,
+                            help='Archive the history committed more than this many days ago')
+        parser.add_argument('--batch_size', action='store', dest='batch_size', type=int, default=1000,
+                            help='The maximum number of change groups or changes moved per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options.get('days'))
+
+        self.stdout.write(f'Archiving the history committed before {cutoff:%Y-%m-%d %H:%M}...')
+        archived = archive_history(cutoff, batch_size=max(options.get('batch_size'), 1), logging=True)
+
+        self.stdout.write(f'Successfully archived {archived} changes.')
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...models import TrackedWorkshopModel
+from ...utils import build_relationships
+from shared.utils import get_model
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--using', action='store', dest='using', default=settings.STUDIO_DB,
+                            help='The DB to act on')
+        parser.add_argument('--model_label', action='store', dest='model_label',
+                            help='The model to build relationships for, all tracked models by default')
+        parser.add_argument('--batch_size', action='store', dest='batch_size', default=500,
+                            help='Number of instances read per batch')
+
+    def handle(self, *args, **options):
+        model_label = options.get('model_label')
+        if model_label is not None:
+            model_classes = [get_model(model_label=model_label)]
+        else:
+            model_classes = [get_model(model_label=label) for label in settings.WORKSHOP_MODELS]
+            model_classes = [m for m in model_classes if issubclass(m, TrackedWorkshopModel)]
+
+        for model_class in model_classes:
+            self.stdout.write(f'Building relationships for {model_class._meta.label}')
+            count = build_relationships(model_class, using=options.get('using'),
+                                        batch_size=int(options.get('batch_size')), logging=True)
+            self.stdout.write(f'Wrote {count} relationships.')
+
+        self.stdout.write('Successfully built relationships.')
@@ -1,10 +1,14 @@
 import math
+import time
+from multiprocessing import Pool
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
-from django.http import Http404
+from django.db import connections
+from django.utils import timezone
 
 from voto_studio_backend.changes.models import Change
+from voto_studio_backend.changes.utils import partition_changes, get_pending_partitions, commit_partitions
 
 
 def parse_bool(string):
@@ -15,6 +19,15 @@ def parse_bool(string):
     raise ValueError(f"Must be either 'True' or 'False'. Got {string}")
 
 
+def _init_worker():
+    # Each worker process needs its own database connections.
+    connections.close_all()
+
+
+def _commit_batch(args):
+    return commit_partitions(*args)
+
+
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--bypass', action='store', dest='bypass', help='Bypass the confirmation step')
@@ -22,6 +35,11 @@ class Command(BaseCommand):
         parser.add_argument('--committed', action='store', dest='committed', help='Commit state of the instances')
         parser.add_argument('--to_index', action='store', dest='to_index', help='Should ElasticSearch index this?')
         parser.add_argument('--base', action='store', dest='base', help='Commit the base instance?')
+        parser.add_argument('--processes', action='store', dest='processes', type=int, default=1,
+                            help='Number of processes to commit with')
+        parser.add_argument('--batch_size', action='store', dest='batch_size', type=int, default=100,
+                            help='Number of instances committed per batch')
+        parser.add_argument('--run', action='store', dest='run', help='Name of the run to resume')
 
     def handle(self, *args, **options):
         user = options.get('user')
@@ -41,21 +59,60 @@ class Command(BaseCommand):
         if not committed == 'all':
             filter_kwargs.update({'committed': committed})
 
-        if confirm:
-            changes = Change.objects \
-                .filter(**filter_kwargs) \
-                .order_by('date_created')
-            change_count = changes.count()
-            for index, change in enumerate(changes):
-                if not index % math.ceil(change_count / 10):
-                    print(f'{round(index / change_count * 100)}%')
-                try:
-                    change.commit(
-                        to_index=parse_bool(options.get('to_index')),
-                        commit_base=parse_bool(options.get('base')),
-                    )
-                except Exception as e:
-                    print('Skipped', change, ' | ', e)
-            self.stdout.write(f'Committed {changes.count()} instances.')
-        else:
+        if not confirm:
             self.stdout.write('Cancelled.')
+            return
+
+        run = options.get('run') or f'bulk_commit-{timezone.now():%Y%m%d%H%M%S}'
+        to_index = parse_bool(options.get('to_index'))
+        commit_base = parse_bool(options.get('base'))
+        processes = max(options.get('processes'), 1)
+        batch_size = max(options.get('batch_size'), 1)
+
+        changes = Change.objects \
+            .filter(**filter_kwargs) \
+            .order_by('date_created', 'id')
+        partitions = partition_changes(changes)
+        pending_partitions = get_pending_partitions(partitions, run)
+        change_count = sum(len(change_ids) for change_ids in pending_partitions.values())
+
+        self.stdout.write(f"Run '{run}': {len(pending_partitions)} of {len(partitions)} instances "
+                          f"({change_count} changes) left to commit with {processes} process(es).")
+        if not change_count:
+            self.stdout.write('Nothing to commit.')
+            return
+
+        keys = list(pending_partitions.keys())
+        batches = [
+            (run, {key: pending_partitions[key] for key in keys[i:i + batch_size]}, to_index, commit_base)
+            for i in range(0, len(keys), batch_size)
+        ]
+
+        start = time.time()
+        total_committed = 0
+        step = math.ceil(len(batches) / 10)
+
+        def _report(index, result):
+            nonlocal total_committed
+            batch_committed, errors = result
+            total_committed += batch_committed
+            for error in errors:
+                print(error)
+            if not index % step:
+                elapsed = time.time() - start
+                print(f'{round(total_committed / change_count * 100)}% | '
+                      f'{round(total_committed / elapsed if elapsed else 0, 1)} changes/s')
+
+        if processes == 1:
+            for index, batch in enumerate(batches):
+                _report(index, _commit_batch(batch))
+        else:
+            # Connections can't be shared with forked processes.
+            connections.close_all()
+            with Pool(processes=processes, initializer=_init_worker) as pool:
+                for index, result in enumerate(pool.imap_unordered(_commit_batch, batches)):
+                    _report(index, result)
+
+        elapsed = time.time() - start
+        self.stdout.write(f'Committed {total_committed} changes in {round(elapsed, 1)}s '
+                          f'({round(total_committed / elapsed if elapsed else 0, 1)} changes/s).')
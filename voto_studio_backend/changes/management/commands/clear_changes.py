@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 
-from voto_studio_backend.changes.models import Change
+from voto_studio_backend.changes.models import Change, Snapshot
 
 
 class Command(BaseCommand):
@@ -28,5 +28,10 @@ class Command(BaseCommand):
             change_count = instances.count()
             instances.delete()
             self.stdout.write(f'Deleted {change_count} change instances.')
+            # Snapshots are delta encoded, so they are only
+            # cleared when the changes of every user are.
+            if user == 'all':
+                snapshot_count, _ = Snapshot.objects.all().delete()
+                self.stdout.write(f'Deleted {snapshot_count} snapshots.')
         else:
             self.stdout.write('Cancelled.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ...utils import migrate_change_copies
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--batch_size', action='store', dest='batch_size', type=int, default=500,
+                            help='The number of changes to migrate per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Moving change copies into the snapshot store...')
+        migrated = migrate_change_copies(batch_size=options.get('batch_size'), logging=True)
+
+        self.stdout.write(f'Successfully migrated {migrated} changes.')
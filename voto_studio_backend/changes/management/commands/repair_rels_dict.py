@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...models import TrackedWorkshopModel
+from ...utils import get_migration_request, repair_rels_dicts
+from shared.utils import get_model
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--using', action='store', dest='using', default=settings.STUDIO_DB,
+                            help='The DB to act on')
+        parser.add_argument('--model_label', action='store', dest='model_label',
+                            help='The model to repair, all tracked models by default')
+        parser.add_argument('--dry_run', action='store_true', dest='dry_run',
+                            help='Report the mismatches without writing anything')
+        parser.add_argument('--stage', action='store_true', dest='stage',
+                            help='Stage an update, as the migration bot, for every repaired instance')
+
+    def handle(self, *args, **options):
+        model_label = options.get('model_label')
+        if model_label is not None:
+            model_classes = [get_model(model_label=model_label)]
+        else:
+            model_classes = [get_model(model_label=label) for label in settings.WORKSHOP_MODELS]
+            model_classes = [m for m in model_classes if issubclass(m, TrackedWorkshopModel)]
+
+        dry_run = options.get('dry_run')
+        request = get_migration_request() if options.get('stage') and not dry_run else None
+        for model_class in model_classes:
+            report = repair_rels_dicts(model_class, using=options.get('using'), dry_run=dry_run, request=request)
+            self.stdout.write(
+                f'{report["model_label"]}: {report["mismatched"]} of {report["checked"]} rels_dict '
+                f'{"to repair" if dry_run else "repaired"}, '
+                f'{report["missing_relationships"]} missing and '
+                f'{report["dangling_relationships"]} dangling relationships.'
+            )
+            for field_name, count in sorted(report['fields'].items()):
+                self.stdout.write(f'    {field_name}: {count}')
+
+        self.stdout.write('Dry run, nothing was written.' if dry_run else 'Successfully repaired rels_dict.')
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from voto_studio_backend.changes.models import Change
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='store', dest='user', default='all',
+                            help='Squash changes for only this user')
+
+    def handle(self, *args, **options):
+        user = options.get('user')
+
+        filter_kwargs = {'committed': False}
+        if not user == 'all':
+            user = get_user_model().objects.get(email=user)
+            filter_kwargs.update({'user': user})
+
+        changes = Change.objects.filter(**filter_kwargs)
+        change_count = changes.count()
+        deleted = Change.objects.squash(changes)
+
+        self.stdout.write(f'Squashed {change_count} uncommitted changes into {change_count - deleted}.')
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('changes', '0002_auto_20190219_1636'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommitCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.CharField(db_index=True, max_length=128, verbose_name='Name of the bulk commit run')),
+                ('base_id', models.PositiveIntegerField(null=True, verbose_name='Base instance id')),
+                ('last_change_id', models.PositiveIntegerField(verbose_name='Last committed change id')),
+                ('change_count', models.PositiveIntegerField(default=0, verbose_name='Number of changes committed')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of checkpoint')),
+                ('content_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='commitcheckpoint',
+            unique_together={('run', 'content_type', 'base_id')},
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:03
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0003_commitcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=128, verbose_name='Model label')),
+                ('base_id', models.PositiveIntegerField(verbose_name='Base instance id')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+                ('keyframe', models.BooleanField(default=False, verbose_name='Whether the snapshot holds the full state')),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='Full state or changed fields')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of creation')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='snapshot',
+            unique_together={('model_label', 'base_id', 'version')},
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='snapshot_id',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Snapshot id'),
+        ),
+    ]
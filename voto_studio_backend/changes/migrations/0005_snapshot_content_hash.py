@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0004_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snapshot',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Hash of the content and relationships'),
+        ),
+    ]
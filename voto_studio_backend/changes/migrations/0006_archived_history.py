@@ -0,0 +1,59 @@
+# Generated by Django 2.1.7 on 2026-10-18 13:10
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0005_snapshot_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedChange',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Id of the change')),
+                ('stage_type', models.CharField(blank=True, choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=128, verbose_name='Stage type')),
+                ('description', models.CharField(blank=True, max_length=256, verbose_name='Change description')),
+                ('content_type_id', models.PositiveIntegerField(null=True, verbose_name='Content type id')),
+                ('object_id', models.PositiveIntegerField(null=True, verbose_name='Copy instance id')),
+                ('base_id', models.PositiveIntegerField(null=True, verbose_name='Base instance id')),
+                ('snapshot_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Snapshot id')),
+                ('parent_content_type_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Parent content type id')),
+                ('parent_object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Parent instance id')),
+                ('one_to_one_models', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name="Fully describes base instance's one to one rels")),
+                ('many_to_many_models', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name="Describes base instance's many to manys rels")),
+                ('date_created', models.DateTimeField(verbose_name='Date of creation')),
+                ('committed', models.BooleanField(default=True, verbose_name='Whether the change has been committed')),
+                ('date_committed', models.DateTimeField(verbose_name='Date of commit')),
+                ('reverted', models.BooleanField(default=False, verbose_name='Whether the change has been reverted')),
+                ('date_reverted', models.DateTimeField(verbose_name='Date of revert')),
+                ('user_id', models.PositiveIntegerField(null=True, verbose_name='User id')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedChangeGroup',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Id of the change group')),
+                ('description', models.CharField(max_length=128, verbose_name='Short description of the change group')),
+                ('date_created', models.DateTimeField(blank=True, verbose_name='Date when change group committed')),
+                ('content_type_id', models.PositiveIntegerField(null=True, verbose_name='Content type id')),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='ID of parent instance')),
+                ('user_id', models.PositiveIntegerField(null=True, verbose_name='User id')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedChangeGroupLink',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Id of the link')),
+                ('changegroup_id', models.PositiveIntegerField(db_index=True, verbose_name='Change group id')),
+                ('change_id', models.PositiveIntegerField(verbose_name='Change id')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='archivedchange',
+            index_together={('content_type_id', 'base_id')},
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.1.7 on 2026-10-18 14:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# The relationships table is filled from the ``rels_dict`` already stored by
+# running ``python manage.py build_relationships`` once this migration is applied,
+# before anything is staged, as ``relate`` and ``unrelate`` rebuild the ``rels_dict``
+# keys they touch from the table.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('changes', '0006_archived_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Relationship',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_id', models.PositiveIntegerField(verbose_name='Source id')),
+                ('field_name', models.CharField(max_length=128, verbose_name='Field name on the source')),
+                ('related_field_name', models.CharField(blank=True, max_length=128, verbose_name='Field name on the target')),
+                ('target_id', models.PositiveIntegerField(verbose_name='Target id')),
+                ('level', models.CharField(choices=[('rels', 'rels'), ('refs', 'refs')], default='rels', max_length=4, verbose_name='Level')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of creation')),
+                ('source_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.ContentType')),
+                ('target_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='relationship',
+            unique_together={('source_content_type', 'source_id', 'field_name', 'target_content_type', 'target_id')},
+        ),
+        migrations.AlterIndexTogether(
+            name='relationship',
+            index_together={('target_content_type', 'target_id')},
+        ),
+    ]
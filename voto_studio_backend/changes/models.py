@@ -1,24 +1,38 @@
-import uuid
+import hashlib
+import json
+from functools import reduce
+from operator import or_
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.postgres.fields import JSONField
-from django.db import models
-from django.db.models import Q, OneToOneRel
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Max, Q, OneToOneRel
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from shared.utils import hidden_fields
+from shared.db import bulk_upsert, copy_rows
+from shared.utils import get_model, hidden_fields
 from voto_studio_backend.forms.models import InfoMixin, JSONModel, JSONAutoField, JSONCharField
 from voto_studio_backend.permissions.models import PermissionsBaseModel
-from voto_studio_backend.search.models import IndexingManager, IndexingMixin
+from voto_studio_backend.search.models import IndexingManager, IndexingMixin, OUTBOX_INDEX, OutboxEntry
 
 
 STUDIO_DB = settings.STUDIO_DB
 MAIN_SITE_DB = settings.MAIN_SITE_DB
 HISTORY_DB = settings.HISTORY_DB
+SNAPSHOT_DB = settings.SNAPSHOT_DB
+SNAPSHOT_KEYFRAME_INTERVAL = settings.SNAPSHOT_KEYFRAME_INTERVAL
+
+# The number of times the snapshots are taken again when another
+# process took a snapshot of the same instance at the same time.
+SNAPSHOT_TAKE_ATTEMPTS = 3
 
 
 STAGE_CREATED = 'created'
@@ -54,57 +68,118 @@ class ChangeManager(models.Manager):
 
         return one_to_one_fields
 
-    def _copy_instance(self, instance):
+    @staticmethod
+    def _get_base_instances(instances):
         """
-        By clearing the ID of an instance and then saving, Django will perform an INSERT
-        action, thus creating a new instance with the same data but a new, unique ID.
+        Read back the base instance of each instance provided using one query per model.
+        Returns a list of base instances in the same order as the instances provided.
         """
-        base_instance_id = instance.id
-        instance.id = None
-        instance.tracked = False
-        for field in instance._meta.get_fields():
-            if not field.is_relation and field.unique and not field.name == 'id':
-                setattr(instance, field.name, f'{getattr(instance, field.name)}-{uuid.uuid4()}')
-        for field in self._get_one_to_one_fields(instance):
-            setattr(instance, f'{field.name}_id', None)
-        instance.save(using=STUDIO_DB)
-        base_instance = get_object_or_404(instance._meta.model, id=base_instance_id)
+        instance_ids_by_model = {}
+        for instance in instances:
+            instance_ids_by_model.setdefault(instance._meta.model, []).append(instance.id)
 
-        return base_instance, instance
+        base_instances = {
+            model_class: model_class.objects.using(STUDIO_DB).in_bulk(instance_ids)
+            for model_class, instance_ids in instance_ids_by_model.items()
+        }
 
-    def _create_change(self, stage_type, instance, request=None, parent=None):
+        ret = []
+        for instance in instances:
+            try:
+                ret.append(base_instances[instance._meta.model][instance.id])
+            except KeyError:
+                raise Http404(f'No {instance._meta.model_name} matches the given query.')
+
+        return ret
+
+    @staticmethod
+    def _get_many_to_many_ids(model_class, instance_ids, using=STUDIO_DB):
         """
-        Create the change instance for a 'created', 'updated' or 'deleted' instance
-        and store representations of any OneToOne or ManyToMany relationships as dictionaries.
+        Read the related ids of every many to many field for all the given instances
+        straight from the through tables, using one query per field. Returns a dict
+        of the form ``{instance_id: {field_name: [related_id, ...]}}``.
+        """
+        ret = {instance_id: {} for instance_id in instance_ids}
+        for field in model_class._meta.many_to_many:
+            for many_to_many_ids in ret.values():
+                many_to_many_ids[field.name] = []
+
+            source_name = f'{field.m2m_field_name()}_id'
+            target_name = f'{field.m2m_reverse_field_name()}_id'
+            rows = field.remote_field.through.objects \
+                .using(using) \
+                .filter(**{f'{source_name}__in': instance_ids}) \
+                .order_by('pk') \
+                .values_list(source_name, target_name)
+            for source_id, target_id in rows:
+                ret[source_id][field.name].append(target_id)
+
+        return ret
+
+    def _bulk_create_changes(self, stage_type, instances, request=None, parent=None):
+        """
+        Create the change instances for a list of 'created', 'updated' or 'deleted' instances.
+        A snapshot of each instance is taken, the many to many relationships of all base
+        instances are read in one query per field and every change instance is inserted
+        with a single statement. Updates that leave an instance and its relationships
+        exactly as they were in its latest snapshot are not staged, their change is ``None``.
         """
-        content_type = _get_content_type(instance=instance)
         parent_content_type = _get_content_type(instance=parent)
         parent_object_id = parent.id if parent else None
-        base_instance, copy_instance = self._copy_instance(instance)
-        description = f'{str(request.user)} {stage_type} {base_instance._meta.model_name} {str(base_instance)}'
-
-        change = self.using(STUDIO_DB).model(
-            stage_type=stage_type,
-            description=description,
-            content_type=content_type,
-            object_id=copy_instance.id,
-            base_id=base_instance.id,
-            parent_content_type=parent_content_type,
-            parent_object_id=parent_object_id,
-            user=request.user,
+        base_instances = self._get_base_instances(instances)
+
+        many_to_many_ids = {}
+        for model_class in {instance._meta.model for instance in instances}:
+            many_to_many_ids[model_class] = self._get_many_to_many_ids(
+                model_class,
+                [base_instance.id for base_instance in base_instances
+                 if base_instance._meta.model is model_class],
+            )
+
+        relations = [{
+            'one_to_one_models': {f.name: getattr(base_instance, f.attname) for f
+                                  in self._get_one_to_one_fields(base_instance)
+                                  if getattr(base_instance, f.attname) is not None},
+            'many_to_many_models': many_to_many_ids[base_instance._meta.model][base_instance.id],
+        } for base_instance in base_instances]
+        snapshots = Snapshot.objects.bulk_take(
+            instances,
+            relations=relations,
+            skip_unchanged=stage_type == STAGE_UPDATED,
         )
-        change.one_to_one_models = {f.name: getattr(base_instance, f.name).id for f
-                                    in self._get_one_to_one_fields(instance)
-                                    if getattr(base_instance, f.name, False)}
-        change.many_to_many_models = {f.name: [o.id for o in getattr(base_instance, f.name).all()]
-                                      for f in instance._meta.many_to_many}
-        change.save(using=STUDIO_DB)
 
-        return change, base_instance
+        changes = []
+        for base_instance, snapshot, instance_relations in zip(base_instances, snapshots, relations):
+            if snapshot is None:
+                changes.append(None)
+                continue
+            model_class = base_instance._meta.model
+            description = f'{str(request.user)} {stage_type} {model_class._meta.model_name} {str(base_instance)}'
+            changes.append(self.model(
+                stage_type=stage_type,
+                description=description,
+                content_type=_get_content_type(instance=base_instance),
+                base_id=base_instance.id,
+                snapshot_id=snapshot.id,
+                parent_content_type=parent_content_type,
+                parent_object_id=parent_object_id,
+                user=request.user,
+                **instance_relations,
+            ))
+        self.using(STUDIO_DB).bulk_create([change for change in changes if change is not None])
+
+        return list(zip(changes, base_instances))
+
+    def _create_change(self, stage_type, instance, request=None, parent=None):
+        """
+        Create the change instance for a 'created', 'updated' or 'deleted' instance
+        and store representations of any OneToOne or ManyToMany relationships as dictionaries.
+        """
+        return self._bulk_create_changes(stage_type, [instance], request=request, parent=parent)[0]
 
     def stage_created(self, instance, request, parent=None):
         """
-        Create a copy of the instance being created and generate a change instance for
+        Take a snapshot of the instance being created and generate a change instance for
         the creation of an instance made using the rest API.
         """
         _, base_instance = self._create_change(STAGE_CREATED, instance, request=request, parent=parent)
@@ -113,7 +188,7 @@ class ChangeManager(models.Manager):
 
     def stage_updated(self, instance, request, parent=None):
         """
-        Create a copy of the instance being changed and generate a change instance for
+        Take a snapshot of the instance being changed and generate a change instance for
         a change made using the rest API.
         """
         _, base_instance = self._create_change(STAGE_UPDATED, instance, request=request, parent=parent)
@@ -122,7 +197,7 @@ class ChangeManager(models.Manager):
 
     def stage_deleted(self, instance, request, parent=None):
         """
-        Create a copy of the instance being deleted and generate change instance for
+        Take a snapshot of the instance being deleted and generate change instance for
         the deletion made using the rest API.
         """
         _, base_instance = self._create_change(STAGE_DELETED, instance, request=request, parent=parent)
@@ -135,29 +210,37 @@ class ChangeManager(models.Manager):
         else:
             return self.stage_updated(instance, request, parent)
 
+    def _bulk_stage(self, stage_type, instances, request, parent=None):
+        if not isinstance(instances, list):
+            raise ValueError('Provide a list of instances.')
+        if not len(instances):
+            return []
+
+        # The same instance can be handed to us more than once, e.g. when
+        # an instance is related to itself. We only need one change each.
+        unique_instances = list({(i._meta.label, i.id): i for i in instances}.values())
+        changes = self._bulk_create_changes(stage_type, unique_instances, request=request, parent=parent)
+        base_instances = {(b._meta.label, b.id): b for _, b in changes}
+
+        return [base_instances[(i._meta.label, i.id)] for i in instances]
+
     def bulk_stage_created(self, instances, request, parent=None):
         """
         Stage create changes for each instance in the list of instances provided.
         """
-        if not isinstance(instances, list):
-            raise ValueError('Provide a list of instances.')
-        base_instances = [self.stage_created(instance, request, parent=parent) for instance in instances]
-
-        return base_instances
+        return self._bulk_stage(STAGE_CREATED, instances, request, parent=parent)
 
     def bulk_stage_updated(self, instances, request, parent=None):
-        if not isinstance(instances, list):
-            raise ValueError('Provide a list of instances.')
-        base_instances = [self.stage_updated(instance, request, parent=parent) for instance in instances]
-
-        return base_instances
+        """
+        Stage update changes for each instance in the list of instances provided.
+        """
+        return self._bulk_stage(STAGE_UPDATED, instances, request, parent=parent)
 
     def bulk_stage_deleted(self, instances, request, parent=None):
-        if not isinstance(instances, list):
-            raise ValueError('Provide a list of instances.')
-        base_instances = [self.stage_deleted(instance, request, parent=parent) for instance in instances]
-
-        return base_instances
+        """
+        Stage delete changes for each instance in the list of instances provided.
+        """
+        return self._bulk_stage(STAGE_DELETED, instances, request, parent=parent)
 
     def get_for_model(self, model, request=None, committed=False, using=STUDIO_DB):
         """
@@ -176,17 +259,199 @@ class ChangeManager(models.Manager):
         """
         Get a collection of either all committed or all non-committed
         changes for an instance, ordered by date with earliest first.
+        Committed changes include the changes that have been archived to
+        the HISTORY_DB, so they are returned as a list rather than a queryset.
         """
         content_type = _get_content_type(instance=instance)
         changes = Change.objects \
             .using(using) \
             .filter(content_type=content_type, base_id=instance.id, committed=committed)
 
+        if committed:
+            archived_changes = []
+            if HISTORY_DB in settings.DATABASES:
+                archived_changes = [
+                    archived_change.to_change() for archived_change in
+                    ArchivedChange.objects.filter(content_type_id=content_type.id, base_id=instance.id)
+                ]
+            return sorted([*archived_changes, *changes], key=lambda c: (c.date_created, c.id))
+
         return changes
 
     def commit_for_instance(self, instance, using=STUDIO_DB):
         changes = self.get_for_instance(instance, using=using)
-        return [change.commit() for change in changes.order_by('date_created')]
+        return self.bulk_commit(changes.order_by('date_created'))
+
+    @staticmethod
+    def _get_commit_instances(model_class, changes, commit_base=False):
+        """
+        Get the instances that are going to be copied over to the main site database
+        for a list of changes to the same model. Instances are rebuilt from their
+        snapshots, changes staged before snapshots existed still point to a copy.
+        """
+        if commit_base:
+            base_instances = model_class.objects.using(STUDIO_DB).in_bulk([c.base_id for c in changes])
+            instances = {c.id: base_instances.get(c.base_id) for c in changes}
+        else:
+            snapshot_instances = Snapshot.objects.bulk_rebuild([c.snapshot_id for c in changes if c.snapshot_id])
+            copy_instances = model_class.objects \
+                .using(STUDIO_DB) \
+                .in_bulk([c.object_id for c in changes if not c.snapshot_id])
+            instances = {c.id: (snapshot_instances.get(c.snapshot_id) if c.snapshot_id else
+                                copy_instances.get(c.object_id)) for c in changes}
+
+        # Remove all ForeignKeys apart from User
+        fk_fields = [field for field in model_class._meta.get_fields()
+                     if (field.get_internal_type() == 'ForeignKey' and not
+                         field.related_model._meta.label == settings.AUTH_USER_MODEL)]
+
+        ret = {}
+        for change in changes:
+            instance = instances[change.id]
+            if instance is None:
+                continue
+            instance = Change._parse_json_fields(instance)
+            instance.id = change.base_id
+            instance.tracked = True
+            for fk_field in fk_fields:
+                setattr(instance, f'{fk_field.name}_id', None)
+            ret[change.id] = instance
+
+        return ret
+
+    def bulk_commit(self, changes, to_index=True, commit_base=False):
+        """
+        Commit a collection of changes in one go. Changes are grouped by content type
+        and the changes made to the same base instance are collapsed so that only the
+        final state of each instance is written to the main site database. Instances
+        are upserted with bulk statements, all the changes are marked as committed with
+        one UPDATE and the committed instances are indexed with one bulk request once
+        the transaction has been committed.
+        """
+        changes = sorted(changes, key=lambda c: (c.date_created, c.id))
+        if not len(changes):
+            return []
+
+        changes_by_base = {}
+        for change in changes:
+            changes_by_base.setdefault(change.content_type_id, {}) \
+                .setdefault(change.base_id, []) \
+                .append(change)
+
+        now = timezone.now()
+        committed_changes = []
+        instances_to_index = []
+        with transaction.atomic(using=STUDIO_DB), transaction.atomic(using=MAIN_SITE_DB):
+            for content_type_id, base_changes in changes_by_base.items():
+                model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+
+                # Deleting an instance removes it from all databases straight
+                # away, so there is nothing to commit for a deleted instance.
+                final_changes = {base_id: c[-1] for base_id, c in base_changes.items()
+                                 if not c[-1].stage_type == STAGE_DELETED}
+                for base_id, c in base_changes.items():
+                    if base_id not in final_changes:
+                        committed_changes.extend(c)
+
+                if not len(final_changes):
+                    continue
+
+                # Update some properties on the base instances. This is so
+                # we can display whether or not an instance is visible on
+                # the main in VotoStudio.
+                base_instances = model_class.objects \
+                    .using(STUDIO_DB) \
+                    .filter(id__in=list(final_changes.keys()))
+                existing_ids = set(base_instances.values_list('id', flat=True))
+                base_instances.update(published=True, date_last_published=now, date_modified=now)
+
+                final_changes = [c for base_id, c in final_changes.items() if base_id in existing_ids]
+                instances = self._get_commit_instances(model_class, final_changes, commit_base=commit_base)
+                bulk_upsert(model_class, list(instances.values()), using=MAIN_SITE_DB,
+                            preserved_fields=getattr(model_class, 'computed_fields', ()))
+
+                for change in final_changes:
+                    if change.id in instances:
+                        committed_changes.extend(base_changes[change.base_id])
+                if to_index:
+                    instances_to_index.extend(instances.values())
+
+            self.using(STUDIO_DB) \
+                .filter(id__in=[change.id for change in committed_changes]) \
+                .update(committed=True, date_committed=now)
+
+            # The outbox is flushed once the MAIN_SITE_DB transaction commits.
+            OutboxEntry.objects.enqueue([
+                (instance._meta.label, instance.id, OUTBOX_INDEX) for instance in instances_to_index
+            ], using=MAIN_SITE_DB)
+
+        for change in committed_changes:
+            change.committed = True
+            change.date_committed = now
+
+        return sorted(committed_changes, key=lambda c: (c.date_created, c.id))
+
+    def squash(self, changes=None):
+        """
+        Merge each run of consecutive uncommitted changes made by the same user to the
+        same instance into the last change of the run, which already holds the latest
+        state and relationships. The superseded changes are deleted together with their
+        snapshots or copies. Only runs containing one of the changes provided are
+        squashed, by default every uncommitted change is considered.
+        Returns the number of changes deleted.
+        """
+        if changes is None:
+            changes = self.using(STUDIO_DB).filter(committed=False)
+
+        targets = changes.filter(committed=False).values_list('id', 'content_type_id', 'base_id')
+        change_ids = {change_id for change_id, _, _ in targets}
+        keys = {(content_type_id, base_id) for _, content_type_id, base_id in targets}
+        if not len(keys):
+            return 0
+
+        pending = self \
+            .using(STUDIO_DB) \
+            .filter(reduce(or_, [Q(content_type_id=c, base_id=b) for c, b in keys]), committed=False) \
+            .order_by('date_created', 'id')
+
+        runs, latest_runs = [], {}
+        for change in pending:
+            key = (change.content_type_id, change.base_id)
+            run = latest_runs.get(key)
+            if run is not None and run[-1].user_id == change.user_id:
+                run.append(change)
+            else:
+                latest_runs[key] = [change]
+                runs.append(latest_runs[key])
+        runs = [run for run in runs if len(run) > 1 and any(c.id in change_ids for c in run)]
+        if not len(runs):
+            return 0
+
+        kept_changes, superseded_changes = [], []
+        for run in runs:
+            first_change, kept_change = run[0], run[-1]
+            # An instance created and then updated within a run
+            # still needs to be created when the run is committed.
+            if first_change.stage_type == STAGE_CREATED and not kept_change.stage_type == STAGE_DELETED:
+                kept_change.stage_type = STAGE_CREATED
+                kept_change.description = first_change.description
+                kept_changes.append(kept_change)
+            superseded_changes.extend(run[:-1])
+
+        copy_ids_by_content_type = {}
+        for change in superseded_changes:
+            if not change.snapshot_id and change.object_id and not change.object_id == change.base_id:
+                copy_ids_by_content_type.setdefault(change.content_type_id, []).append(change.object_id)
+
+        with transaction.atomic(using=STUDIO_DB), transaction.atomic(using=SNAPSHOT_DB):
+            bulk_upsert(self.model, kept_changes, using=STUDIO_DB)
+            self.using(STUDIO_DB).filter(id__in=[c.id for c in superseded_changes]).delete()
+            Snapshot.objects.bulk_delete([c.snapshot_id for c in superseded_changes if c.snapshot_id])
+            for content_type_id, copy_ids in copy_ids_by_content_type.items():
+                model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+                model_class.objects.using(STUDIO_DB).filter(id__in=copy_ids, tracked=False).delete()
+
+        return len(superseded_changes)
 
 
 class Change(models.Model):
@@ -201,7 +466,9 @@ class Change(models.Model):
     )
     object_id = models.PositiveIntegerField(_('Copy instance id'), null=True)
     base_id = models.PositiveIntegerField(_('Base instance id'), null=True)
-    content_object = GenericForeignKey(ct_field='content_type', fk_field='object_id')
+    # Not a ForeignKey so that snapshots can be stored on another database.
+    snapshot_id = models.PositiveIntegerField(_('Snapshot id'), null=True, blank=True)
+    copy_object = GenericForeignKey(ct_field='content_type', fk_field='object_id')
     parent_content_type = models.ForeignKey(
         ContentType,
         null=True,
@@ -235,15 +502,39 @@ class Change(models.Model):
     def __str__(self):
         return f'{self.id} | {self.description}'
 
+    @property
+    def content_object(self):
+        """
+        The instance as it was when the change was staged. Rebuilt from the snapshot
+        store, or read from the copy instance for changes staged before snapshots.
+        """
+        if self.snapshot_id:
+            return self.rebuild()
+
+        return self.copy_object
+
     def _get_instance(self, using=STUDIO_DB, base=True):
         """
-        Get the instance that the change instance is related to.
-        Could this implementation be made simpler with self.content_object?
+        Get the instance that the change instance is related to. When ``base`` is
+        ``False`` the instance is rebuilt as it was when the change was staged.
         """
+        if not base and self.snapshot_id:
+            return self.rebuild()
+
         instance_id = self.base_id if base else self.object_id
 
         return get_object_or_404(self.content_type.model_class().objects.using(using), id=instance_id)
 
+    def rebuild(self):
+        """
+        Rebuild the instance from the snapshot taken when the change was staged.
+        """
+        instance = Snapshot.objects.bulk_rebuild([self.snapshot_id]).get(self.snapshot_id)
+        if instance is None:
+            raise Http404('No snapshot matches the given query.')
+
+        return instance
+
     @staticmethod
     def _parse_json_fields(instance):
         fields = instance._meta.model._meta.get_fields()
@@ -267,44 +558,8 @@ class Change(models.Model):
         Commit a change instance and propagate changes through to the main_site database. Will
         create a new instance or update/delete an existing one.
         """
-        if self.stage_type == STAGE_CREATED or self.stage_type == STAGE_UPDATED:
-            # Update some properties on the base instance. This is so
-            # we can display whether or not an instance is visible on
-            # the main in VotoStudio.
-            base_instance = self._get_instance(using=STUDIO_DB, base=True)
-            if not base_instance.published:
-                base_instance.published = True
-            base_instance.date_last_published = timezone.now()
-            base_instance.save(using=STUDIO_DB)
-
-            # Get the instance that we are going to copy over to the
-            # main site database. We need to parse the JSON fields
-            # into a format that is more friendly to the main site.
-            instance = self._get_instance(using=STUDIO_DB, base=commit_base)
-            instance = self._parse_json_fields(instance)
-            instance.id = self.base_id
-            instance.tracked = True
-
-            # Remove all ForeignKeys apart from User
-            fk_fields = [field for field in instance._meta.get_fields()
-                         if (field.get_internal_type() == 'ForeignKey' and not
-                             field.related_model._meta.label == settings.AUTH_USER_MODEL)]
-            for fk_field in fk_fields:
-                setattr(instance, f'{fk_field.name}_id', None)
-            instance.save(using=MAIN_SITE_DB, to_index=to_index)
-
-        if self.stage_type == STAGE_DELETED:
-            # Do nothing as this action can't
-            # be "committed". By deleting an
-            # instance it is deleted from all
-            # databases and its ElasticSearch
-            # index is deleted. Therefore there
-            # is no further action to take.
-            pass
-
-        self.committed = True
-        self.date_committed = timezone.now()
-        self.save(using=STUDIO_DB)
+        if not Change.objects.bulk_commit([self], to_index=to_index, commit_base=commit_base):
+            raise Http404(f'No {self.content_type.model} matches the given query.')
 
         return self
 
@@ -313,6 +568,417 @@ class Change(models.Model):
         raise NotImplementedError('The revert functionality is yet to be implemented.')
 
 
+def _get_snapshot_fields(model_class):
+    return [field for field in model_class._meta.concrete_fields if not field.primary_key]
+
+
+def _is_json_field(field):
+    return field.get_internal_type() == 'JSONField'
+
+
+# Fields that are set on the base instance when it is published, they
+# are not part of the content of an instance.
+CONTENT_HASH_EXCLUDED_FIELDS = ('published', 'date_last_published', 'date_modified')
+
+
+def get_content_hash(state, relations=None):
+    """
+    Return a stable hash of the state of an instance, as created by ``serialize_instance``,
+    and of the ids of its relationships. The order of related ids does not matter.
+    """
+    content = {k: v for k, v in state.items() if k not in CONTENT_HASH_EXCLUDED_FIELDS}
+    relations = {
+        kind: {name: sorted(ids) if isinstance(ids, list) else ids for name, ids in fields.items()}
+        for kind, fields in (relations or {}).items()
+    }
+
+    return hashlib.sha256(json.dumps([content, relations], sort_keys=True).encode()).hexdigest()
+
+
+def serialize_instance(instance):
+    """
+    Return the state of an instance as a JSON friendly dictionary keyed by
+    each field's ``attname``. JSON fields are stored as they are and every
+    other field is stored as a string.
+    """
+    state = {}
+    for field in _get_snapshot_fields(instance._meta.model):
+        value = field.value_from_object(instance)
+        if value is not None and not _is_json_field(field):
+            value = field.value_to_string(instance)
+        state[field.attname] = value
+
+    return json.loads(json.dumps(state))
+
+
+def deserialize_instance(model_class, state, instance_id=None):
+    """
+    Build an unsaved instance from a state created by ``serialize_instance``.
+    """
+    fields = {field.attname: field for field in _get_snapshot_fields(model_class)}
+    values = {
+        attname: value if value is None or _is_json_field(fields[attname]) else fields[attname].to_python(value)
+        for attname, value in state.items() if attname in fields
+    }
+
+    return model_class(id=instance_id, **values)
+
+
+class SnapshotManager(models.Manager):
+    """Custom model manager for Snapshot"""
+    def _get_states(self, model_label, versions):
+        """
+        Rebuild the states of several instances of the same model. ``versions`` maps
+        each base id to the version to rebuild, or to ``None`` for the latest version.
+        Uses one query to find the keyframes and one query to read the snapshots
+        from those keyframes onwards. Returns a dict of the form
+        ``{base_id: {'id': ..., 'version': ..., 'state': ..., 'deltas': ..., 'content_hash': ...}}``
+        where ``deltas`` is the number of snapshots taken since the keyframe.
+        """
+        if not len(versions):
+            return {}
+
+        def _version_query(base_id, version, **kwargs):
+            query = Q(base_id=base_id, **kwargs)
+            if version is not None:
+                query &= Q(version__lte=version)
+            return query
+
+        keyframes = self \
+            .filter(reduce(or_, [_version_query(b, v) for b, v in versions.items()]),
+                    model_label=model_label, keyframe=True) \
+            .values('base_id') \
+            .annotate(keyframe_version=Max('version')) \
+            .values_list('base_id', 'keyframe_version')
+        keyframes = dict(keyframes)
+
+        snapshots = self \
+            .filter(reduce(or_, [_version_query(b, v, version__gte=keyframes.get(b, 0))
+                                 for b, v in versions.items()]), model_label=model_label) \
+            .order_by('base_id', 'version') \
+            .values_list('id', 'base_id', 'version', 'keyframe', 'data', 'content_hash')
+
+        ret = {}
+        for snapshot_id, base_id, version, keyframe, data, content_hash in snapshots:
+            if keyframe or base_id not in ret:
+                ret[base_id] = {'version': version, 'state': dict(data), 'deltas': 0}
+            else:
+                ret[base_id]['version'] = version
+                ret[base_id]['state'].update(data)
+                ret[base_id]['deltas'] += 1
+            ret[base_id]['id'] = snapshot_id
+            ret[base_id]['content_hash'] = content_hash
+
+        return ret
+
+    def bulk_take(self, instances, relations=None, skip_unchanged=False):
+        """
+        Take a snapshot of each instance provided. A snapshot only stores the fields
+        that changed since the previous snapshot of the same instance, apart from
+        every ``SNAPSHOT_KEYFRAME_INTERVAL`` snapshots where the full state is stored.
+        Returns the snapshots in the same order as the instances provided. The same
+        instance can be provided more than once, its snapshots are then taken one
+        after the other.
+
+        Each snapshot carries a hash of the instance's content and of the relationships
+        given in ``relations``, a list in the same order as the instances. When
+        ``skip_unchanged`` is set no snapshot is taken of an instance whose hash matches
+        its latest snapshot, ``None`` is returned in its place. Only a snapshot a change
+        points to is compared against, as the snapshot of a change whose transaction
+        rolled back is left behind when the SNAPSHOT_DB isn't the STUDIO_DB.
+
+        The versions follow the latest snapshots read, so if another process takes a
+        snapshot of the same instance meanwhile the insert conflicts. The snapshots are
+        then built again from the new latest snapshots, up to ``SNAPSHOT_TAKE_ATTEMPTS``
+        times.
+        """
+        for attempt in range(SNAPSHOT_TAKE_ATTEMPTS):
+            ret = self._build_snapshots(instances, relations=relations, skip_unchanged=skip_unchanged)
+            try:
+                with transaction.atomic(using=SNAPSHOT_DB):
+                    self.bulk_create([snapshot for snapshot in ret if snapshot is not None])
+            except IntegrityError:
+                if attempt + 1 == SNAPSHOT_TAKE_ATTEMPTS:
+                    raise
+                continue
+
+            return ret
+
+    def _build_snapshots(self, instances, relations=None, skip_unchanged=False):
+        """
+        Build the snapshots ``bulk_take`` inserts, following the latest snapshots.
+        """
+        ids_by_label = {}
+        for instance in instances:
+            ids_by_label.setdefault(instance._meta.label, set()).add(instance.id)
+
+        previous_states = {}
+        for model_label, instance_ids in ids_by_label.items():
+            states = self._get_states(model_label, {instance_id: None for instance_id in instance_ids})
+            previous_states.update({(model_label, base_id): state for base_id, state in states.items()})
+
+        if skip_unchanged:
+            referenced_ids = self._get_referenced_ids([state['id'] for state in previous_states.values()])
+            for state in previous_states.values():
+                state['referenced'] = state['id'] in referenced_ids
+
+        if relations is None:
+            relations = [None] * len(instances)
+
+        ret = []
+        for instance, instance_relations in zip(instances, relations):
+            key = (instance._meta.label, instance.id)
+            state = serialize_instance(instance)
+            content_hash = get_content_hash(state, instance_relations)
+            previous = previous_states.get(key)
+            if skip_unchanged and previous is not None and previous['referenced'] and \
+                    previous['content_hash'] == content_hash:
+                ret.append(None)
+                continue
+            if previous is None or previous['deltas'] + 1 >= SNAPSHOT_KEYFRAME_INTERVAL:
+                keyframe, data, deltas = True, state, 0
+            else:
+                keyframe, deltas = False, previous['deltas'] + 1
+                data = {k: v for k, v in state.items() if k not in previous['state'] or
+                        not previous['state'][k] == v}
+            snapshot = self.model(
+                model_label=instance._meta.label,
+                base_id=instance.id,
+                version=previous['version'] + 1 if previous is not None else 0,
+                keyframe=keyframe,
+                data=data,
+                content_hash=content_hash,
+            )
+            previous_states[key] = {
+                'version': snapshot.version,
+                'state': state,
+                'deltas': deltas,
+                'content_hash': content_hash,
+                # The change staged with the snapshot points to it.
+                'referenced': True,
+            }
+            ret.append(snapshot)
+
+        return ret
+
+    @staticmethod
+    def _get_referenced_ids(snapshot_ids):
+        """
+        Return the ids of the snapshots a change, archived or not, points to.
+        """
+        if not len(snapshot_ids):
+            return set()
+
+        ret = set(Change.objects
+                  .using(STUDIO_DB)
+                  .filter(snapshot_id__in=snapshot_ids)
+                  .values_list('snapshot_id', flat=True))
+        if HISTORY_DB in settings.DATABASES:
+            ret.update(ArchivedChange.objects
+                       .filter(snapshot_id__in=snapshot_ids)
+                       .values_list('snapshot_id', flat=True))
+
+        return ret
+
+    def take(self, instance):
+        return self.bulk_take([instance])[0]
+
+    def bulk_insert(self, instances, dates):
+        """
+        Take a snapshot of each instance provided as it was at the matching date in
+        ``dates``, rather than after its latest snapshot. The snapshots of each instance
+        are put in date order and rewritten with new versions and keyframes, keeping
+        their ids so the changes pointing to them are left as they are. Returns the new
+        snapshots in the same order as the instances provided.
+        """
+        ids_by_label = {}
+        for instance in instances:
+            ids_by_label.setdefault(instance._meta.label, set()).add(instance.id)
+
+        chains = {}
+        for model_label, instance_ids in ids_by_label.items():
+            existing = self \
+                .filter(model_label=model_label, base_id__in=instance_ids) \
+                .order_by('base_id', 'version')
+            state = {}
+            for snapshot in existing:
+                state = dict(snapshot.data) if snapshot.keyframe else {**state, **snapshot.data}
+                chains.setdefault((model_label, snapshot.base_id), []).append((snapshot.date_created, state, snapshot))
+
+        ret = []
+        for instance, date in zip(instances, dates):
+            state = serialize_instance(instance)
+            snapshot = self.model(
+                model_label=instance._meta.label,
+                base_id=instance.id,
+                content_hash=get_content_hash(state, None),
+                date_created=date,
+            )
+            chains.setdefault((instance._meta.label, instance.id), []).append((date, state, snapshot))
+            ret.append(snapshot)
+
+        snapshots = []
+        for chain in chains.values():
+            # Sorting is stable, the snapshots taken on the same date keep their order.
+            chain.sort(key=lambda entry: entry[0])
+            previous_state, deltas = None, 0
+            for version, (_, state, snapshot) in enumerate(chain):
+                snapshot.version = version
+                if previous_state is None or deltas + 1 >= SNAPSHOT_KEYFRAME_INTERVAL:
+                    snapshot.keyframe, snapshot.data, deltas = True, state, 0
+                else:
+                    snapshot.keyframe, deltas = False, deltas + 1
+                    snapshot.data = {k: v for k, v in state.items() if k not in previous_state or
+                                     not previous_state[k] == v}
+                previous_state = state
+                snapshots.append(snapshot)
+
+        with transaction.atomic(using=SNAPSHOT_DB):
+            self.filter(id__in=[snapshot.id for snapshot in snapshots if snapshot.id is not None]).delete()
+            self.bulk_create(snapshots)
+
+        return ret
+
+    def get_latest_version(self, instance):
+        """
+        Return the version of the latest snapshot of an instance, ``None`` if it has none.
+        """
+        return self \
+            .filter(model_label=instance._meta.label, base_id=instance.id) \
+            .aggregate(version=Max('version'))['version']
+
+    def rebuild(self, model_class, base_id, version=None):
+        """
+        Rebuild an instance as it was at any version, or at its latest version.
+        """
+        rebuilt = self._get_states(model_class._meta.label, {base_id: version}).get(base_id)
+        if rebuilt is None:
+            raise Http404('No snapshot matches the given query.')
+
+        return deserialize_instance(model_class, rebuilt['state'], instance_id=base_id)
+
+    def bulk_rebuild(self, snapshot_ids):
+        """
+        Rebuild the instances captured by a list of snapshots. Returns a dict
+        of the form ``{snapshot_id: instance}``.
+        """
+        targets = self \
+            .filter(id__in=snapshot_ids) \
+            .values_list('id', 'model_label', 'base_id', 'version')
+
+        targets_by_label = {}
+        for snapshot_id, model_label, base_id, version in targets:
+            targets_by_label.setdefault(model_label, []).append((snapshot_id, base_id, version))
+
+        ret = {}
+        for model_label, model_targets in targets_by_label.items():
+            model_class = get_model(model_label=model_label)
+            states = self._get_versioned_states(model_label, [(b, v) for _, b, v in model_targets])
+            for snapshot_id, base_id, version in model_targets:
+                if (base_id, version) in states:
+                    ret[snapshot_id] = deserialize_instance(model_class, states[(base_id, version)], base_id)
+
+        return ret
+
+    def _get_versioned_states(self, model_label, targets):
+        """
+        Rebuild the states of a list of ``(base_id, version)`` pairs of the same model.
+        Returns a dict of the form ``{(base_id, version): state}``.
+        """
+        ret = {}
+        # An instance can only be rebuilt at one version per query, so
+        # targets for the same instance are rebuilt one after the other.
+        while len(targets):
+            versions, remaining = {}, []
+            for base_id, version in targets:
+                if base_id in versions:
+                    remaining.append((base_id, version))
+                else:
+                    versions[base_id] = version
+            states = self._get_states(model_label, versions)
+            ret.update({(base_id, version): states[base_id]['state'] for base_id, version in versions.items()
+                        if base_id in states and states[base_id]['version'] == version})
+            targets = remaining
+
+        return ret
+
+    def bulk_delete(self, snapshot_ids):
+        """
+        Delete a list of snapshots. The first remaining snapshot after each deleted
+        one is rewritten as a keyframe so that the later snapshots of the same
+        instance can still be rebuilt. Returns the number of snapshots deleted.
+        """
+        deleted = self \
+            .filter(id__in=snapshot_ids) \
+            .values_list('model_label', 'base_id', 'version')
+
+        deleted_versions = {}
+        for model_label, base_id, version in deleted:
+            deleted_versions.setdefault((model_label, base_id), []).append(version)
+        if not len(deleted_versions):
+            return 0
+
+        remaining = self \
+            .filter(reduce(or_, [Q(model_label=l, base_id=b, version__gt=min(v))
+                                 for (l, b), v in deleted_versions.items()])) \
+            .exclude(id__in=snapshot_ids) \
+            .order_by('model_label', 'base_id', 'version')
+
+        remaining_by_key = {}
+        for snapshot in remaining:
+            remaining_by_key.setdefault((snapshot.model_label, snapshot.base_id), []).append(snapshot)
+
+        to_rewrite = {}
+        for key, versions in deleted_versions.items():
+            for version in versions:
+                following = next((s for s in remaining_by_key.get(key, []) if s.version > version), None)
+                if following is not None and not following.keyframe:
+                    to_rewrite[following.id] = following
+
+        targets_by_label = {}
+        for snapshot in to_rewrite.values():
+            targets_by_label.setdefault(snapshot.model_label, []).append((snapshot.base_id, snapshot.version))
+        states = {}
+        for model_label, targets in targets_by_label.items():
+            states.update({(model_label, b, v): state
+                           for (b, v), state in self._get_versioned_states(model_label, targets).items()})
+
+        for snapshot in to_rewrite.values():
+            snapshot.keyframe = True
+            snapshot.data = states[(snapshot.model_label, snapshot.base_id, snapshot.version)]
+
+        count, _ = self.filter(id__in=snapshot_ids).delete()
+        bulk_upsert(self.model, list(to_rewrite.values()), using=SNAPSHOT_DB)
+
+        return count
+
+
+class Snapshot(models.Model):
+    """
+    Stores the state of a tracked instance at the time a change was staged. Keyframes
+    hold the full state of the instance, every other snapshot only holds the fields
+    that changed since the previous snapshot of the same instance.
+    """
+    model_label = models.CharField(_('Model label'), max_length=128)
+    base_id = models.PositiveIntegerField(_('Base instance id'))
+    version = models.PositiveIntegerField(_('Version'), default=0)
+    keyframe = models.BooleanField(_('Whether the snapshot holds the full state'), default=False)
+    data = JSONField(_('Full state or changed fields'), blank=True, default=dict)
+    content_hash = models.CharField(_('Hash of the content and relationships'), max_length=64, blank=True)
+    date_created = models.DateTimeField(_('Date of creation'), default=timezone.now)
+
+    objects = SnapshotManager()
+
+    class Meta:
+        unique_together = ('model_label', 'base_id', 'version')
+
+    def __str__(self):
+        return f'{self.model_label} {self.base_id} <v{self.version}>'
+
+    def rebuild(self):
+        return Snapshot.objects.rebuild(get_model(model_label=self.model_label), self.base_id, self.version)
+
+
 class TrackedModel(PermissionsBaseModel):
     """
     Adds several fields a model to integrate it with the changes app.
@@ -322,6 +988,7 @@ class TrackedModel(PermissionsBaseModel):
     tracked = models.BooleanField(_('Tracked'), default=True)
     published = models.BooleanField(_('Published'), default=False)
     date_last_published = models.DateTimeField(_('Date of Last Publish'), blank=True, null=True)
+    date_modified = models.DateTimeField(_('Date of Last Modification'), auto_now=True, db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
 
     objects = models.Manager()
@@ -404,6 +1071,16 @@ def get_rels_dict_default(field=None, fields=None):
         }
 
 
+def rels_dict_contains(field_name, ids, levels=(RELATIONSHIPS,)):
+    """
+    Return a filter matching the instances whose ``rels_dict`` lists any of ``ids`` at one of
+    ``levels`` of the many to many field ``field_name``. Each id is matched with a ``@>``
+    containment query, which the ``rels_dict`` GIN indexes serve. ``ids`` must not be empty.
+    """
+    return reduce(or_, [Q(rels_dict__contains={field_name: {level: [instance_id]}})
+                        for instance_id in ids for level in levels])
+
+
 class TrackedWorkshopModelManager(models.Manager):
     def _get_fields(self):
         fields = [field for field in self.model._meta.get_fields() if field.is_relation]
@@ -428,6 +1105,33 @@ class TrackedWorkshopModelManager(models.Manager):
 
         return instance, new
 
+    def referencing(self, instance, level=RELATIONSHIPS):
+        """
+        Return the instances whose ``rels_dict`` lists ``instance`` at ``level``, either
+        ``'rels'`` or ``'refs'``, or at any level if ``level`` is ``None``. Foreign keys
+        and one to one fields only hold relationships. Each field is matched with a
+        ``@>`` containment query, which the ``rels_dict`` GIN indexes serve.
+        """
+        query = Q()
+        for field in self._get_fields():
+            if not field.related_model == instance._meta.model:
+                continue
+
+            field_type = field.get_internal_type()
+            if field_type == 'OneToOneField' and level in (RELATIONSHIPS, None):
+                query |= Q(rels_dict__contains={field.name: {'id': instance.id}})
+            elif field_type == 'ForeignKey' and level in (RELATIONSHIPS, None):
+                query |= Q(rels_dict__contains={field.name: {'ids': [instance.id]}})
+            elif field_type == 'ManyToManyField':
+                for rel_level in (RELATIONSHIPS, REFERENCES):
+                    if level in (rel_level, None):
+                        query |= Q(rels_dict__contains={field.name: {rel_level: [instance.id]}})
+
+        if not query:
+            return self.none()
+
+        return self.filter(query)
+
 
 class Statistics(JSONModel):
     id = JSONAutoField(unique=True)
@@ -471,81 +1175,6 @@ class TrackedWorkshopModel(TrackedModel, InfoMixin, IndexingMixin):
             _field_name = field.name
         return getattr(self, _field_name)
 
-    @staticmethod
-    def _flatten_rels_dict(rels_dict):
-        ret = {}
-        for key, inner_rel_dict in rels_dict.items():
-            if inner_rel_dict['type'] == 'OneToOneField':
-                flattened_inner_rel_dict = {key: inner_rel_dict}
-            elif inner_rel_dict['type'] == 'ForeignKey':
-                flattened_inner_rel_dict = {
-                    key: {
-                        **inner_rel_dict,
-                        'ids': list(set(inner_rel_dict['ids']))
-                    }
-                }
-            elif inner_rel_dict['type'] == 'ManyToManyField':
-                flattened_inner_rel_dict = {
-                    key: {
-                        **inner_rel_dict,
-                        RELATIONSHIPS: list(set(inner_rel_dict[RELATIONSHIPS])),
-                        REFERENCES: list(set(inner_rel_dict[REFERENCES])),
-                    },
-                }
-            else:
-                flattened_inner_rel_dict = inner_rel_dict
-            ret.update(flattened_inner_rel_dict)
-
-        return ret
-
-    def _add_to_rels_dict(self, field, instance, rel_level=None):
-        field_type = field.get_internal_type()
-        rels_dict = self.rels_dict
-
-        if field_type == 'OneToOneField':
-            rels_dict[field.name]['id'] = instance.id
-            ins_rels_dict = instance.rels_dict
-            ins_rels_dict[field.remote_field.name]['id'] = self.id
-
-        elif field_type == 'ForeignKey':
-            rels_dict[field.name]['ids'] = [instance.id]
-            ins_rels_dict = instance.rels_dict
-            ins_rels_dict[field.remote_field.name]['ids'].append(self.id)
-
-        elif field_type == 'ManyToManyField':
-            if rel_level == RELATIONSHIPS:
-                ins_rels_dict = instance.rels_dict
-                ins_rels_dict[self._meta.model.related_name][RELATIONSHIPS].append(self.id)
-            rels_dict[field.name][rel_level].append(instance.id)
-
-        instance.rels_dict = self._flatten_rels_dict(ins_rels_dict)
-        instance.save(using=settings.STUDIO_DB)
-
-        self.rels_dict = self._flatten_rels_dict(rels_dict)
-        self.save(using=settings.STUDIO_DB)
-
-    def _remove_from_rels_dict(self, field, instance):
-        field_type = field.get_internal_type()
-        rels_dict = self.rels_dict
-
-        if field_type == 'OneToOneField':
-            rels_dict[field.name]['id'] = None
-        elif field_type == 'ForeignKey':
-            rels_dict[field.name]['ids'].remove(instance.id)
-            ins_rels_dict = instance.rels_dict
-            ins_rels_dict[self._meta.model_name.lower()]['ids'].remove(self.id)
-            instance.rels_dict = self._flatten_rels_dict(ins_rels_dict)
-            instance.save(using=settings.STUDIO_DB)
-        elif field_type == 'ManyToManyField':
-            for rel_level in (RELATIONSHIPS, REFERENCES):
-                try:
-                    rels_dict[field.name][rel_level].remove(instance.id)
-                except ValueError:
-                    pass
-
-        self.rels_dict = self._flatten_rels_dict(rels_dict)
-        self.save(using=settings.STUDIO_DB)
-
     def set_order(self, order, media_type):
         order_dict = self.order
         order_dict[media_type] = order
@@ -573,28 +1202,339 @@ class TrackedWorkshopModel(TrackedModel, InfoMixin, IndexingMixin):
         order.insert(result['destination']['index'], result['draggable_id'])
         self.set_order(order, media_type)
 
+    def add_rels(self, field, instances):
+        """
+        Relate several instances through a many to many field at once, with one
+        through table insert and one ``rels_dict`` update for each end.
+        """
+        self._get_field_value(field=field).add(*instances)
+        Relationship.objects.relate(self, field, instances, level=RELATIONSHIPS)
+
+    def add_refs(self, field, instances):
+        self._get_field_value(field=field).add(*instances)
+        Relationship.objects.relate(self, field, instances, level=REFERENCES)
+
+    def remove_rels(self, field, instances):
+        self._get_field_value(field=field).remove(*instances)
+        Relationship.objects.unrelate(self, field, instances)
+
     def add_rel(self, field, instance):
-        self._get_field_value(field=field).add(instance)
-        self._add_to_rels_dict(field, instance, rel_level=RELATIONSHIPS)
+        self.add_rels(field, [instance])
 
     def remove_rel(self, field, instance):
-        self._get_field_value(field=field).remove(instance)
-        self._remove_from_rels_dict(field, instance)
+        self.remove_rels(field, [instance])
 
     def add_ref(self, field, instance):
-        self._get_field_value(field=field).add(instance)
-        self._add_to_rels_dict(field, instance, rel_level=REFERENCES)
+        self.add_refs(field, [instance])
 
     def remove_ref(self, field, instance):
         self.remove_rel(field, instance)
 
     def add_fk(self, field, instance):
-        setattr(self, f'{field.name}_id', instance.id)
-        self._add_to_rels_dict(field, instance)
+        setattr(self, field.attname, instance.id)
+        self.save(using=STUDIO_DB, update_fields=[field.attname])
+        Relationship.objects.relate(self, field, [instance])
 
     def remove_fk(self, field, instance):
-        setattr(self, f'{field.name}_id', None)
-        self._remove_from_rels_dict(field, instance)
+        setattr(self, field.attname, None)
+        self.save(using=STUDIO_DB, update_fields=[field.attname])
+        Relationship.objects.unrelate(self, field, [instance])
+
+
+RELATIONSHIP_LEVEL_OPTIONS = (
+    (RELATIONSHIPS, RELATIONSHIPS),
+    (REFERENCES, REFERENCES),
+)
+
+
+RELATIONSHIP_UNIQUE_FIELDS = ('source_content_type', 'source_id', 'field_name', 'target_content_type', 'target_id')
+
+
+def _get_related_field_name(field):
+    """
+    Return the name of the field, on the related model, that holds the other
+    end of ``field``. Symmetrical many to many fields are their own other end.
+    """
+    if isinstance(field, ForeignObjectRel):
+        return field.field.name
+    if field.many_to_many and field.remote_field.symmetrical:
+        return field.name
+    return field.remote_field.name
+
+
+def _add_to_rels_dict(rels_dict, field_name, instance_id, rel_level):
+    inner_rels_dict = rels_dict.get(field_name)
+    if inner_rels_dict is None:
+        return
+
+    field_type = inner_rels_dict['type']
+    if field_type == 'OneToOneField':
+        inner_rels_dict['id'] = instance_id
+    elif field_type == 'ForeignKey':
+        if instance_id not in inner_rels_dict['ids']:
+            inner_rels_dict['ids'].append(instance_id)
+    elif field_type == 'ManyToManyField':
+        if instance_id not in inner_rels_dict[rel_level]:
+            inner_rels_dict[rel_level].append(instance_id)
+
+
+def _get_relationships_version_key(using):
+    return f'relationships-version-{using}'
+
+
+class RelationshipManager(models.Manager):
+    """Custom model manager for Relationship"""
+    def get_version(self, using=STUDIO_DB):
+        """
+        Return a token that changes whenever relationships are written, so
+        results derived from them can be cached until they change.
+        """
+        return cache.get_or_set(_get_relationships_version_key(using), 0, None)
+
+    def touch(self, using=STUDIO_DB):
+        """
+        Change the version of the relationships once the current transaction commits.
+        """
+        transaction.on_commit(
+            lambda: cache.set(_get_relationships_version_key(using), timezone.now().timestamp(), None),
+            using=using,
+        )
+
+    def get_neighborhood(self, instance, depth=1, fan_out=50, max_nodes=500, using=STUDIO_DB):
+        """
+        Walk the relationships around ``instance``, from either end, up to ``depth`` hops away
+        with a single recursive query. At most ``fan_out`` relationships are followed from each
+        instance, the oldest first, and at most ``max_nodes`` instances, the closest first, are
+        kept. Returns the ``(content_type_id, id, depth)`` of the instances found along with the
+        ``(source_content_type_id, source_id, target_content_type_id, target_id, field_name, level)``
+        of the relationships between them.
+        """
+        table = self.model._meta.db_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH RECURSIVE neighborhood (content_type_id, id, depth) AS (
+                    SELECT %s, %s, 0
+                    UNION
+                    SELECT adjacent.content_type_id, adjacent.id, n.depth + 1
+                    FROM neighborhood n
+                    CROSS JOIN LATERAL (
+                        SELECT a.content_type_id, a.id
+                        FROM (
+                            SELECT r.target_content_type_id AS content_type_id, r.target_id AS id,
+                                   r.id AS relationship_id
+                            FROM {table} r
+                            WHERE r.source_content_type_id = n.content_type_id AND r.source_id = n.id
+                            UNION ALL
+                            SELECT r.source_content_type_id, r.source_id, r.id
+                            FROM {table} r
+                            WHERE r.target_content_type_id = n.content_type_id AND r.target_id = n.id
+                        ) a
+                        ORDER BY a.relationship_id
+                        LIMIT %s
+                    ) adjacent
+                    WHERE n.depth < %s
+                ),
+                nodes AS (
+                    SELECT content_type_id, id, min(depth) AS depth
+                    FROM neighborhood
+                    GROUP BY content_type_id, id
+                    ORDER BY depth, content_type_id, id
+                    LIMIT %s
+                )
+                SELECT
+                    (SELECT json_agg(json_build_array(n.content_type_id, n.id, n.depth)
+                                     ORDER BY n.depth, n.content_type_id, n.id)
+                     FROM nodes n),
+                    (SELECT json_agg(json_build_array(r.source_content_type_id, r.source_id,
+                                                      r.target_content_type_id, r.target_id, r.field_name, r.level)
+                                     ORDER BY r.id)
+                     FROM {table} r
+                     JOIN nodes s ON s.content_type_id = r.source_content_type_id AND s.id = r.source_id
+                     JOIN nodes t ON t.content_type_id = r.target_content_type_id AND t.id = r.target_id)
+                ''',
+                [_get_content_type(instance=instance).id, instance.id, fan_out, depth, max_nodes],
+            )
+            nodes, relationships = cursor.fetchone()
+
+        return nodes or [], relationships or []
+
+    def _get_related_ids_sql(self, content_type_id, field_name, rel_level):
+        """
+        Return the SQL, and its params, of a subquery listing the ids held at ``rel_level``
+        by the ``field_name`` key of the ``rels_dict`` of the row ``t``, along with the id
+        of the relationship each one comes from.
+        """
+        table = self.model._meta.db_table
+        sql = f'SELECT r.target_id AS related_id, r.id AS relationship_id FROM {table} r ' \
+              f'WHERE r.source_content_type_id = %s AND r.source_id = t.id AND r.field_name = %s AND r.level = %s'
+        params = [content_type_id, field_name, rel_level]
+        if rel_level == RELATIONSHIPS:
+            # References are only listed on the instance that holds them.
+            sql += f' UNION ALL SELECT r.source_id, r.id FROM {table} r ' \
+                   f'WHERE r.target_content_type_id = %s AND r.target_id = t.id ' \
+                   f'AND r.related_field_name = %s AND r.level = %s'
+            params += [content_type_id, field_name, RELATIONSHIPS]
+
+        return sql, params
+
+    def _materialize_field(self, model_class, ids, field_name, using=STUDIO_DB):
+        """
+        Rebuild the ``field_name`` key of the ``rels_dict`` of the instances of ``model_class``
+        with the given ids from their relationships, using a single ``jsonb_set`` update.
+        The rows are locked beforehand so the update sees the relationships committed by
+        any concurrent editor. Returns a dict of the form ``{(model_label, id): rels_dict}``.
+        """
+        if not len(ids) or not issubclass(model_class, TrackedWorkshopModel):
+            return {}
+
+        content_type = _get_content_type(model=model_class)
+        field_type = model_class._meta.get_field(field_name).get_internal_type()
+        if field_type == 'OneToOneField':
+            keys = ((RELATIONSHIPS, 'id'),)
+        elif field_type == 'ForeignKey':
+            keys = ((RELATIONSHIPS, 'ids'),)
+        else:
+            keys = ((RELATIONSHIPS, RELATIONSHIPS), (REFERENCES, REFERENCES))
+
+        value_sql, params = 't.rels_dict', []
+        for rel_level, key in keys:
+            related_ids_sql, related_ids_params = self._get_related_ids_sql(content_type.id, field_name, rel_level)
+            if key == 'id':
+                related_sql = f'SELECT coalesce((SELECT to_jsonb(e.related_id) FROM ({related_ids_sql}) e ' \
+                              f"ORDER BY e.relationship_id DESC LIMIT 1), 'null'::jsonb)"
+            else:
+                related_sql = f"SELECT coalesce(jsonb_agg(u.related_id ORDER BY u.relationship_id), '[]'::jsonb) " \
+                              f'FROM (SELECT e.related_id, min(e.relationship_id) AS relationship_id ' \
+                              f'FROM ({related_ids_sql}) e GROUP BY e.related_id) u'
+            value_sql = f'jsonb_set({value_sql}, %s::text[], ({related_sql}))'
+            params = [*params, [field_name, key], *related_ids_params]
+
+        queryset = model_class.objects.using(using)
+        with transaction.atomic(using=using):
+            list(queryset.select_for_update().filter(id__in=ids).order_by('id').values_list('id', flat=True))
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {model_class._meta.db_table} t SET rels_dict = {value_sql}, date_modified = now() '
+                    f'WHERE t.id IN %s RETURNING t.id, t.rels_dict',
+                    [*params, tuple(ids)],
+                )
+                rows = cursor.fetchall()
+
+        return {(model_class._meta.label, id_): rels_dict for id_, rels_dict in rows}
+
+    @staticmethod
+    def _refresh_rels_dicts(instances, rels_dicts):
+        for instance in instances:
+            rels_dict = rels_dicts.get((instance._meta.label, instance.id))
+            if rels_dict is not None:
+                instance.rels_dict = rels_dict
+
+    def relate(self, instance, field, related_instances, level=RELATIONSHIPS, using=STUDIO_DB):
+        """
+        Relate ``instance`` to each of ``related_instances`` through ``field``, writing every
+        relationship with a single upsert, then update the ``rels_dict`` of both ends with one
+        statement per end. A field that holds a single instance, e.g. a ``ForeignKey``, loses
+        its previous relationship.
+        """
+        model_class = instance._meta.model
+        content_type = _get_content_type(model=model_class)
+        related_model_class = field.related_model
+        related_content_type = _get_content_type(model=related_model_class)
+        related_field_name = '' if level == REFERENCES else _get_related_field_name(field)
+        related_ids = list({related_instance.id: None for related_instance in related_instances})
+
+        with transaction.atomic(using=using):
+            if field.many_to_one or field.one_to_one:
+                previous = self \
+                    .using(using) \
+                    .filter(source_content_type=content_type, source_id=instance.id, field_name=field.name)
+                previous_ids = list(previous.values_list('target_id', flat=True))
+                previous.delete()
+            else:
+                previous_ids = []
+
+            bulk_upsert(self.model, [
+                self.model(
+                    source_content_type=content_type,
+                    source_id=instance.id,
+                    field_name=field.name,
+                    related_field_name=related_field_name,
+                    target_content_type=related_content_type,
+                    target_id=related_id,
+                    level=level,
+                ) for related_id in related_ids
+            ], using=using, unique_fields=RELATIONSHIP_UNIQUE_FIELDS)
+
+            self.touch(using=using)
+            rels_dicts = self._materialize_field(model_class, [instance.id], field.name, using=using)
+            if level == RELATIONSHIPS:
+                rels_dicts.update(self._materialize_field(
+                    related_model_class, list({*related_ids, *previous_ids}), related_field_name, using=using,
+                ))
+
+        self._refresh_rels_dicts([instance, *related_instances], rels_dicts)
+
+    def unrelate(self, instance, field, related_instances, using=STUDIO_DB):
+        """
+        Remove the relationships between ``instance`` and ``related_instances`` through
+        ``field``, whichever end they were created from, with a single delete, then update
+        the ``rels_dict`` of both ends with one statement per end.
+        """
+        model_class = instance._meta.model
+        content_type = _get_content_type(model=model_class)
+        related_model_class = field.related_model
+        related_content_type = _get_content_type(model=related_model_class)
+        related_field_name = _get_related_field_name(field)
+        related_ids = list({related_instance.id: None for related_instance in related_instances})
+        if not len(related_ids):
+            return
+
+        with transaction.atomic(using=using):
+            self \
+                .using(using) \
+                .filter(
+                    Q(source_content_type=content_type, source_id=instance.id, field_name=field.name,
+                      target_content_type=related_content_type, target_id__in=related_ids) |
+                    Q(source_content_type=related_content_type, source_id__in=related_ids,
+                      field_name=related_field_name, target_content_type=content_type, target_id=instance.id)
+                ) \
+                .delete()
+
+            self.touch(using=using)
+            rels_dicts = self._materialize_field(model_class, [instance.id], field.name, using=using)
+            rels_dicts.update(self._materialize_field(
+                related_model_class, related_ids, related_field_name, using=using,
+            ))
+
+        self._refresh_rels_dicts([instance, *related_instances], rels_dicts)
+
+
+class Relationship(models.Model):
+    """
+    A relationship held by a tracked instance, through one of its fields, on another
+    one. Relationships are the source of truth of the ``rels_dict`` of the instances
+    of ``TrackedWorkshopModel``, which is materialized from them when they change.
+    References are only listed in the ``rels_dict`` of the instance that holds them.
+    """
+    source_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    source_id = models.PositiveIntegerField(_('Source id'))
+    field_name = models.CharField(_('Field name on the source'), max_length=128)
+    related_field_name = models.CharField(_('Field name on the target'), max_length=128, blank=True)
+    target_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='+')
+    target_id = models.PositiveIntegerField(_('Target id'))
+    level = models.CharField(_('Level'), max_length=4, choices=RELATIONSHIP_LEVEL_OPTIONS, default=RELATIONSHIPS)
+    date_created = models.DateTimeField(_('Date of creation'), default=timezone.now)
+
+    objects = RelationshipManager()
+
+    class Meta:
+        unique_together = RELATIONSHIP_UNIQUE_FIELDS
+        index_together = ('target_content_type', 'target_id')
+
+    def __str__(self):
+        return f'{self.source_content_type_id} {self.source_id} {self.field_name} ' \
+               f'-> {self.target_content_type_id} {self.target_id} <{self.level}>'
 
 
 class ChangeGroupManager(models.Manager):
@@ -605,18 +1545,18 @@ class ChangeGroupManager(models.Manager):
         instance and its child instances.
         """
         content_type = _get_content_type(instance=instance)
-        query = Q(
+        query = (Q(
             content_type=content_type, base_id=instance.id,
-        ) or Q(
+        ) | Q(
             parent_content_type=content_type, parent_object_id=instance.id,
-        ) and Q(
+        )) & Q(
             committed=False,
         )
         changes = Change.objects.filter(query).order_by('date_created')
 
         if not changes.count():
             return {'published': False, 'message': 'No changes made since last publish.'}
-        changes_committed = [change.commit() for change in changes]
+        changes_committed = Change.objects.bulk_commit(changes)
 
         description = f'{str(request.user)} published <{instance._meta.model_name}> instance {str(instance)}'
         change_group = self.model(
@@ -639,7 +1579,7 @@ class ChangeGroupManager(models.Manager):
         if not len(changes):
             return {'published': False, 'message': 'No changes made since last bulk commit.'}
 
-        changes_committed = [change.commit() for change in changes]
+        changes_committed = Change.objects.bulk_commit(changes)
         description = f'{str(request.user)} published {len(changes_committed)} workshop changes.'
         change_group = self.model(
             description=description,
@@ -666,3 +1606,154 @@ class ChangeGroup(models.Model):
 
     def __str__(self):
         return self.description
+
+
+class CommitCheckpoint(models.Model):
+    """
+    Records that every change to a base instance up to ``last_change_id`` has
+    been committed as part of a ``bulk_commit`` run, so that an interrupted run
+    can resume where it stopped.
+    """
+    run = models.CharField(_('Name of the bulk commit run'), max_length=128, db_index=True)
+    content_type = models.ForeignKey(ContentType, null=True, on_delete=models.CASCADE)
+    base_id = models.PositiveIntegerField(_('Base instance id'), null=True)
+    last_change_id = models.PositiveIntegerField(_('Last committed change id'))
+    change_count = models.PositiveIntegerField(_('Number of changes committed'), default=0)
+    date_created = models.DateTimeField(_('Date of checkpoint'), default=timezone.now)
+
+    class Meta:
+        unique_together = ('run', 'content_type', 'base_id')
+
+    def __str__(self):
+        return f'{self.run} | {self.content_type_id} {self.base_id} <{self.last_change_id}>'
+
+
+class ArchivedChange(models.Model):
+    """
+    A committed change moved to the HISTORY_DB by ``archive_history``. Its columns
+    mirror the ``Change`` table so rows can be copied in bulk. Relations are stored
+    as plain ids because the objects they point to are not in the HISTORY_DB.
+    """
+    id = models.IntegerField(_('Id of the change'), primary_key=True)
+    stage_type = models.CharField(_('Stage type'), blank=True, max_length=128, choices=STAGE_OPTIONS)
+    description = models.CharField(_('Change description'), blank=True, max_length=256)
+    content_type_id = models.PositiveIntegerField(_('Content type id'), null=True)
+    object_id = models.PositiveIntegerField(_('Copy instance id'), null=True)
+    base_id = models.PositiveIntegerField(_('Base instance id'), null=True)
+    snapshot_id = models.PositiveIntegerField(_('Snapshot id'), null=True, blank=True)
+    parent_content_type_id = models.PositiveIntegerField(_('Parent content type id'), null=True, blank=True)
+    parent_object_id = models.PositiveIntegerField(_('Parent instance id'), null=True, blank=True)
+    one_to_one_models = JSONField(_("Fully describes base instance's one to one rels"), blank=True, null=True)
+    many_to_many_models = JSONField(_("Describes base instance's many to manys rels"), blank=True, null=True)
+    date_created = models.DateTimeField(_('Date of creation'))
+    committed = models.BooleanField(_('Whether the change has been committed'), default=True)
+    date_committed = models.DateTimeField(_('Date of commit'))
+    reverted = models.BooleanField(_('Whether the change has been reverted'), default=False)
+    date_reverted = models.DateTimeField(_('Date of revert'))
+    user_id = models.PositiveIntegerField(_('User id'), null=True)
+
+    class Meta:
+        index_together = ('content_type_id', 'base_id')
+
+    def __str__(self):
+        return f'{self.id} | {self.description}'
+
+    def to_change(self):
+        """
+        Return an unsaved ``Change`` holding the archived values.
+        """
+        return Change(**{field.attname: getattr(self, field.attname) for field in Change._meta.concrete_fields})
+
+
+class ArchivedChangeGroup(models.Model):
+    """A change group moved to the HISTORY_DB by ``archive_history``."""
+    id = models.IntegerField(_('Id of the change group'), primary_key=True)
+    description = models.CharField(_('Short description of the change group'), max_length=128)
+    date_created = models.DateTimeField(_('Date when change group committed'), blank=True)
+    content_type_id = models.PositiveIntegerField(_('Content type id'), null=True)
+    object_id = models.PositiveIntegerField(_('ID of parent instance'), blank=True, null=True)
+    user_id = models.PositiveIntegerField(_('User id'), null=True)
+
+    def __str__(self):
+        return self.description
+
+
+class ArchivedChangeGroupLink(models.Model):
+    """A row of the ``ChangeGroup.changes_committed`` table moved to the HISTORY_DB."""
+    id = models.IntegerField(_('Id of the link'), primary_key=True)
+    changegroup_id = models.PositiveIntegerField(_('Change group id'), db_index=True)
+    change_id = models.PositiveIntegerField(_('Change id'))
+
+
+def archive_history(cutoff, batch_size=1000, logging=False):
+    """
+    Move the change groups created before ``cutoff``, with their links and changes, and the
+    other changes committed before ``cutoff`` to the HISTORY_DB in batches of at most
+    ``batch_size`` groups or changes. Each batch is copied with ``COPY`` and then deleted
+    from the STUDIO_DB. Snapshots stay in the SNAPSHOT_DB as later snapshots of the same
+    instances are encoded against them. Returns the number of changes archived.
+    """
+    if HISTORY_DB not in settings.DATABASES:
+        raise ImproperlyConfigured(f"The '{HISTORY_DB}' database is needed to archive history.")
+
+    through_model = ChangeGroup.changes_committed.through
+
+    def _archive(group_ids, change_ids):
+        with transaction.atomic(using=STUDIO_DB), transaction.atomic(using=HISTORY_DB):
+            # Clear anything left by a batch that was
+            # copied but not deleted from the STUDIO_DB.
+            ArchivedChangeGroupLink.objects.filter(changegroup_id__in=group_ids).delete()
+            ArchivedChangeGroup.objects.filter(id__in=group_ids).delete()
+            ArchivedChange.objects.filter(id__in=change_ids).delete()
+
+            copy_rows(through_model, ArchivedChangeGroupLink, 'changegroup_id', group_ids, STUDIO_DB, HISTORY_DB)
+            copy_rows(ChangeGroup, ArchivedChangeGroup, 'id', group_ids, STUDIO_DB, HISTORY_DB)
+            copy_rows(Change, ArchivedChange, 'id', change_ids, STUDIO_DB, HISTORY_DB)
+
+            through_model.objects.using(STUDIO_DB).filter(changegroup_id__in=group_ids).delete()
+            ChangeGroup.objects.using(STUDIO_DB).filter(id__in=group_ids).delete()
+            Change.objects.using(STUDIO_DB).filter(id__in=change_ids).delete()
+
+    archived = 0
+    while True:
+        group_ids = list(ChangeGroup.objects
+                         .using(STUDIO_DB)
+                         .filter(date_created__lt=cutoff)
+                         .order_by('id')
+                         .values_list('id', flat=True)[:batch_size])
+        if not len(group_ids):
+            break
+        change_ids = list(through_model.objects
+                          .using(STUDIO_DB)
+                          .filter(changegroup_id__in=group_ids)
+                          .values_list('change_id', flat=True)
+                          .distinct())
+        # A change can also belong to a group that is not being
+        # archived yet, in which case it is left where it is.
+        shared_change_ids = set(through_model.objects
+                                .using(STUDIO_DB)
+                                .filter(change_id__in=change_ids)
+                                .exclude(changegroup_id__in=group_ids)
+                                .values_list('change_id', flat=True))
+        change_ids = [change_id for change_id in change_ids if change_id not in shared_change_ids]
+
+        _archive(group_ids, change_ids)
+        archived += len(change_ids)
+        if logging:
+            print(f'Archived {len(group_ids)} change groups and {len(change_ids)} changes.')
+
+    while True:
+        change_ids = list(Change.objects
+                          .using(STUDIO_DB)
+                          .filter(committed=True, date_committed__lt=cutoff, changegroup__isnull=True)
+                          .order_by('id')
+                          .values_list('id', flat=True)[:batch_size])
+        if not len(change_ids):
+            break
+
+        _archive([], change_ids)
+        archived += len(change_ids)
+        if logging:
+            print(f'Archived {len(change_ids)} changes.')
+
+    return archived
@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import models
+from .models import Change
+from shared.utils import get_model
+
+
+def publish_instances(job, model_label, ids):
+    """
+    Commit the uncommitted changes of each instance, reporting progress to the job
+    after each one. If an instance has no uncommitted changes its latest committed
+    change is committed again.
+    """
+    model_class = get_model(model_label=model_label)
+    instances = list(model_class.objects.using(settings.STUDIO_DB).filter(id__in=ids))
+
+    committed_changes = []
+    for index, instance in enumerate(instances):
+        instance_committed_changes = Change.objects.commit_for_instance(instance)
+        if not len(instance_committed_changes):
+            committed_changes_for_instance = Change.objects.get_for_instance(instance, committed=True)
+            if len(committed_changes_for_instance):
+                instance_committed_changes = [committed_changes_for_instance[-1].commit()]
+        committed_changes.extend(instance_committed_changes)
+        job.set_progress((index + 1) / len(instances), f'Published {index + 1} of {len(instances)} instances.')
+
+    return {
+        'ids': ids,
+        'changes_committed': [c.id for c in committed_changes],
+    }
+
+
+def archive_history(job, days, batch_size=1000):
+    """
+    Archive the history committed more than ``days`` days ago.
+    """
+    archived = models.archive_history(timezone.now() - timedelta(days=days), batch_size=batch_size)
+
+    return {'changes_archived': archived}
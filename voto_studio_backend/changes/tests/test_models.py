@@ -1,10 +1,12 @@
 import time
+from datetime import timedelta
+from unittest import mock
 
-from django.db.models.fields.related import OneToOneRel
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.shortcuts import get_object_or_404
 from django.test import TestCase, RequestFactory, TransactionTestCase
+from django.utils import timezone
 from .. import models
 from shared.testing.test_app.models import BasicModel, create_random_string
 from shared.testing.es_test_cases import ESTestCase
@@ -40,21 +42,41 @@ class ChangeManagerTests(TestCase):
         self.assertIsInstance(content_type, ContentType)
         self.assertEqual(content_type.model_class(), BasicModel)
 
-    def test__copy_instance(self):
-        base_instance_id = self.instance.id
-        base_instance, copy_instance = models.Change.objects._copy_instance(self.instance)
-
-        self.assertFalse(copy_instance.tracked)
-        fields = copy_instance._meta.get_fields()
-        self.assertFalse(any([getattr(copy_instance, f.name) for f in fields
-                              if f.get_internal_type() == 'OneToOneField' and not isinstance(f, OneToOneRel)]))
-
-        self.assertFalse(any([getattr(copy_instance, f.name).values() for f in copy_instance._meta.many_to_many]))
-        self.assertEqual(base_instance_id, base_instance.id)
-
-        base_basic_fields = [f for f in base_instance._meta.get_fields() if not f.is_relation or f.name == 'id']
-        new_basic_fields = [f for f in copy_instance._meta.get_fields() if not f.is_relation or f.name == 'id']
-        self.assertEqual(base_basic_fields, new_basic_fields)
+    def test_snapshots(self):
+        char_fields = []
+        for _ in range(settings.SNAPSHOT_KEYFRAME_INTERVAL + 2):
+            char_fields.append(create_random_string(seed=str(len(char_fields))))
+            self.instance.char_field = char_fields[-1]
+            self.instance.save(using=settings.STUDIO_DB)
+            models.Snapshot.objects.take(self.instance)
+
+        snapshots = models.Snapshot.objects \
+            .filter(model_label=BasicModel._meta.label, base_id=self.instance.id) \
+            .order_by('version')
+
+        self.assertEqual([s.version for s in snapshots], list(range(len(char_fields))))
+        self.assertEqual([s.version for s in snapshots if s.keyframe], [0, settings.SNAPSHOT_KEYFRAME_INTERVAL])
+        self.assertEqual(snapshots[1].data, {'char_field': char_fields[1]})
+
+        for snapshot, char_field in zip(snapshots, char_fields):
+            instance = snapshot.rebuild()
+            self.assertEqual(instance.id, self.instance.id)
+            self.assertEqual(instance.char_field, char_field)
+            self.assertEqual(instance.text_field, self.instance.text_field)
+            self.assertEqual(instance.date_time_field, self.instance.date_time_field)
+
+    def test_snapshots_concurrent_take(self):
+        models.Snapshot.objects.take(self.instance)
+
+        # Another process took the first snapshot after this one read the latest snapshots.
+        get_states = models.Snapshot.objects._get_states
+        side_effect = [{}, get_states(BasicModel._meta.label, {self.instance.id: None})]
+        with mock.patch.object(models.Snapshot.objects, '_get_states', side_effect=side_effect):
+            snapshot = models.Snapshot.objects.take(self.instance)
+
+        self.assertEqual(snapshot.version, 1)
+        self.assertFalse(snapshot.keyframe)
+        self.assertEqual(models.Snapshot.objects.get_latest_version(self.instance), 1)
 
     def test__create_change(self):
         new_char_field = create_random_string()
@@ -69,7 +91,7 @@ class ChangeManagerTests(TestCase):
         )
 
         self.assertEqual(change.base_id, base_instance.id)
-        self.assertNotEqual(change.object_id, base_instance.id)
+        self.assertIsNotNone(change.snapshot_id)
         self.assertEqual(self.instance.char_field, new_char_field)
         self.assertEqual(base_instance.char_field, new_char_field)
 
@@ -92,11 +114,11 @@ class ChangeManagerTests(TestCase):
         )
         self.assertEqual(change.base_id, base_instance.id)
         self.assertEqual(rel_change.base_id, rel_base_instance.id)
-        self.assertNotEqual(change.object_id, base_instance.id)
-        self.assertNotEqual(rel_change.object_id, rel_base_instance.id)
+        self.assertIsNotNone(change.snapshot_id)
+        self.assertIsNotNone(rel_change.snapshot_id)
 
-        self.assertFalse(self.instance.many_to_many_field.all())
-        self.assertFalse(extra_instance.many_to_many_field.all())
+        self.assertEqual(change.rebuild().one_to_one_field_id, rel_base_instance.id)
+        self.assertIsNone(rel_change.rebuild().one_to_one_field_id)
 
         self.assertEqual(change.one_to_one_models, {'one_to_one_field': rel_base_instance.id})
         self.assertEqual(change.many_to_many_models['many_to_many_field'], [rel_base_instance.id])
@@ -146,7 +168,32 @@ class ChangeManagerTests(TestCase):
         self.assertEqual(updated_base_instance.char_field, new_char_field)
 
     def test_bulk_stage_created(self):
-        ...
+        instances = [create_instance(user=self.user) for _ in range(5)]
+        instance_ids = [instance.id for instance in instances]
+        base_instances = models.Change.objects.bulk_stage_created(instances, self.request)
+
+        self.assertEqual([base_instance.id for base_instance in base_instances], instance_ids)
+
+        changes = models.Change.objects.filter(base_id__in=instance_ids, stage_type=models.STAGE_CREATED)
+        self.assertEqual(changes.count(), len(instances))
+        for change in changes:
+            self.assertIsNotNone(change.snapshot_id)
+            self.assertEqual(change._get_instance(using=settings.STUDIO_DB, base=False).id, change.base_id)
+
+    def test_bulk_stage_created_relationships(self):
+        extra_instance = create_instance(user=self.user)
+        self.instance.one_to_one_field = extra_instance
+        self.instance.save(using=settings.STUDIO_DB)
+        self.instance.many_to_many_field.add(extra_instance)
+
+        models.Change.objects.bulk_stage_updated([self.instance, extra_instance, self.instance], self.request)
+
+        change = models.Change.objects.get_for_instance(self.instance).last()
+        rel_change = models.Change.objects.get_for_instance(extra_instance).last()
+        self.assertEqual(models.Change.objects.get_for_instance(self.instance).count(), 1)
+        self.assertEqual(change.one_to_one_models, {'one_to_one_field': extra_instance.id})
+        self.assertEqual(change.many_to_many_models['many_to_many_field'], [extra_instance.id])
+        self.assertEqual(rel_change.many_to_many_models['many_to_many_field'], [self.instance.id])
 
     def test_bulk_stage_updated(self):
         instances = [create_instance(user=self.user) for _ in range(5)]
@@ -163,7 +210,95 @@ class ChangeManagerTests(TestCase):
             self.assertEqual(base_instance.char_field, new_char_fields[i])
 
     def test_bulk_stage_deleted(self):
-        ...
+        instances = [create_instance(user=self.user) for _ in range(5)]
+        for instance in instances:
+            instance.delete(fake=True)
+
+        base_instances = models.Change.objects.bulk_stage_deleted(instances, self.request)
+
+        for base_instance in base_instances:
+            self.assertFalse(base_instance.tracked)
+        self.assertEqual(models.Change.objects.filter(
+            base_id__in=[instance.id for instance in instances],
+            stage_type=models.STAGE_DELETED,
+        ).count(), len(instances))
+
+    def test_stage_updated_unchanged(self):
+        models.Change.objects.stage_updated(self.instance, self.request)
+        change_count = models.Change.objects.get_for_instance(self.instance).count()
+
+        base_instance = models.Change.objects.stage_updated(self.instance, self.request)
+        self.assertEqual(base_instance.id, self.instance.id)
+        self.assertEqual(models.Change.objects.get_for_instance(self.instance).count(), change_count)
+
+        extra_instance = create_instance(user=self.user)
+        self.instance.many_to_many_field.add(extra_instance)
+        models.Change.objects.stage_updated(self.instance, self.request)
+        self.assertEqual(models.Change.objects.get_for_instance(self.instance).count(), change_count + 1)
+
+        self.instance.char_field = create_random_string(seed='unchanged')
+        self.instance.save(using=settings.STUDIO_DB)
+        models.Change.objects.stage_updated(self.instance, self.request)
+        self.assertEqual(models.Change.objects.get_for_instance(self.instance).count(), change_count + 2)
+
+    def test_stage_updated_orphaned_snapshot(self):
+        models.Change.objects.stage_updated(self.instance, self.request)
+        change_count = models.Change.objects.get_for_instance(self.instance).count()
+
+        # A change whose transaction rolled back leaves its
+        # snapshot behind when the snapshots are on another database.
+        self.instance.char_field = create_random_string(seed='orphaned')
+        self.instance.save(using=settings.STUDIO_DB)
+        models.Change.objects.stage_updated(self.instance, self.request)
+        models.Change.objects.get_for_instance(self.instance).latest('id').delete()
+
+        models.Change.objects.stage_updated(self.instance, self.request)
+        self.assertEqual(models.Change.objects.get_for_instance(self.instance).count(), change_count + 1)
+
+    def test_squash(self):
+        other_user = User.objects.create_user(
+            email='foo@squash.com',
+            name='Qux',
+            password='Foobarbaz123'
+        )
+        other_request = RequestFactory()
+        other_request.user = other_user
+
+        new_instance = create_instance(user=self.user)
+        models.Change.objects.stage_created(new_instance, self.request)
+        char_fields = []
+        for i, request in enumerate([self.request] * 3 + [other_request, self.request]):
+            char_fields.append(create_random_string(seed=str(i)))
+            new_instance.char_field = char_fields[-1]
+            new_instance.save(using=settings.STUDIO_DB)
+            models.Change.objects.stage_updated(new_instance, request)
+
+        deleted = models.Change.objects.squash()
+
+        changes = models.Change.objects.get_for_instance(new_instance).order_by('date_created', 'id')
+        self.assertEqual(deleted, 3)
+        self.assertEqual([c.user_id for c in changes], [self.user.id, other_user.id, self.user.id])
+        self.assertEqual([c.stage_type for c in changes],
+                         [models.STAGE_CREATED, models.STAGE_UPDATED, models.STAGE_UPDATED])
+        self.assertEqual([c.rebuild().char_field for c in changes], char_fields[2:])
+        self.assertEqual(models.Snapshot.objects.filter(base_id=new_instance.id,
+                                                        model_label=BasicModel._meta.label).count(), 3)
+        self.assertEqual(models.Change.objects.squash(), 0)
+
+    def test_snapshots_bulk_delete(self):
+        char_fields, snapshots = [], []
+        for i in range(5):
+            char_fields.append(create_random_string(seed=str(i)))
+            self.instance.char_field = char_fields[-1]
+            snapshots.append(models.Snapshot.objects.take(self.instance))
+
+        deleted = models.Snapshot.objects.bulk_delete([snapshots[0].id, snapshots[2].id])
+
+        self.assertEqual(deleted, 2)
+        rebuilt = models.Snapshot.objects.bulk_rebuild([s.id for s in snapshots])
+        self.assertEqual(set(rebuilt.keys()), {snapshots[1].id, snapshots[3].id, snapshots[4].id})
+        for i in (1, 3, 4):
+            self.assertEqual(rebuilt[snapshots[i].id].char_field, char_fields[i])
 
     def test_get_for_model(self):
         content_type = models._get_content_type(model=BasicModel)
@@ -208,6 +343,16 @@ class ChangeTests(TestCase):
         instance = change._get_instance(using=settings.STUDIO_DB, base=False)
         self.assertEqual(instance, new_instance)
 
+    def test_content_object(self):
+        new_instance = create_instance(user=self.user)
+        base_instance = models.Change.objects.stage_created(new_instance, self.request)
+        change = models.Change.objects.get_for_instance(base_instance).last()
+
+        self.assertIsNone(change.object_id)
+        self.assertEqual(change.content_object.id, base_instance.id)
+        self.assertEqual(change.content_object.char_field, base_instance.char_field)
+        self.assertEqual(BasicModel.objects.filter(id=base_instance.id).count(), 1)
+
     @create_test_user
     def test_commit(self, user):
         new_instance = create_instance(user=user)
@@ -258,6 +403,32 @@ class ChangeTests(TestCase):
 
         self.assertEqual(instance_on_studio_db, instance_on_main_site_db)
 
+    @create_test_user
+    def test_bulk_commit(self, user):
+        instances = [create_instance(user=user) for _ in range(3)]
+        base_instances = models.Change.objects.bulk_stage_created(instances, self.request)
+
+        new_char_fields = []
+        for base_instance in base_instances:
+            new_char_fields.append(create_random_string(seed=str(base_instance.id)))
+            base_instance.char_field = new_char_fields[-1]
+            base_instance.save(using=settings.STUDIO_DB)
+        models.Change.objects.bulk_stage_updated(base_instances, self.request)
+
+        changes = models.Change.objects.filter(base_id__in=[i.id for i in base_instances], committed=False)
+        change_count = changes.count()
+        committed_changes = models.Change.objects.bulk_commit(changes)
+
+        self.assertEqual(len(committed_changes), change_count)
+        self.assertFalse(models.Change.objects.filter(id__in=[c.id for c in committed_changes], committed=False))
+        for base_instance, new_char_field in zip(base_instances, new_char_fields):
+            instance_on_main_site_db = get_object_or_404(
+                BasicModel.objects.using(settings.MAIN_SITE_DB),
+                id=base_instance.id,
+            )
+            self.assertEqual(instance_on_main_site_db.char_field, new_char_field)
+            self.assertTrue(get_object_or_404(BasicModel, id=base_instance.id).published)
+
     def test_revert(self):
         ...
 
@@ -323,6 +494,11 @@ class ChangeGroupManagerTests(TestCase):
         response = models.ChangeGroup.objects.publish(base_instance, self.request)
 
         self.assertTrue(response['published'])
+        self.assertEqual(response['change_group'].changes_committed.count(), 3)
+
+        # The changes committed by the first publish aren't committed again.
+        response = models.ChangeGroup.objects.publish(base_instance, self.request)
+        self.assertFalse(response['published'])
 
         # Quickly make sure the ``published`` is ``False`` if an instance that has
         # no related change instances is given to the ``publish`` method.
@@ -360,3 +536,137 @@ class ChangeGroupManagerTests(TestCase):
 class ChangeGroupTests(TestCase):
     def setUp(self):
         ...
+
+
+class ArchiveHistoryTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@ArchiveHistoryTests.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    @create_test_user
+    def test_archive_history(self, user):
+        new_instance = create_instance(user=user)
+        base_instance = models.Change.objects.stage_created(new_instance, self.request)
+        changes = models.Change.objects.get_for_instance(base_instance, committed=False)
+        change_ids = [c.id for c in changes]
+        change_group = models.ChangeGroup.objects.bulk_commit(changes, self.request)['change_group']
+
+        self.assertEqual(models.archive_history(timezone.now() - timedelta(days=1)), 0)
+        self.assertEqual(models.archive_history(timezone.now() + timedelta(days=1), batch_size=1), len(change_ids))
+
+        self.assertFalse(models.Change.objects.filter(id__in=change_ids))
+        self.assertFalse(models.ChangeGroup.objects.filter(id=change_group.id))
+        self.assertTrue(models.ArchivedChangeGroup.objects.filter(id=change_group.id))
+        self.assertEqual(
+            list(models.ArchivedChangeGroupLink.objects
+                 .filter(changegroup_id=change_group.id)
+                 .values_list('change_id', flat=True)),
+            change_ids,
+        )
+
+        committed_changes = models.Change.objects.get_for_instance(base_instance, committed=True)
+        self.assertEqual([c.id for c in committed_changes], change_ids)
+        self.assertEqual(committed_changes[0].rebuild().id, base_instance.id)
+
+
+class RelationshipTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@RelationshipTests.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.instance = create_instance(user=self.user)
+        self.related_instance = create_instance(user=self.user)
+
+    def test_add_and_remove_rel(self):
+        field = BasicModel._meta.get_field('many_to_many_field')
+        self.instance.add_rel(field, self.related_instance)
+
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS],
+                         [self.related_instance.id])
+        self.related_instance.refresh_from_db()
+        self.assertEqual(self.related_instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS],
+                         [self.instance.id])
+        self.assertEqual(models.Relationship.objects.count(), 1)
+
+        self.instance.remove_rel(field, self.related_instance)
+
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS], [])
+        self.related_instance.refresh_from_db()
+        self.assertEqual(self.related_instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS], [])
+        self.assertFalse(models.Relationship.objects.exists())
+
+    def test_add_fk_replaces_relationship(self):
+        field = BasicModel._meta.get_field('foreign_key_field')
+        other_instance = create_instance(user=self.user)
+        self.instance.add_fk(field, self.related_instance)
+        self.instance.add_fk(field, other_instance)
+
+        self.instance.refresh_from_db()
+        self.related_instance.refresh_from_db()
+        other_instance.refresh_from_db()
+        self.assertEqual(self.instance.foreign_key_field_id, other_instance.id)
+        self.assertEqual(self.instance.rels_dict['foreign_key_field']['ids'], [other_instance.id])
+        self.assertEqual(self.related_instance.rels_dict['basic_models']['ids'], [])
+        self.assertEqual(other_instance.rels_dict['basic_models']['ids'], [self.instance.id])
+
+    def test_add_rels_and_refs(self):
+        field = BasicModel._meta.get_field('many_to_many_field')
+        related_instances = [self.related_instance, create_instance(user=self.user)]
+        referenced_instance = create_instance(user=self.user)
+        self.instance.add_rels(field, related_instances)
+        self.instance.add_refs(field, [referenced_instance])
+
+        inner_rels_dict = self.instance.rels_dict['many_to_many_field']
+        self.assertEqual(inner_rels_dict[models.RELATIONSHIPS], [i.id for i in related_instances])
+        self.assertEqual(inner_rels_dict[models.REFERENCES], [referenced_instance.id])
+        self.instance.refresh_from_db()
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'], inner_rels_dict)
+
+        for related_instance in related_instances:
+            self.assertEqual(related_instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS],
+                             [self.instance.id])
+        referenced_instance.refresh_from_db()
+        self.assertEqual(referenced_instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS], [])
+
+        self.instance.remove_rels(field, related_instances)
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS], [])
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'][models.REFERENCES], [referenced_instance.id])
+
+    def test_referencing(self):
+        field = BasicModel._meta.get_field('many_to_many_field')
+        referenced_instance = create_instance(user=self.user)
+        self.instance.add_rel(field, self.related_instance)
+        self.instance.add_ref(field, referenced_instance)
+
+        self.assertEqual(list(BasicModel.objects.referencing(self.related_instance)), [self.instance])
+        self.assertFalse(BasicModel.objects.referencing(referenced_instance))
+        self.assertEqual(list(BasicModel.objects.referencing(referenced_instance, level=models.REFERENCES)),
+                         [self.instance])
+        self.assertEqual(set(BasicModel.objects.referencing(self.instance, level=None)),
+                         {self.related_instance})
+
+    def test_get_neighborhood(self):
+        field = BasicModel._meta.get_field('many_to_many_field')
+        far_instance = create_instance(user=self.user)
+        self.instance.add_rel(field, self.related_instance)
+        self.related_instance.add_rel(field, far_instance)
+        content_type_id = models._get_content_type(model=BasicModel).id
+
+        nodes, relationships = models.Relationship.objects.get_neighborhood(self.instance, depth=1)
+        self.assertEqual(nodes, [[content_type_id, self.instance.id, 0],
+                                 [content_type_id, self.related_instance.id, 1]])
+        self.assertEqual(len(relationships), 1)
+
+        nodes, relationships = models.Relationship.objects.get_neighborhood(self.instance, depth=2)
+        self.assertEqual([node[1:] for node in nodes],
+                         [[self.instance.id, 0], [self.related_instance.id, 1], [far_instance.id, 2]])
+        self.assertEqual(len(relationships), 2)
@@ -0,0 +1,210 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, RequestFactory
+from .. import models, utils
+from shared.testing.test_app.models import BasicModel, create_random_string
+from shared.testing.utils import create_instance
+from voto_studio_backend.users.models import User
+
+
+class MigrateChangeCopiesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    def _create_legacy_change(self, instance):
+        """Stage a change the way it was staged before snapshots, with a copy instance."""
+        copy_instance = BasicModel.objects.using(settings.STUDIO_DB).get(id=instance.id)
+        copy_instance.id = None
+        copy_instance.tracked = False
+        copy_instance.save(using=settings.STUDIO_DB)
+
+        return models.Change.objects.create(
+            stage_type=models.STAGE_UPDATED,
+            content_type=models._get_content_type(instance=instance),
+            object_id=copy_instance.id,
+            base_id=instance.id,
+            user=self.user,
+        )
+
+    def test_migrate_change_copies(self):
+        instance = create_instance(user=self.user)
+        char_fields = []
+        changes = []
+        for i in range(3):
+            char_fields.append(create_random_string(seed=str(i)))
+            instance.char_field = char_fields[-1]
+            instance.save(using=settings.STUDIO_DB)
+            changes.append(self._create_legacy_change(instance))
+
+        migrated = utils.migrate_change_copies(batch_size=2)
+
+        self.assertEqual(migrated, len(changes))
+        self.assertFalse(BasicModel.objects.filter(tracked=False))
+        for change, char_field in zip(changes, char_fields):
+            change.refresh_from_db()
+            self.assertIsNone(change.object_id)
+            self.assertIsNotNone(change.snapshot_id)
+            self.assertEqual(change.content_object.id, instance.id)
+            self.assertEqual(change.content_object.char_field, char_field)
+
+    def test_migrate_change_copies_before_snapshots(self):
+        instance = create_instance(user=self.user)
+        instance.char_field = create_random_string(seed='legacy')
+        instance.save(using=settings.STUDIO_DB)
+        legacy_change = self._create_legacy_change(instance)
+
+        instance.char_field = create_random_string(seed='snapshot')
+        instance.save(using=settings.STUDIO_DB)
+        models.Change.objects.stage_updated(instance, self.request)
+        change = models.Change.objects.get_for_instance(instance).latest('id')
+
+        utils.migrate_change_copies()
+
+        legacy_change.refresh_from_db()
+        change.refresh_from_db()
+        legacy_snapshot = models.Snapshot.objects.get(id=legacy_change.snapshot_id)
+        snapshot = models.Snapshot.objects.get(id=change.snapshot_id)
+        self.assertLess(legacy_snapshot.version, snapshot.version)
+        self.assertEqual(legacy_change.content_object.char_field, create_random_string(seed='legacy'))
+        self.assertEqual(change.content_object.char_field, instance.char_field)
+        self.assertEqual(models.Snapshot.objects.rebuild(BasicModel, instance.id).char_field, instance.char_field)
+
+
+class RepairRelsDictsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.instance = create_instance(user=self.user)
+        self.related_instance = create_instance(user=self.user)
+
+    def test_repair_rels_dicts(self):
+        # Relate the instances behind the relationships table's back and
+        # wipe a rels_dict, as an out of date schema would leave it.
+        self.instance.many_to_many_field.add(self.related_instance)
+        BasicModel.objects.filter(id=self.related_instance.id).update(rels_dict={})
+
+        report = utils.repair_rels_dicts(BasicModel, dry_run=True)
+        self.assertEqual(report['mismatched'], 2)
+        self.assertEqual(report['missing_relationships'], 1)
+        self.assertFalse(models.Relationship.objects.exists())
+
+        utils.repair_rels_dicts(BasicModel)
+        self.instance.refresh_from_db()
+        self.related_instance.refresh_from_db()
+        self.assertEqual(self.instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS],
+                         [self.related_instance.id])
+        self.assertEqual(self.related_instance.rels_dict['many_to_many_field'][models.RELATIONSHIPS],
+                         [self.instance.id])
+        self.assertEqual(models.Relationship.objects.count(), 1)
+
+        report = utils.repair_rels_dicts(BasicModel)
+        self.assertEqual(report['mismatched'], 0)
+        self.assertEqual(report['missing_relationships'], 0)
+
+    def test_repair_rels_dicts_stages_whole_instances(self):
+        request = RequestFactory()
+        request.user = self.user
+        self.instance.many_to_many_field.add(self.related_instance)
+        deleted_instance = create_instance(user=self.user)
+        BasicModel.objects.filter(id=deleted_instance.id).update(tracked=False, rels_dict={})
+
+        report = utils.repair_rels_dicts(BasicModel, request=request)
+        self.assertEqual(sorted(report['ids']), sorted([self.instance.id, self.related_instance.id]))
+
+        changes = models.Change.objects.filter(stage_type=models.STAGE_UPDATED)
+        self.assertEqual(sorted(change.base_id for change in changes), sorted(report['ids']))
+        for change in changes:
+            instance = BasicModel.objects.get(id=change.base_id)
+            self.assertEqual(change.content_object.char_field, instance.char_field)
+            self.assertEqual(change.content_object.user_id, self.user.id)
+            self.assertEqual(change.content_object.rels_dict, instance.rels_dict)
+
+
+class CommitPartitionsTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123',
+            both_db=True,
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+        self.instances = [models.Change.objects.stage_created(create_instance(user=self.user), self.request)
+                          for _ in range(2)]
+        self._stage_update(self.instances[0])
+        self.content_type_id = models._get_content_type(model=BasicModel).id
+
+    def _stage_update(self, instance):
+        instance.char_field = create_random_string()
+        instance.save(using=settings.STUDIO_DB)
+        models.Change.objects.stage_updated(instance, self.request)
+
+    def _get_partitions(self):
+        changes = models.Change.objects.filter(committed=False).order_by('date_created', 'id')
+
+        return utils.partition_changes(changes)
+
+    def _get_change_ids(self, instance, committed=False):
+        return [change.id for change in models.Change.objects.get_for_instance(instance, committed=committed)]
+
+    def test_partition_changes(self):
+        partitions = self._get_partitions()
+
+        self.assertEqual(list(partitions), [(self.content_type_id, instance.id) for instance in self.instances])
+        for instance in self.instances:
+            self.assertEqual(partitions[(self.content_type_id, instance.id)], self._get_change_ids(instance))
+
+    def test_resume_partially_committed_run(self):
+        partitions = self._get_partitions()
+        first_key, second_key = list(partitions)
+
+        # The run stops after committing the first instance.
+        committed, errors = utils.commit_partitions('foo', {first_key: partitions[first_key]}, to_index=False)
+        self.assertEqual((committed, errors), (len(partitions[first_key]), []))
+        self.assertEqual(utils.get_pending_partitions(partitions, 'foo'), {second_key: partitions[second_key]})
+        # Checkpoints only apply to their own run.
+        self.assertEqual(utils.get_pending_partitions(partitions, 'bar'), partitions)
+
+        committed, errors = utils.commit_partitions('foo', utils.get_pending_partitions(partitions, 'foo'),
+                                                    to_index=False)
+        self.assertEqual((committed, errors), (len(partitions[second_key]), []))
+        self.assertEqual(utils.get_pending_partitions(partitions, 'foo'), {})
+        for instance in self.instances:
+            self.assertEqual(self._get_change_ids(instance, committed=True),
+                             partitions[(self.content_type_id, instance.id)])
+            self.assertTrue(BasicModel.objects.using(settings.MAIN_SITE_DB).filter(id=instance.id).exists())
+
+        # An instance changed after its checkpoint is committed again.
+        self._stage_update(self.instances[1])
+        partitions = self._get_partitions()
+        self.assertEqual(list(utils.get_pending_partitions(partitions, 'foo')), [second_key])
+
+    def test_commit_partitions_skips_failing_partition(self):
+        partitions = self._get_partitions()
+        first_key, second_key = list(partitions)
+        bulk_commit = models.Change.objects.bulk_commit
+
+        def _bulk_commit(changes, **kwargs):
+            if any(change.base_id == self.instances[0].id for change in changes):
+                raise ValueError('Foo')
+            return bulk_commit(changes, **kwargs)
+
+        with mock.patch.object(models.Change.objects, 'bulk_commit', side_effect=_bulk_commit):
+            committed, errors = utils.commit_partitions('foo', partitions, to_index=False)
+
+        self.assertEqual(committed, len(partitions[second_key]))
+        self.assertEqual(errors, [f'Skipped partition {first_key} | Foo'])
+        self.assertEqual(utils.get_pending_partitions(partitions, 'foo'), {first_key: partitions[first_key]})
@@ -1,65 +1,457 @@
-import copy
-import math
+import re
+from functools import reduce
+from operator import or_
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.db.models.fields.reverse_related import ForeignObjectRel
+from django.utils import timezone
 
-from .models import get_rels_dict_default, Change
+from .models import (
+    _add_to_rels_dict, _get_content_type, _get_related_field_name, get_rels_dict_default, Change, CommitCheckpoint,
+    Relationship, Snapshot, REFERENCES, RELATIONSHIPS, RELATIONSHIP_UNIQUE_FIELDS,
+)
+from shared.db import bulk_update, bulk_upsert
+from voto_studio_backend.search.models import OutboxEntry, OUTBOX_INDEX
+from voto_studio_backend.search.signals import to_index as should_index
 from voto_studio_backend.users.models import User
 
 
+def _get_field_pairs(field, using=settings.STUDIO_DB):
+    """
+    Read every ``(instance_id, related_id)`` pair held through ``field``, a forward
+    or reverse relation field, straight from its through table or foreign key column
+    with a single query.
+    """
+    if isinstance(field, ForeignObjectRel):
+        remote_field = field.field
+        if field.many_to_many:
+            return remote_field.remote_field.through.objects \
+                .using(using) \
+                .order_by('pk') \
+                .values_list(f'{remote_field.m2m_reverse_field_name()}_id', f'{remote_field.m2m_field_name()}_id')
+
+        return field.related_model.objects \
+            .using(using) \
+            .filter(**{f'{remote_field.attname}__isnull': False}) \
+            .order_by('id') \
+            .values_list(remote_field.attname, 'id')
+
+    if field.many_to_many:
+        return field.remote_field.through.objects \
+            .using(using) \
+            .order_by('pk') \
+            .values_list(f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id')
+
+    return field.model.objects \
+        .using(using) \
+        .filter(**{f'{field.attname}__isnull': False}) \
+        .order_by('id') \
+        .values_list('id', field.attname)
+
+
+def _get_pair_key(field, instance_id, related_id):
+    # Both rows of a symmetrical many to many relationship are the same relationship.
+    if field.many_to_many and not isinstance(field, ForeignObjectRel) and field.remote_field.symmetrical:
+        return min(instance_id, related_id), max(instance_id, related_id)
+    return instance_id, related_id
+
+
+def _repair_relationships(model_class, pairs_by_field, using=settings.STUDIO_DB, dry_run=False):
+    """
+    Bring the relationships held through the forward fields of ``model_class``, from
+    either end, in line with the through tables and foreign key columns. Missing
+    relationships are created and the ones nothing backs anymore are deleted.
+    """
+    content_type = _get_content_type(model=model_class)
+    missing, dangling = [], []
+    for field, pairs in pairs_by_field.items():
+        if isinstance(field, ForeignObjectRel):
+            continue
+
+        related_content_type = _get_content_type(model=field.related_model)
+        related_field_name = _get_related_field_name(field)
+        actual = {_get_pair_key(field, *pair) for pair in pairs}
+
+        recorded = {}
+        relationships = Relationship.objects \
+            .using(using) \
+            .filter(
+                Q(source_content_type=content_type, field_name=field.name,
+                  target_content_type=related_content_type) |
+                Q(source_content_type=related_content_type, field_name=related_field_name,
+                  target_content_type=content_type)
+            ) \
+            .values_list('id', 'source_content_type_id', 'field_name', 'source_id', 'target_id')
+        for relationship_id, source_content_type_id, field_name, source_id, target_id in relationships:
+            if source_content_type_id == content_type.id and field_name == field.name:
+                key = _get_pair_key(field, source_id, target_id)
+            else:
+                key = _get_pair_key(field, target_id, source_id)
+            if key in actual:
+                recorded[key] = relationship_id
+            else:
+                dangling.append(relationship_id)
+
+        missing.extend(
+            Relationship(
+                source_content_type=content_type,
+                source_id=instance_id,
+                field_name=field.name,
+                related_field_name=related_field_name,
+                target_content_type=related_content_type,
+                target_id=related_id,
+                level=RELATIONSHIPS,
+            )
+            for instance_id, related_id in actual if (instance_id, related_id) not in recorded
+        )
+
+    if not dry_run:
+        with transaction.atomic(using=using):
+            Relationship.objects.using(using).filter(id__in=dangling).delete()
+            bulk_upsert(Relationship, missing, using=using, unique_fields=RELATIONSHIP_UNIQUE_FIELDS)
+            Relationship.objects.touch(using=using)
+
+    return len(missing), len(dangling)
+
+
+def _get_references(model_class, using=settings.STUDIO_DB):
+    """
+    Return the ``(instance_id, field_name, related_id)`` references held by the instances
+    of ``model_class`` and the ones held on them, keyed by their own field name.
+    """
+    content_type = _get_content_type(model=model_class)
+    references = Relationship.objects \
+        .using(using) \
+        .filter(Q(source_content_type=content_type) | Q(target_content_type=content_type), level=REFERENCES) \
+        .values_list('source_content_type_id', 'source_id', 'field_name', 'target_content_type_id', 'target_id')
+
+    held, received = set(), set()
+    for source_content_type_id, source_id, field_name, target_content_type_id, target_id in references:
+        if source_content_type_id == content_type.id:
+            held.add((source_id, field_name, target_id))
+        if target_content_type_id == content_type.id:
+            field = ContentType.objects.get_for_id(source_content_type_id).model_class()._meta.get_field(field_name)
+            received.add((target_id, _get_related_field_name(field), source_id))
+
+    return held, received
+
+
+def _normalize_rels_dict(rels_dict):
+    return {
+        key: {k: sorted(v) if isinstance(v, list) else v for k, v in inner_rels_dict.items()}
+        if isinstance(inner_rels_dict, dict) else inner_rels_dict
+        for key, inner_rels_dict in (rels_dict or {}).items()
+    }
+
+
+def repair_rels_dicts(model_class, using=settings.STUDIO_DB, dry_run=False, request=None, to_index=False,
+                      batch_size=500, logging=False):
+    """
+    Check the ``rels_dict`` of every tracked instance of ``model_class`` against its through
+    tables and foreign key columns, which are read once per field. The expected ``rels_dict``
+    are built in memory, following the model's current fields, and only the ones that differ
+    are written, in bulk. Relationships recorded as references stay references. The
+    relationships table is repaired along the way. If a ``request`` is given an update is
+    staged for each repaired instance and if ``to_index`` is set the repaired instances are
+    indexed again, as saving them would. Returns a report of what was, or with ``dry_run``
+    would have been, changed.
+    """
+    # Deleted instances are left alone, staging them would publish them again.
+    tracked_ids = set(model_class.objects.using(using).filter(tracked=True).values_list('id', flat=True))
+    fields = model_class.objects._get_fields()
+    pairs_by_field = {field: [pair for pair in _get_field_pairs(field, using=using) if pair[0] in tracked_ids]
+                      for field in fields}
+    missing, dangling = _repair_relationships(model_class, pairs_by_field, using=using, dry_run=dry_run)
+    held, received = _get_references(model_class, using=using)
+
+    expected = {}
+    for instance_id in tracked_ids:
+        expected[instance_id] = get_rels_dict_default(fields=fields)
+    for field, pairs in pairs_by_field.items():
+        for instance_id, related_id in pairs:
+            if instance_id not in expected or (instance_id, field.name, related_id) in received:
+                continue
+            rel_level = REFERENCES if (instance_id, field.name, related_id) in held else RELATIONSHIPS
+            _add_to_rels_dict(expected[instance_id], field.name, related_id, rel_level)
+
+    now = timezone.now()
+    mismatched = []
+    mismatched_fields = {}
+    rels_dicts = model_class.objects.using(using).filter(tracked=True).values_list('id', 'rels_dict')
+    for instance_id, rels_dict in rels_dicts.iterator():
+        stored, wanted = _normalize_rels_dict(rels_dict), _normalize_rels_dict(expected[instance_id])
+        if stored == wanted:
+            continue
+
+        for key in {*stored.keys(), *wanted.keys()}:
+            if not stored.get(key) == wanted.get(key):
+                mismatched_fields[key] = mismatched_fields.get(key, 0) + 1
+        mismatched.append(model_class(id=instance_id, rels_dict=expected[instance_id], date_modified=now))
+
+    if not dry_run and len(mismatched):
+        with transaction.atomic(using=using):
+            bulk_update(model_class, mismatched, ['rels_dict', 'date_modified'], using=using, batch_size=batch_size)
+            if request is not None or to_index:
+                # The changes and the documents are built from the whole rows, not only the repaired fields.
+                instances = list(model_class.objects.using(using).in_bulk([i.id for i in mismatched]).values())
+            if request is not None:
+                Change.objects.bulk_stage_updated(instances, request)
+            if to_index:
+                OutboxEntry.objects.enqueue([
+                    (model_class._meta.label, instance.id, OUTBOX_INDEX)
+                    for instance in instances if should_index(model_class, instance, using=using)
+                ], using=using)
+
+    report = {
+        'model_label': model_class._meta.label,
+        'checked': len(expected),
+        'mismatched': len(mismatched),
+        'fields': mismatched_fields,
+        'ids': [instance.id for instance in mismatched],
+        'missing_relationships': missing,
+        'dangling_relationships': dangling,
+    }
+    if logging:
+        print(f'{report["model_label"]}: {report["mismatched"]}/{report["checked"]} rels_dict mismatched '
+              f'{report["fields"]}, {missing} missing and {dangling} dangling relationships')
+
+    return report
+
+
+def get_migration_request():
+    request = type('Request', (object, ), {})
+    request.user = User.objects.get(email='migration@bot.com')
+
+    return request
+
+
 def migrate_rels_dict(model_class, using=settings.STUDIO_DB, to_index=True, logging=False):
-    # Get all the tracked instances for a given
-    # model class in the specified database.
+    """
+    Rebuild the ``rels_dict`` of the tracked instances of ``model_class`` that don't
+    match the model's fields or relationships and stage them as the migration bot.
+    """
+    return repair_rels_dicts(model_class, using=using, request=get_migration_request(), to_index=to_index,
+                             logging=logging)
+
+
+def _get_rels_dict_relationships(instance, content_type):
+    for field_name, inner_rels_dict in instance.rels_dict.items():
+        try:
+            field = instance._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            continue
+
+        field_type = inner_rels_dict.get('type')
+        if field_type == 'OneToOneField':
+            targets = [(inner_rels_dict['id'], RELATIONSHIPS)] if inner_rels_dict.get('id') else []
+        elif field_type == 'ForeignKey':
+            targets = [(target_id, RELATIONSHIPS) for target_id in inner_rels_dict.get('ids', [])]
+        elif field_type == 'ManyToManyField':
+            targets = [(target_id, level) for level in (REFERENCES, RELATIONSHIPS)
+                       for target_id in inner_rels_dict.get(level, [])]
+        else:
+            continue
+
+        target_content_type = _get_content_type(model=field.related_model)
+        for target_id, level in targets:
+            yield Relationship(
+                source_content_type=content_type,
+                source_id=instance.id,
+                field_name=field_name,
+                related_field_name='' if level == REFERENCES else _get_related_field_name(field),
+                target_content_type=target_content_type,
+                target_id=target_id,
+                level=level,
+            )
+
+
+def build_relationships(model_class, using=settings.STUDIO_DB, batch_size=500, logging=False):
+    """
+    Create the relationships recorded in the ``rels_dict`` of every instance of
+    ``model_class``. Relationships that already exist are left as they are, so
+    this can be run again safely. Returns the number of relationships written.
+    """
+    content_type = _get_content_type(model=model_class)
     instances = model_class.objects \
         .using(using) \
-        .filter(tracked=True)
+        .only('id', 'rels_dict') \
+        .order_by('id')
+
+    count = 0
+    for i in range(0, instances.count(), batch_size):
+        relationships = {}
+        for instance in instances[i:i + batch_size]:
+            for relationship in _get_rels_dict_relationships(instance, content_type):
+                # A relationship listed as both a reference and a relationship is kept as the latter.
+                relationships[(relationship.field_name, relationship.source_id,
+                               relationship.target_content_type_id, relationship.target_id)] = relationship
+
+        with transaction.atomic(using=using):
+            bulk_upsert(Relationship, list(relationships.values()), using=using,
+                        unique_fields=RELATIONSHIP_UNIQUE_FIELDS)
+            Relationship.objects.touch(using=using)
+        count += len(relationships)
 
-    # Exit early if there are no instances of
-    # this type in the specified database.
-    if not instances.count():
         if logging:
-            print('No instances')
-        return
-
-    # For each instance rebuild the relationships dictionary.
-    for index, instance in enumerate(instances):
-        fields = model_class.objects._get_fields()
-        # Leave this iteration early if the rels_dict does not need to change.
-        if list(instance.rels_dict.keys()) == [field.name for field in fields]:
-            continue
+            print(f'{model_class._meta.label}: {min(i + batch_size, instances.count())} instances, '
+                  f'{count} relationships')
+
+    return count
+
+
+def partition_changes(changes):
+    """
+    Split an ordered collection of changes into one partition per base instance.
+    Each partition is a list of change ids in the order they need to be committed.
+    The partitions themselves are ordered by their earliest change.
+    """
+    partitions = {}
+    for change_id, content_type_id, base_id in changes.values_list('id', 'content_type_id', 'base_id'):
+        partitions.setdefault((content_type_id, base_id), []).append(change_id)
+
+    return partitions
+
+
+def get_pending_partitions(partitions, run):
+    """
+    Drop the partitions that a previous attempt of the same run has already committed.
+    """
+    checkpoints = CommitCheckpoint.objects \
+        .filter(run=run) \
+        .values_list('content_type_id', 'base_id', 'last_change_id')
+    done = {(content_type_id, base_id): last_change_id for content_type_id, base_id, last_change_id in checkpoints}
+
+    return {key: change_ids for key, change_ids in partitions.items() if not done.get(key) == change_ids[-1]}
+
+
+def _write_checkpoints(run, partitions):
+    query = reduce(or_, [Q(content_type_id=content_type_id, base_id=base_id)
+                         for content_type_id, base_id in partitions.keys()])
+    CommitCheckpoint.objects.filter(query, run=run).delete()
+    CommitCheckpoint.objects.bulk_create([
+        CommitCheckpoint(
+            run=run,
+            content_type_id=content_type_id,
+            base_id=base_id,
+            last_change_id=change_ids[-1],
+            change_count=len(change_ids),
+        ) for (content_type_id, base_id), change_ids in partitions.items()
+    ])
 
+
+def commit_partitions(run, partitions, to_index=True, commit_base=False):
+    """
+    Commit a batch of partitions and checkpoint them. Partitions belong to different
+    base instances so they can be committed together, the changes within a partition
+    are collapsed in order by ``bulk_commit``. If the batch fails each partition is
+    retried on its own so that one bad instance does not hold back the others.
+    Returns a tuple of the number of changes committed and a list of errors.
+    """
+    def _commit(_partitions):
+        change_ids = [change_id for ids in _partitions.values() for change_id in ids]
+        changes = Change.objects.filter(id__in=change_ids)
+        committed_changes = Change.objects.bulk_commit(changes, to_index=to_index, commit_base=commit_base)
+        _write_checkpoints(run, _partitions)
+
+        return len(committed_changes)
+
+    try:
+        return _commit(partitions), []
+    except Exception:
+        pass
+
+    committed, errors = 0, []
+    for key, change_ids in partitions.items():
+        try:
+            committed += _commit({key: change_ids})
+        except Exception as e:
+            errors.append(f'Skipped partition {key} | {e}')
+
+    return committed, errors
+
+
+# Copy instances had a UUID appended to their unique fields.
+COPY_SUFFIX_REGEX = re.compile(r'-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def migrate_change_copies(batch_size=500, logging=False):
+    """
+    Move the copy instances of changes staged before snapshots were introduced into
+    the snapshot store. Each copy becomes a snapshot of its base instance, put before
+    the snapshots taken since by the date of its change, the change is pointed at the
+    snapshot and the copy is deleted from the workshop table.
+    Returns the number of changes migrated.
+    """
+    changes = Change.objects \
+        .using(settings.STUDIO_DB) \
+        .filter(snapshot_id__isnull=True, object_id__isnull=False) \
+        .exclude(object_id=F('base_id')) \
+        .select_related('content_type') \
+        .order_by('date_created', 'id')
+    total = changes.count()
+
+    migrated = 0
+    while True:
+        batch = list(changes[:batch_size])
+        if not len(batch):
+            break
+
+        changes_by_model = {}
+        for change in batch:
+            changes_by_model.setdefault(change.content_type.model_class(), []).append(change)
+
+        with transaction.atomic(using=settings.STUDIO_DB), transaction.atomic(using=settings.SNAPSHOT_DB):
+            for model_class, model_changes in changes_by_model.items():
+                copies = model_class.objects \
+                    .using(settings.STUDIO_DB) \
+                    .in_bulk([change.object_id for change in model_changes])
+                unique_fields = [field for field in model_class._meta.concrete_fields
+                                 if field.unique and not field.primary_key and not field.is_relation]
+
+                instances, migrated_changes = [], []
+                for change in model_changes:
+                    instance = copies.get(change.object_id)
+                    if instance is None:
+                        continue
+                    instance.id = change.base_id
+                    instance.tracked = True
+                    for field in unique_fields:
+                        value = getattr(instance, field.attname)
+                        if isinstance(value, str):
+                            setattr(instance, field.attname, COPY_SUFFIX_REGEX.sub('', value))
+                    instances.append(instance)
+                    migrated_changes.append(change)
+
+                snapshots = Snapshot.objects.bulk_insert(instances, [c.date_created for c in migrated_changes])
+                if len(snapshots):
+                    Change.objects \
+                        .using(settings.STUDIO_DB) \
+                        .filter(id__in=[change.id for change in migrated_changes]) \
+                        .update(
+                            snapshot_id=Case(*[When(id=change.id, then=Value(snapshot.id))
+                                               for change, snapshot in zip(migrated_changes, snapshots)],
+                                             output_field=PositiveIntegerField()),
+                            object_id=None,
+                        )
+
+                model_class.objects \
+                    .using(settings.STUDIO_DB) \
+                    .filter(id__in=copies.keys(), tracked=False) \
+                    .delete()
+
+                # Changes whose copy no longer exists can't be migrated,
+                # clear the dangling reference so they are not picked up again.
+                Change.objects \
+                    .using(settings.STUDIO_DB) \
+                    .filter(id__in=[c.id for c in model_changes if c.object_id not in copies]) \
+                    .update(object_id=None)
+
+        migrated += len(batch)
         if logging:
-            # Provide some indication to the console of
-            # the function's progress
-            if not index % math.ceil(instances.count() / 10):
-                print(f'{round(index / instances.count() * 100)}%')
-
-        # Start with a deep copy of the instance's relationships dictionary
-        # and iterate over each of the model class' fields.
-        rels_dict = copy.deepcopy(instance.rels_dict)
-        for field in fields:
-            if field.name not in rels_dict.keys():
-                # If the field name is not already included in the
-                # rels_dict then this means it is a new field. So
-                # we add a default rels_dict entry for the field.
-                rels_dict.update({
-                    field.name: get_rels_dict_default(field=field),
-                })
-
-        for key in instance.rels_dict.keys():
-            if key not in [field.name for field in fields]:
-                del rels_dict[key]
-
-        # Update the instance and save it.
-        instance.rels_dict = rels_dict
-        instance.save(using=using, update_fields=['rels_dict'], to_index=to_index)
-
-        # We need to stage a change, so we fake a request
-        # and set the user to the migration bot.
-        user = User.objects.get(email='migration@bot.com')
-        request = type('Request', (object, ), {})
-        request.user = user
-        Change.objects.stage_updated(instance, request)
+            print(f'{round(migrated / total * 100)}%')
 
-    if logging:
-        print('100%')
+    return migrated
@@ -0,0 +1,27 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corruption', '0014_informativesnippet_informative_snippets'),
+    ]
+
+    # ``jsonb_path_ops`` GIN indexes serve the ``@>`` containment
+    # queries of ``TrackedWorkshopModelManager.referencing()``.
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX corruption_informativesnippet_rels_dict_gin ON corruption_informativesnippet USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX corruption_informativesnippet_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX corruption_corruptioncase_rels_dict_gin ON corruption_corruptioncase USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX corruption_corruptioncase_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX corruption_financialitem_rels_dict_gin ON corruption_financialitem USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX corruption_financialitem_rels_dict_gin',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corruption', '0015_rels_dict_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='corruptioncase',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='financialitem',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='informativesnippet',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+    ]
@@ -135,4 +135,13 @@ class FinancialItem(TrackedWorkshopModel):
         'table_values',
     )
 
+    search_method_field_inputs = {
+        'table_values': ('title', 'amount', 'source', 'user'),
+    }
+
+    # ``get_table_values`` reads the user.
+    search_select_related = (
+        'user',
+    )
+
     search_autocomplete_field = 'title'
@@ -1,6 +1,14 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
 
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer, WebsocketConsumer
+from django.conf import settings
+from rest_framework.authtoken.models import Token
+
+from shared.api.renderers import camelize
+from voto_studio_backend.jobs.models import Job
 
 
 class ChatConsumer(WebsocketConsumer):
@@ -17,3 +25,64 @@ class ChatConsumer(WebsocketConsumer):
         self.send(text_data=json.dumps({
             'message': message,
         }))
+
+
+class JobConsumer(AsyncWebsocketConsumer):
+    """
+    Push the progress of a job to its user until the job finishes. The job is
+    polled from the database so that no channel layer or broker is needed. As
+    the rest API uses token authentication the token can be given in the query
+    string, e.g. ``ws/jobs/1/?token=...``.
+    """
+    poll_interval = 0.5
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        self.poll_task = None
+
+        user_id = await self._get_user_id()
+        job = await self._get_job()
+        if job is None or user_id is None or not job.user_id == user_id:
+            await self.close()
+            return
+
+        await self.accept()
+        self.poll_task = asyncio.ensure_future(self._poll())
+
+    async def disconnect(self, code):
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+
+    @database_sync_to_async
+    def _get_user_id(self):
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            return user.id
+
+        token = parse_qs(self.scope.get('query_string', b'').decode()).get('token')
+        if token is None:
+            return None
+
+        return Token.objects.filter(key=token[0]).values_list('user_id', flat=True).first()
+
+    @database_sync_to_async
+    def _get_job(self):
+        return Job.objects.using(settings.STUDIO_DB).filter(id=self.job_id).first()
+
+    async def _poll(self):
+        sent = None
+        while True:
+            job = await self._get_job()
+            if job is None:
+                break
+
+            job_dict = camelize(job.to_dict())
+            if not job_dict == sent:
+                await self.send(text_data=json.dumps(job_dict))
+                sent = job_dict
+            if job.finished:
+                break
+
+            await asyncio.sleep(self.poll_interval)
+
+        await self.close()
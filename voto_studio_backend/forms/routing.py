@@ -4,4 +4,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     # path('ws/chat/'),
+    path('ws/jobs/<int:job_id>/', consumers.JobConsumer),
 ]
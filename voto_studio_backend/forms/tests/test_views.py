@@ -181,6 +181,38 @@ class InstanceDetailAPITests(TestCase):
         self.assertEqual(response.data['item']['id'], self.instance.id)
 
 
+class InstanceNeighborhoodAPITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@InstanceNeighborhoodAPITests.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.client.defaults['HTTP_AUTHORIZATION'] = auth_header(self.user)
+        self.instance = create_instance(user=self.user)
+
+    def _get(self, **params):
+        return self.client.get(reverse('forms:neighborhood'), {
+            'ml': 'test_app.BasicModel',
+            'id': self.instance.id,
+            **params,
+        })
+
+    def test_get(self):
+        response = self._get(depth=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['depth'], 1)
+
+    def test_get_clamps_depth(self):
+        self.assertEqual(self._get(depth=0).data['depth'], 1)
+        self.assertEqual(self._get(depth=-5).data['depth'], 1)
+        self.assertEqual(self._get(depth=1000).data['depth'], settings.GRAPH_MAX_DEPTH)
+
+    def test_get_invalid_params(self):
+        self.assertEqual(self._get(depth='foo').status_code, 400)
+        self.assertEqual(self._get(fan_out='1.5').status_code, 400)
+
+
 class UpdateBasicFieldsAPITests(TransactionTestCase):
     def setUp(self):
         self.user = User.objects.create_user(
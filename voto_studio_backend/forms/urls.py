@@ -58,11 +58,26 @@ urlpatterns = [
         views.InstanceDetailAPI.as_view(),
         name='detail',
     ),
+    path(
+        f'{api_v1}/referencing_instances/',
+        views.ReferencingInstancesAPI.as_view(),
+        name='referencing_instances',
+    ),
+    path(
+        f'{api_v1}/neighborhood/',
+        views.InstanceNeighborhoodAPI.as_view(),
+        name='neighborhood',
+    ),
     path(
         f'{api_v1}/publish_instances/',
         views.PublishInstancesAPI.as_view(),
         name='publish_instances',
     ),
+    path(
+        f'{api_v1}/job_detail/',
+        views.JobDetailAPI.as_view(),
+        name='job_detail',
+    ),
     path(
         f'{api_v1}/delete_instances/',
         views.DeleteInstancesAPI.as_view(),
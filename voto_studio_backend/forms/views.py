@@ -4,6 +4,8 @@ from django.apps import apps
 from django.conf import settings
 from django.contrib.postgres.search import SearchVector
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db import IntegrityError
 from django.db.models.fields.related import OneToOneRel, ManyToOneRel, ManyToManyRel
 from django.shortcuts import get_object_or_404
@@ -15,8 +17,9 @@ from rest_framework.response import Response
 
 from . import serializers
 from shared.api.parsers import camel_to_underscore, underscore_to_camel
-from shared.utils import get_model, create_slice
-from voto_studio_backend.changes.models import Change, get_rels_dict_default
+from shared.utils import get_model, get_int_param, create_slice
+from voto_studio_backend.changes.models import Change, Relationship, Snapshot, get_rels_dict_default
+from voto_studio_backend.jobs.models import Job
 from voto_studio_backend.media.models import Image, Video, Resource
 from voto_studio_backend.media.serializers import ImageSerializer, VideoSerializer, ResourceSerializer
 from voto_studio_backend.permissions.shortcuts import get_object_or_403, get_list_or_403, permission_denied_message
@@ -251,6 +254,17 @@ def is_read_only(field):
     return field.name in getattr(field.model, 'read_only_fields', ())
 
 
+def get_ordering(model_class, sort=None):
+    """
+    Order the newest instances first unless ``sort`` is one of the ``sort_fields``
+    of the model class, optionally prefixed with ``-`` for descending order.
+    """
+    if sort is not None and sort.lstrip('-') in getattr(model_class, 'sort_fields', ()):
+        return sort, '-id'
+
+    return '-id',
+
+
 DEFAULT_VALUES = {
     'FloatField': 0,
     'IntegerField': 0,
@@ -663,27 +677,24 @@ class UpdateRelatedFieldAPI(APIView):
 
         related_app_label, related_model_name = request.data['related_model_label'].split('.')
         related_model_class = get_model(app_label=related_app_label, model_name=related_model_name)
-        related_instances = related_model_class.objects.filter(id__in=request.data.get('related_ids'))
+        related_instances = list(related_model_class.objects.filter(id__in=request.data.get('related_ids')))
 
         update_type = request.data['update_type']
         rel_level = None
         field_name = camel_to_underscore(request.data['field_name'])
-        for related_instance in related_instances:
-            field = get_field(field_name, instance=instance)
-            if update_type == 'add':
-                rel_level = request.data['rel_level']
-                if rel_level == 'rel':
-                    if related_instance.can_write(request.user):
-                        instance.add_rel(field, related_instance)
-                    else:
-                        raise PermissionDenied(permission_denied_message({
-                            'message': 'You do not have write permission on this content.',
-                        }, instance=instance))
-                elif rel_level == 'ref':
-                        instance.add_ref(field, related_instance)
-            elif update_type == 'remove':
-                get_field_value(instance, field_name=field_name).remove(related_instance)
-                instance.remove_rel(field, related_instance)
+        field = get_field(field_name, instance=instance)
+        if update_type == 'add':
+            rel_level = request.data['rel_level']
+            if rel_level == 'rel':
+                if not all(related_instance.can_write(request.user) for related_instance in related_instances):
+                    raise PermissionDenied(permission_denied_message({
+                        'message': 'You do not have write permission on this content.',
+                    }, instance=instance))
+                instance.add_rels(field, related_instances)
+            elif rel_level == 'ref':
+                instance.add_refs(field, related_instances)
+        elif update_type == 'remove':
+            instance.remove_rels(field, related_instances)
 
         instances = related_model_class.objects.filter(id__in=request.data.get('related_ids'))
         response = {
@@ -734,6 +745,127 @@ class InstanceDetailAPI(APIView):
         return Response(response, status=status.HTTP_200_OK,)
 
 
+class ReferencingInstancesAPI(APIView):
+    """
+    Class providing API endpoints used to list the instances that relate to an instance.
+    """
+    @staticmethod
+    def get(request):
+        """
+        List, per workshop model, the instances whose ``rels_dict`` lists the given
+        instance. ``level`` is either ``rels`` or ``refs``, both if omitted.
+        """
+        if not request.user.is_authenticated:
+            return Response('User not authenticated', status=status.HTTP_401_UNAUTHORIZED)
+
+        model_class = get_model(model_label=request.GET.get('ml'))
+        instance = get_object_or_403(model_class, (request.user, 'read'), id=request.GET.get('id'))
+        level = request.GET.get('level')
+
+        lists = []
+        for referencing_model_label in settings.WORKSHOP_MODELS:
+            referencing_model_class = get_model(model_label=referencing_model_label)
+            instances = referencing_model_class.objects \
+                .referencing(instance, level=level) \
+                .filter(tracked=True) \
+                .order_by('-id')
+            if not instances.exists():
+                continue
+
+            lists.append({
+                'instances': serializers.GeneralSerializer(
+                    instances, model_class=referencing_model_class, many=True,
+                ).data,
+                'model_label': referencing_model_label,
+                'verbose_name': referencing_model_class._meta.verbose_name,
+            })
+
+        response = {
+            'id': instance.id,
+            'model_label': model_class._meta.label,
+            'lists': lists,
+        }
+
+        return Response(response, status=status.HTTP_200_OK)
+
+
+class InstanceNeighborhoodAPI(APIView):
+    """
+    Class providing API endpoints used to explore the relationships around an instance.
+    """
+    @staticmethod
+    def get(request):
+        """
+        Return the instances up to ``depth`` relationships away from the given instance,
+        across all workshop models, and the relationships between them. ``depth`` and
+        ``fan_out`` are clamped to their ``GRAPH_MAX_*`` settings. The graph is cached
+        until the instance or any relationship changes.
+        """
+        if not request.user.is_authenticated:
+            return Response('User not authenticated', status=status.HTTP_401_UNAUTHORIZED)
+
+        model_class = get_model(model_label=request.GET.get('ml'))
+        instance = get_object_or_403(model_class, (request.user, 'read'), id=request.GET.get('id'))
+        try:
+            depth = get_int_param(request, 'depth', default=1, maximum=settings.GRAPH_MAX_DEPTH)
+            fan_out = get_int_param(request, 'fan_out', default=settings.GRAPH_MAX_FAN_OUT,
+                                    maximum=settings.GRAPH_MAX_FAN_OUT)
+        except ValueError as e:
+            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = f'neighborhood-{model_class._meta.label}-{instance.id}-' \
+                    f'{Snapshot.objects.get_latest_version(instance)}-{Relationship.objects.get_version()}-' \
+                    f'{depth}-{fan_out}'
+        graph = cache.get(cache_key)
+        if graph is None:
+            graph = Relationship.objects.get_neighborhood(
+                instance, depth=depth, fan_out=fan_out, max_nodes=settings.GRAPH_MAX_NODES,
+            )
+            cache.set(cache_key, graph)
+        nodes, relationships = graph
+
+        workshop_models = {}
+        for workshop_model_label in settings.WORKSHOP_MODELS:
+            workshop_model_class = get_model(model_label=workshop_model_label)
+            workshop_models[ContentType.objects.get_for_model(workshop_model_class).id] = workshop_model_class
+        ids_by_content_type = {}
+        for content_type_id, instance_id, _ in nodes:
+            if content_type_id in workshop_models:
+                ids_by_content_type.setdefault(content_type_id, []).append(instance_id)
+        instances = {
+            content_type_id: workshop_models[content_type_id].objects.filter(tracked=True).in_bulk(ids)
+            for content_type_id, ids in ids_by_content_type.items()
+        }
+
+        response = {
+            'id': instance.id,
+            'model_label': model_class._meta.label,
+            'depth': depth,
+            'nodes': [{
+                'id': instance_id,
+                'model_label': workshop_models[content_type_id]._meta.label,
+                'depth': node_depth,
+                'descriptor': getattr(
+                    instances[content_type_id][instance_id],
+                    workshop_models[content_type_id].search_autocomplete_field,
+                    None,
+                ),
+            } for content_type_id, instance_id, node_depth in nodes
+                if instance_id in instances.get(content_type_id, {})],
+            'relationships': [{
+                'source': [workshop_models[source_content_type_id]._meta.label, source_id],
+                'target': [workshop_models[target_content_type_id]._meta.label, target_id],
+                'field_name': field_name,
+                'rel_level': rel_level,
+            } for source_content_type_id, source_id, target_content_type_id, target_id, field_name, rel_level
+                in relationships
+                if source_id in instances.get(source_content_type_id, {}) and
+                target_id in instances.get(target_content_type_id, {})],
+        }
+
+        return Response(response, status=status.HTTP_200_OK)
+
+
 class PublishError(Exception):
     pass
 
@@ -754,22 +886,40 @@ class PublishInstancesAPI(APIView):
         instance_ids = request.data['ids']
 
         model_class = get_model(model_label=model_label)
-        instance = get_object_or_403(model_class, (request.user, 'commit'), id=instance_ids[0])
-
-        committed_changes = Change.objects.commit_for_instance(instance)
-        if not len(committed_changes):
-            committed_change = Change.objects \
-                .get_for_instance(instance, committed=True) \
-                .last() \
-                .commit()
-            committed_changes = [committed_change]
+        instances = get_list_or_403(model_class, (request.user, 'commit'), id__in=instance_ids)
+
+        # Publishing is done by a worker, the progress
+        # of the job is pushed over the job's websocket.
+        job = Job.objects.enqueue(
+            'voto_studio_backend.changes.tasks.publish_instances',
+            user=request.user,
+            model_label=model_label,
+            ids=[instance.id for instance in instances],
+        )
 
         response = {
             'ids': instance_ids,
-            'changes_committed': [c.id for c in committed_changes],
+            'job_id': job.id,
         }
 
-        return Response(response, status=status.HTTP_200_OK)
+        return Response(response, status=status.HTTP_202_ACCEPTED)
+
+
+class JobDetailAPI(APIView):
+    """
+    Class providing API endpoints used to follow a job without a websocket.
+    """
+    @staticmethod
+    def get(request):
+        """
+        Return the status and progress of one of the user's jobs.
+        """
+        if not request.user.is_authenticated:
+            return Response('User not authenticated', status=status.HTTP_401_UNAUTHORIZED)
+
+        job = get_object_or_404(Job.objects.using(settings.STUDIO_DB), id=request.GET.get('id'), user=request.user)
+
+        return Response(job.to_dict(), status=status.HTTP_200_OK)
 
 
 class DeleteInstancesAPI(APIView):
@@ -899,7 +1049,7 @@ class InstanceListAPI(APIView):
             instances = model_class.objects \
                 .filter(tracked=True, **user_filter) \
                 .exclude(id__in=must_not) \
-                .order_by('-id')
+                .order_by(*get_ordering(model_class, request.GET.get('sort')))
 
             search = request.GET.get('search', None)
             if search not in (None, ''):
@@ -956,7 +1106,7 @@ class RelatedInstanceListAPI(APIView):
         instances = related_model_class.objects \
             .filter(tracked=True, **user_filter) \
             .exclude(id__in=must_not) \
-            .order_by('-id')
+            .order_by(*get_ordering(related_model_class, request.GET.get('sort')))
 
         search = request.GET.get('search', None)
         if search not in (None, ''):
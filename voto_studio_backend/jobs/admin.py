@@ -0,0 +1,5 @@
+from config.admin import register_models
+
+register_models(app_label='jobs', models={
+    'Job': ['default'],
+})
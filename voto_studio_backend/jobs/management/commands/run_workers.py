@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from multiprocessing import Process
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from voto_studio_backend.jobs.models import Job
+
+
+def _beat(job, stop):
+    """
+    Keep the heartbeat of a running job fresh until ``stop`` is set.
+    """
+    try:
+        while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+            job.beat()
+    finally:
+        # The thread's own connections.
+        connections.close_all()
+
+
+def work(sleep, burst=False):
+    """
+    Claim and run jobs until the queue is empty when ``burst`` is set, or forever.
+    """
+    pid = os.getpid()
+    while True:
+        job = Job.objects.claim()
+        if job is None:
+            if burst:
+                return
+            time.sleep(sleep)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_beat, args=(job, stop), daemon=True)
+        heartbeat.start()
+        try:
+            job.run()
+        finally:
+            stop.set()
+            heartbeat.join()
+        print(f'[{pid}] {job} | attempt {job.attempts}/{job.max_attempts} | '
+              f'waited {round(job.wait_time, 2)}s | ran {round(job.run_time, 2)}s')
+
+
+def _work(sleep, burst):
+    # Each worker process needs its own database connections.
+    connections.close_all()
+    work(sleep, burst)
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', action='store', dest='processes', type=int, default=1,
+                            help='Number of worker processes')
+        parser.add_argument('--sleep', action='store', dest='sleep', type=float, default=1,
+                            help='Seconds to wait before polling again when the queue is empty')
+        parser.add_argument('--burst', action='store_true', dest='burst',
+                            help='Exit once the queue is empty')
+        parser.add_argument('--stale_after', action='store', dest='stale_after', type=int,
+                            default=settings.JOB_HEARTBEAT_TIMEOUT,
+                            help='Queue running jobs that have not beaten for this many seconds again on start up')
+
+    def handle(self, *args, **options):
+        processes = max(options.get('processes'), 1)
+        sleep = options.get('sleep')
+        burst = options.get('burst')
+
+        requeued, failed = Job.objects.requeue_stale(options.get('stale_after'))
+        if requeued or failed:
+            self.stdout.write(f'Queued {requeued} stale jobs again, {failed} failed after their last attempt.')
+
+        self.stdout.write(f'Starting {processes} worker(s)...')
+        if processes == 1:
+            work(sleep, burst)
+        else:
+            # Connections can't be shared with forked processes.
+            connections.close_all()
+            workers = [Process(target=_work, args=(sleep, burst)) for _ in range(processes)]
+            for worker in workers:
+                worker.start()
+            try:
+                for worker in workers:
+                    worker.join()
+            except KeyboardInterrupt:
+                for worker in workers:
+                    worker.terminate()
+
+        for metrics in Job.objects.get_metrics():
+            self.stdout.write(
+                f"{metrics['task']}: {metrics['succeeded']} succeeded, {metrics['failed']} failed, "
+                f"{metrics['queued']} queued, {metrics['retries']} retried | "
+                f"avg wait {round(metrics['avg_wait_time'] or 0, 2)}s | "
+                f"avg run {round(metrics['avg_run_time'] or 0, 2)}s | "
+                f"max run {round(metrics['max_run_time'] or 0, 2)}s"
+            )
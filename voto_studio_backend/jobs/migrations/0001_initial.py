@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:05
+
+from django.conf import settings
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=256, verbose_name='Dotted path to the task')),
+                ('kwargs', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='Keyword arguments of the task')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('succeeded', 'succeeded'), ('failed', 'failed')], db_index=True, default='queued', max_length=16, verbose_name='Status')),
+                ('progress', models.FloatField(default=0, verbose_name='Progress from 0 to 1')),
+                ('message', models.CharField(blank=True, max_length=256, verbose_name='Latest progress message')),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name='Result of the task')),
+                ('error', models.TextField(blank=True, verbose_name='Traceback of the last failure')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of creation')),
+                ('date_started', models.DateTimeField(blank=True, null=True, verbose_name='Date the job started')),
+                ('date_finished', models.DateTimeField(blank=True, null=True, verbose_name='Date the job finished')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of attempts'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='max_attempts',
+            field=models.PositiveIntegerField(default=1, verbose_name='Maximum number of attempts'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='run_after',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date from which the job can run'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='run_time',
+            field=models.FloatField(blank=True, null=True, verbose_name='Seconds taken by the last attempt'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='wait_time',
+            field=models.FloatField(blank=True, null=True, verbose_name='Seconds queued before the first attempt'),
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together={('status', 'run_after')},
+        ),
+    ]
@@ -0,0 +1,219 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.fields import JSONField
+from django.db import models, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import ugettext_lazy as _
+
+
+STUDIO_DB = settings.STUDIO_DB
+JOB_MAX_ATTEMPTS = settings.JOB_MAX_ATTEMPTS
+JOB_RETRY_DELAY = settings.JOB_RETRY_DELAY
+JOB_HEARTBEAT_TIMEOUT = settings.JOB_HEARTBEAT_TIMEOUT
+
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+JOB_STATUS_OPTIONS = (
+    (JOB_QUEUED, JOB_QUEUED),
+    (JOB_RUNNING, JOB_RUNNING),
+    (JOB_SUCCEEDED, JOB_SUCCEEDED),
+    (JOB_FAILED, JOB_FAILED),
+)
+
+
+JOB_FINISHED = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobManager(models.Manager):
+    """Custom model manager for Job"""
+    def enqueue(self, task, user=None, max_attempts=JOB_MAX_ATTEMPTS, **kwargs):
+        """
+        Queue a job that calls ``task``, the dotted path to a function that takes
+        the job followed by ``kwargs``. The kwargs must be JSON serializable. When
+        called inside a transaction the job is only visible to the workers once
+        the transaction commits.
+        """
+        return self.using(STUDIO_DB).create(task=task, kwargs=kwargs, user=user, max_attempts=max_attempts)
+
+    def claim(self):
+        """
+        Claim the queued job that has been due the longest and mark it as running.
+        Jobs locked by other workers are skipped rather than waited on, so any number
+        of workers can claim jobs at the same time. Returns ``None`` if there is
+        nothing to do.
+        """
+        with transaction.atomic(using=STUDIO_DB):
+            job = self \
+                .using(STUDIO_DB) \
+                .select_for_update(skip_locked=True) \
+                .filter(status=JOB_QUEUED, run_after__lte=timezone.now()) \
+                .order_by('run_after', 'id') \
+                .first()
+            if job is None:
+                return None
+
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            job.date_started = job.heartbeat_at = timezone.now()
+            job.save(using=STUDIO_DB, update_fields=['status', 'attempts', 'date_started', 'heartbeat_at'])
+
+        return job
+
+    def requeue_stale(self, timeout=JOB_HEARTBEAT_TIMEOUT):
+        """
+        Queue the running jobs that haven't beaten for ``timeout`` seconds again, as their
+        worker was killed. The lost run counts as one of their attempts, so the jobs that
+        have used up their attempts are marked as failed instead. Returns the number of
+        jobs queued again and the number of jobs failed.
+        """
+        now = timezone.now()
+        deadline = now - timedelta(seconds=timeout)
+        stale = self \
+            .using(STUDIO_DB) \
+            .filter(Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True, date_started__lt=deadline),
+                    status=JOB_RUNNING)
+
+        failed = stale \
+            .filter(attempts__gte=F('max_attempts')) \
+            .update(status=JOB_FAILED, error='The worker running the job stopped.', date_finished=now)
+        requeued = stale.update(status=JOB_QUEUED, run_after=now)
+
+        return requeued, failed
+
+    def get_metrics(self, since=None):
+        """
+        Return the number of jobs per status and the average and maximum wait and
+        run times in seconds of the finished jobs, grouped by task.
+        """
+        jobs = self.using(STUDIO_DB).all()
+        if since is not None:
+            jobs = jobs.filter(date_created__gte=since)
+
+        metrics = jobs \
+            .values('task') \
+            .annotate(
+                count=Count('id'),
+                queued=Count('id', filter=Q(status=JOB_QUEUED)),
+                running=Count('id', filter=Q(status=JOB_RUNNING)),
+                succeeded=Count('id', filter=Q(status=JOB_SUCCEEDED)),
+                failed=Count('id', filter=Q(status=JOB_FAILED)),
+                retries=Count('id', filter=Q(attempts__gt=1)),
+                avg_wait_time=Avg('wait_time'),
+                max_wait_time=Max('wait_time'),
+                avg_run_time=Avg('run_time', filter=Q(status=JOB_SUCCEEDED)),
+                max_run_time=Max('run_time', filter=Q(status=JOB_SUCCEEDED)),
+            ) \
+            .order_by('task')
+
+        return list(metrics)
+
+
+class Job(models.Model):
+    """
+    A unit of work that runs in a worker process instead of in a request. Jobs are
+    stored in the STUDIO_DB and claimed by the ``run_workers`` command.
+    """
+    task = models.CharField(_('Dotted path to the task'), max_length=256)
+    kwargs = JSONField(_('Keyword arguments of the task'), blank=True, default=dict)
+    status = models.CharField(_('Status'), max_length=16, choices=JOB_STATUS_OPTIONS, default=JOB_QUEUED,
+                              db_index=True)
+    progress = models.FloatField(_('Progress from 0 to 1'), default=0)
+    message = models.CharField(_('Latest progress message'), max_length=256, blank=True)
+    result = JSONField(_('Result of the task'), blank=True, null=True)
+    error = models.TextField(_('Traceback of the last failure'), blank=True)
+    attempts = models.PositiveIntegerField(_('Number of attempts'), default=0)
+    max_attempts = models.PositiveIntegerField(_('Maximum number of attempts'), default=1)
+    run_after = models.DateTimeField(_('Date from which the job can run'), default=timezone.now)
+    wait_time = models.FloatField(_('Seconds queued before the first attempt'), blank=True, null=True)
+    run_time = models.FloatField(_('Seconds taken by the last attempt'), blank=True, null=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    date_created = models.DateTimeField(_('Date of creation'), default=timezone.now)
+    date_started = models.DateTimeField(_('Date the job started'), blank=True, null=True)
+    heartbeat_at = models.DateTimeField(_('Date the running job last showed it was alive'), blank=True, null=True)
+    date_finished = models.DateTimeField(_('Date the job finished'), blank=True, null=True)
+
+    objects = JobManager()
+
+    class Meta:
+        index_together = ('status', 'run_after')
+
+    def __str__(self):
+        return f'{self.id} | {self.task} <{self.status}>'
+
+    @property
+    def finished(self):
+        return self.status in JOB_FINISHED
+
+    def set_progress(self, progress, message=''):
+        """
+        Record the progress of the job, which also shows it is alive. Tasks are not run
+        inside a transaction, so the progress can be followed while the task is still running.
+        """
+        self.progress = progress
+        self.message = message[:256]
+        self.heartbeat_at = timezone.now()
+        Job.objects \
+            .using(STUDIO_DB) \
+            .filter(id=self.id) \
+            .update(progress=self.progress, message=self.message, heartbeat_at=self.heartbeat_at)
+
+    def beat(self):
+        """
+        Show the running job is alive, so it isn't queued again by ``requeue_stale``.
+        """
+        self.heartbeat_at = timezone.now()
+        Job.objects \
+            .using(STUDIO_DB) \
+            .filter(id=self.id, status=JOB_RUNNING) \
+            .update(heartbeat_at=self.heartbeat_at)
+
+    def run(self):
+        """
+        Call the job's task and record its result and timings. If the task fails the
+        traceback is recorded and the job is queued again with an exponential backoff,
+        until it has been attempted ``max_attempts`` times.
+        """
+        if self.wait_time is None:
+            self.wait_time = (self.date_started - self.date_created).total_seconds()
+
+        try:
+            task = import_string(self.task)
+            self.result = task(self, **self.kwargs)
+        except Exception:
+            self.error = traceback.format_exc()
+            if self.attempts < self.max_attempts:
+                self.status = JOB_QUEUED
+                self.run_after = timezone.now() + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (self.attempts - 1))
+            else:
+                self.status = JOB_FAILED
+        else:
+            self.status = JOB_SUCCEEDED
+            self.progress = 1
+
+        self.date_finished = timezone.now()
+        self.run_time = (self.date_finished - self.date_started).total_seconds()
+        self.save(using=STUDIO_DB, update_fields=[
+            'status', 'progress', 'result', 'error', 'run_after', 'wait_time', 'run_time', 'date_finished',
+        ])
+
+        return self
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'attempts': self.attempts,
+            'finished': self.finished,
+        }
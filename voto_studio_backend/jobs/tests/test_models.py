@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from .. import models
+from shared.testing.test_app.models import BasicModel
+from shared.testing.utils import create_instance, create_test_user
+from voto_studio_backend.changes.models import Change
+from voto_studio_backend.users.models import User
+
+
+def add(job, a, b):
+    job.set_progress(0.5, 'Halfway')
+    return a + b
+
+
+def fail(job):
+    raise ValueError('Foo')
+
+
+class JobTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@JobTests.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    def test_claim(self):
+        first_job = models.Job.objects.enqueue(f'{__name__}.add', user=self.user, a=1, b=2)
+        second_job = models.Job.objects.enqueue(f'{__name__}.add', user=self.user, a=3, b=4)
+
+        job = models.Job.objects.claim()
+        self.assertEqual(job.id, first_job.id)
+        self.assertEqual(job.status, models.JOB_RUNNING)
+        self.assertIsNotNone(job.date_started)
+
+        self.assertEqual(models.Job.objects.claim().id, second_job.id)
+        self.assertIsNone(models.Job.objects.claim())
+
+    def test_run(self):
+        models.Job.objects.enqueue(f'{__name__}.add', user=self.user, a=1, b=2)
+        job = models.Job.objects.claim().run()
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, models.JOB_SUCCEEDED)
+        self.assertEqual(job.result, 3)
+        self.assertEqual(job.progress, 1)
+        self.assertEqual(job.message, 'Halfway')
+        self.assertTrue(job.finished)
+
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.wait_time)
+        self.assertIsNotNone(job.run_time)
+
+    def test_run_retries(self):
+        models.Job.objects.enqueue(f'{__name__}.fail', user=self.user, max_attempts=2)
+        job = models.Job.objects.claim().run()
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, models.JOB_QUEUED)
+        self.assertIn('ValueError: Foo', job.error)
+        self.assertGreater(job.run_after, job.date_finished)
+        # The retry is backed off so it can't be claimed yet.
+        self.assertIsNone(models.Job.objects.claim())
+
+        models.Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        job = models.Job.objects.claim().run()
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, models.JOB_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+        metrics = models.Job.objects.get_metrics()
+        self.assertEqual(metrics[0]['task'], f'{__name__}.fail')
+        self.assertEqual(metrics[0]['failed'], 1)
+        self.assertEqual(metrics[0]['retries'], 1)
+
+    def test_requeue_stale(self):
+        models.Job.objects.enqueue(f'{__name__}.add', user=self.user, max_attempts=2, a=1, b=2)
+        job = models.Job.objects.claim()
+
+        # A long job that still beats is left running.
+        models.Job.objects.filter(id=job.id).update(date_started=timezone.now() - timedelta(hours=2))
+        job.beat()
+        self.assertEqual(models.Job.objects.requeue_stale(timeout=60), (0, 0))
+
+        models.Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(models.Job.objects.requeue_stale(timeout=60), (1, 0))
+        job = models.Job.objects.claim()
+        self.assertEqual(job.attempts, 2)
+
+        # The job has no attempt left once its worker is lost again.
+        models.Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(models.Job.objects.requeue_stale(timeout=60), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.JOB_FAILED)
+        self.assertIsNone(models.Job.objects.claim())
+
+    @create_test_user
+    def test_publish_instances(self, user):
+        instances = [create_instance(user=user) for _ in range(2)]
+        Change.objects.bulk_stage_created(instances, self.request)
+
+        models.Job.objects.enqueue(
+            'voto_studio_backend.changes.tasks.publish_instances',
+            user=self.user,
+            model_label=BasicModel._meta.label,
+            ids=[instance.id for instance in instances],
+        )
+        job = models.Job.objects.claim().run()
+
+        self.assertEqual(job.status, models.JOB_SUCCEEDED, job.error)
+        self.assertEqual(len(job.result['changes_committed']), len(instances))
+        for instance in instances:
+            self.assertFalse(Change.objects.get_for_instance(instance, committed=False))
@@ -0,0 +1,162 @@
+import numpy as np
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .graph import RelationshipGraph, _encode
+from shared.db import bulk_update
+from shared.utils import get_model
+from voto_studio_backend.corruption.models import FinancialItem
+from voto_studio_backend.search.models import OutboxEntry, OUTBOX_INDEX
+
+
+MAIN_SITE_DB = settings.MAIN_SITE_DB
+STUDIO_DB = settings.STUDIO_DB
+
+
+# The models whose scores are stored, in their
+# ``degree``, ``weighted_degree`` and ``pagerank`` fields.
+RANKED_MODELS = (
+    'political.Individual',
+    'political.Organization',
+)
+
+
+SCORE_FIELDS = ('degree', 'weighted_degree', 'pagerank')
+
+
+def get_adjacency_matrix(graph):
+    """
+    Return the adjacency matrix of a graph as a SciPy CSR matrix, sharing the graph's arrays.
+    """
+    return sparse.csr_matrix(
+        (np.ones(len(graph.indices)), graph.indices, graph.indptr),
+        shape=(len(graph.keys), len(graph.keys)),
+    )
+
+
+def get_node_weights(graph, using=MAIN_SITE_DB):
+    """
+    Return the weight of each node of a graph: the amount of the financial
+    items and 1 for the instances of every other model.
+    """
+    weights = np.ones(len(graph.keys))
+    content_type_id = ContentType.objects.get_for_model(FinancialItem).id
+    instance_ids = (graph.keys[(graph.keys >> 32) == content_type_id] & 0xFFFFFFFF).tolist()
+    if len(instance_ids):
+        amounts = FinancialItem.objects.using(using).filter(id__in=instance_ids).values_list('id', 'amount')
+        amounts = np.array(list(amounts), dtype=np.float64).reshape(-1, 2)
+        weights[np.searchsorted(graph.keys, _encode(content_type_id, amounts[:, 0]))] = amounts[:, 1]
+
+    return weights
+
+
+def pagerank(adjacency, damping=0.85, tolerance=1e-10, max_iterations=100):
+    """
+    Compute the PageRank of each node of an undirected graph by power iteration. A node
+    whose only relationships are with itself, which the graph drops, has no neighbors.
+    Its rank is spread over every node, so the ranks still add up to 1.
+    """
+    size = adjacency.shape[0]
+    if not size:
+        return np.empty(0)
+
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = degree == 0
+    inverse_degree = np.divide(1, degree, out=np.zeros(size), where=~dangling)
+    ranks = np.full(size, 1 / size)
+    for _ in range(max_iterations):
+        previous = ranks
+        ranks = (1 - damping) / size + damping * (adjacency.T.dot(previous * inverse_degree) +
+                                                  previous[dangling].sum() / size)
+        if np.abs(ranks - previous).sum() < tolerance:
+            break
+
+    return ranks
+
+
+def compute_centrality(graph, weights=None):
+    """
+    Return the degree, the weighted degree, in which each related instance counts
+    as its weight, and the PageRank of each node of a graph, as arrays indexed by node.
+    """
+    adjacency = get_adjacency_matrix(graph)
+    if weights is None:
+        weights = np.ones(len(graph.keys))
+
+    return {
+        'degree': np.diff(graph.indptr),
+        'weighted_degree': adjacency.dot(weights),
+        'pagerank': pagerank(adjacency),
+    }
+
+
+def _find_nodes(graph, content_type_id, instance_ids):
+    """
+    Return the node of each instance and whether it is in the graph at all.
+    """
+    keys = _encode(content_type_id, instance_ids)
+    nodes = np.searchsorted(graph.keys, keys)
+    found = nodes < len(graph.keys)
+    found[found] = graph.keys[nodes[found]] == keys[found]
+
+    return nodes, found
+
+
+def _store_scores(model_class, graph, scores, using):
+    """
+    Store the scores of the tracked instances of a model on the ``using`` database,
+    writing only the rows whose scores changed and queueing them to be indexed again.
+    Returns the number of instances updated and of instances ranked.
+    """
+    content_type_id = ContentType.objects.get_for_model(model_class).id
+    current = np.array(list(model_class.objects.using(using).filter(tracked=True).values_list('id', *SCORE_FIELDS)),
+                       dtype=np.float64).reshape(-1, len(SCORE_FIELDS) + 1)
+    ids = current[:, 0].astype(np.int64)
+
+    # Instances without relationships aren't in the graph and score 0.
+    new = np.zeros((len(ids), len(SCORE_FIELDS)))
+    nodes, in_graph = _find_nodes(graph, content_type_id, ids)
+    for column, field_name in enumerate(SCORE_FIELDS):
+        new[in_graph, column] = scores[field_name][nodes[in_graph]]
+
+    changed = ~np.isclose(current[:, 1:], new, rtol=1e-9, atol=1e-12).all(axis=1)
+    now = timezone.now()
+    instances = [model_class(id=int(ids[row]), degree=int(new[row, 0]), weighted_degree=float(new[row, 1]),
+                             pagerank=float(new[row, 2]), date_modified=now) for row in np.flatnonzero(changed)]
+
+    with transaction.atomic(using=using):
+        bulk_update(model_class, instances, (*SCORE_FIELDS, 'date_modified'), using=using)
+        OutboxEntry.objects.enqueue([(model_class._meta.label, instance.id, OUTBOX_INDEX) for instance in instances],
+                                    using=using)
+
+    return len(instances), len(ids)
+
+
+def rank_network(using=MAIN_SITE_DB, model_labels=RANKED_MODELS, logging=False):
+    """
+    Compute the centrality scores of the instances of the network from the database's
+    relationships and store them on the instances of ``model_labels``. Only the rows
+    whose scores changed are written, in bulk, and queued to be indexed again. The
+    scores are also stored on the base instances of the studio database, which share
+    their ids and are the ones the instance lists sort. Returns the number of instances
+    updated per model.
+    """
+    graph = RelationshipGraph.load(using=using)
+    scores = compute_centrality(graph, weights=get_node_weights(graph, using=using))
+    if logging:
+        print(f'Ranked {len(graph.keys)} instances related by {len(graph.indices) // 2} relationships.')
+
+    updated = {}
+    for model_label in model_labels:
+        model_class = get_model(model_label=model_label)
+        for database in dict.fromkeys((using, STUDIO_DB)):
+            count, total = _store_scores(model_class, graph, scores, using=database)
+            if database == using:
+                updated[model_label] = count
+            if logging:
+                print(f'Updated the scores of {count} of {total} {model_label} instances on {database}.')
+
+    return updated
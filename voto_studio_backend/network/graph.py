@@ -0,0 +1,294 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.utils import timezone
+
+from voto_studio_backend.changes.models import (
+    Change, REFERENCES, RELATIONSHIPS, TrackedWorkshopModel, rels_dict_contains,
+)
+
+
+STUDIO_DB = settings.STUDIO_DB
+MAIN_SITE_DB = settings.MAIN_SITE_DB
+
+
+LEVELS = (RELATIONSHIPS, REFERENCES)
+
+
+# Changes are re-read this far back on each refresh, so that changes whose
+# transaction committed after an earlier refresh had read the log are not missed.
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class GraphTooLargeError(Exception):
+    pass
+
+
+def _encode(content_type_ids, instance_ids):
+    """
+    Pack ``(content_type_id, id)`` pairs into single 64 bit keys.
+    """
+    return (np.asarray(content_type_ids, dtype=np.int64) << 32) | np.asarray(instance_ids, dtype=np.int64)
+
+
+def _decode(keys):
+    return list(zip((keys >> 32).tolist(), (keys & 0xFFFFFFFF).tolist()))
+
+
+def get_network_models(app_labels=None):
+    """
+    Return the tracked workshop models of the apps whose relationships make up the network.
+    """
+    if app_labels is None:
+        app_labels = settings.NETWORK_APPS
+
+    return [model for app_label in app_labels for model in apps.get_app_config(app_label).get_models()
+            if issubclass(model, TrackedWorkshopModel)]
+
+
+def _get_many_to_many_fields(models):
+    """
+    Return the forward many to many fields between the given models. The
+    media fields, which point outside of them, are left out.
+    """
+    return [field for model in models for field in model._meta.many_to_many if field.related_model in models]
+
+
+def _read_edges(fields, using, keys=None):
+    """
+    Read the relationships held through ``fields`` as arrays of source and target keys, one
+    query per field. They are read from the ``rels_dict`` of the tracked instances, the only
+    copy of them committed to the main site, at both levels like the through tables hold
+    them. If ``keys`` is given only the relationships touching them are read.
+    """
+    sources, targets = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for field in fields:
+        source_content_type_id = ContentType.objects.get_for_model(field.model).id
+        target_content_type_id = ContentType.objects.get_for_model(field.related_model).id
+
+        instances = field.model.objects.using(using).filter(tracked=True)
+        if keys is not None:
+            content_type_ids, instance_ids = keys >> 32, keys & 0xFFFFFFFF
+            query = Q(id__in=instance_ids[content_type_ids == source_content_type_id].tolist())
+            target_ids = instance_ids[content_type_ids == target_content_type_id].tolist()
+            if len(target_ids):
+                query |= rels_dict_contains(field.name, target_ids, levels=LEVELS)
+            instances = instances.filter(query)
+
+        rows = [(source_id, target_id) for source_id, rels_dict in instances.values_list('id', 'rels_dict')
+                for level in LEVELS for target_id in (rels_dict or {}).get(field.name, {}).get(level, ())]
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        sources.append(_encode(source_content_type_id, rows[:, 0]))
+        targets.append(_encode(target_content_type_id, rows[:, 1]))
+
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+class RelationshipGraph:
+    """
+    The relationship network of the workshop models, held in memory as a compressed sparse
+    row (CSR) adjacency structure. Each instance is given a compact node id, the position of
+    its ``(content_type_id, id)`` key in the sorted ``keys`` array, and the neighbors of node
+    ``n`` are ``indices[indptr[n]:indptr[n + 1]]``, in order. Relationships are undirected.
+    Queries only read the arrays, the database is only read by ``load`` and ``refresh``.
+    """
+    def __init__(self, fields, sources, targets, using=MAIN_SITE_DB, max_edges=None, synced_at=None):
+        self.fields = fields
+        self.using = using
+        self.max_edges = max_edges if max_edges is not None else settings.NETWORK_GRAPH_MAX_EDGES
+        self.synced_at = synced_at or timezone.now()
+        self.refreshed_at = time.time()
+        self.content_type_ids = sorted({ContentType.objects.get_for_model(model).id
+                                        for field in fields for model in (field.model, field.related_model)})
+        self._build(sources, targets)
+
+    @classmethod
+    def load(cls, models=None, using=MAIN_SITE_DB, max_edges=None):
+        """
+        Read every relationship between the network models into a new graph.
+        """
+        fields = _get_many_to_many_fields(models if models is not None else get_network_models())
+        synced_at = timezone.now() - REFRESH_OVERLAP
+        sources, targets = _read_edges(fields, using)
+
+        return cls(fields, sources, targets, using=using, max_edges=max_edges, synced_at=synced_at)
+
+    def _build(self, sources, targets):
+        if len(sources) > self.max_edges:
+            raise GraphTooLargeError(f'{len(sources)} relationships exceed the limit of {self.max_edges}.')
+
+        # The edge list is kept so that a refresh only needs to patch it.
+        self._sources, self._targets = sources, targets
+        self.keys = np.unique(np.concatenate([sources, targets]))
+
+        source_nodes = np.searchsorted(self.keys, sources)
+        target_nodes = np.searchsorted(self.keys, targets)
+        rows = np.concatenate([source_nodes, target_nodes])
+        columns = np.concatenate([target_nodes, source_nodes])
+
+        # Sort the edges by node then neighbor, and drop self loops and
+        # the duplicates listed by both ends of a relationship.
+        order = np.lexsort((columns, rows))
+        rows, columns = rows[order], columns[order]
+        keep = rows != columns
+        keep[1:] &= (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        rows, columns = rows[keep], columns[keep]
+
+        self.indptr = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.keys)), out=self.indptr[1:])
+        self.indices = columns.astype(np.int32)
+
+    def refresh(self):
+        """
+        Re-read the relationships of the instances whose changes have been committed since
+        the graph was last synced, one query per field, and rebuild the arrays.
+        Returns the number of instances re-read.
+        """
+        synced_at = timezone.now() - REFRESH_OVERLAP
+        committed = Change.objects \
+            .using(STUDIO_DB) \
+            .filter(committed=True, date_committed__gt=self.synced_at, content_type_id__in=self.content_type_ids) \
+            .values_list('content_type_id', 'base_id') \
+            .distinct()
+        committed = np.array(list(committed), dtype=np.int64).reshape(-1, 2)
+        keys = np.unique(_encode(committed[:, 0], committed[:, 1]))
+
+        if len(keys):
+            sources, targets = _read_edges(self.fields, self.using, keys=keys)
+            stale = np.isin(self._sources, keys) | np.isin(self._targets, keys)
+            self._build(np.concatenate([self._sources[~stale], sources]),
+                        np.concatenate([self._targets[~stale], targets]))
+
+        self.synced_at = synced_at
+        self.refreshed_at = time.time()
+
+        return len(keys)
+
+    def _get_node(self, content_type_id, instance_id):
+        key = (content_type_id << 32) | instance_id
+        node = int(np.searchsorted(self.keys, key))
+        if node < len(self.keys) and self.keys[node] == key:
+            return node
+        return None
+
+    def _gather(self, nodes):
+        """
+        Return the neighbors of all the given nodes, concatenated, and the node each came from.
+        """
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        return self.indices[offsets], np.repeat(nodes, counts)
+
+    def neighbors(self, content_type_id, instance_id):
+        """
+        Return the ``(content_type_id, id)`` of the instances related to an instance.
+        """
+        node = self._get_node(content_type_id, instance_id)
+        if node is None:
+            return []
+
+        return _decode(self.keys[self.indices[self.indptr[node]:self.indptr[node + 1]]])
+
+    def shortest_path(self, source, target, max_depth=6):
+        """
+        Return the ``(content_type_id, id)`` of the instances along a shortest path between
+        two instances, both included, or ``None`` if they are more than ``max_depth`` apart.
+        """
+        start, end = self._get_node(*source), self._get_node(*target)
+        if start is None or end is None:
+            return None
+
+        parents = np.full(len(self.keys), -1, dtype=np.int64)
+        parents[start] = start
+        frontier = np.array([start], dtype=np.int64)
+        for _ in range(max_depth):
+            if parents[end] != -1 or not len(frontier):
+                break
+            neighbors, origins = self._gather(frontier)
+            unseen = parents[neighbors] == -1
+            neighbors, first = np.unique(neighbors[unseen], return_index=True)
+            parents[neighbors] = origins[unseen][first]
+            frontier = neighbors
+
+        if parents[end] == -1:
+            return None
+
+        path = [end]
+        while path[-1] != start:
+            path.append(int(parents[path[-1]]))
+
+        return _decode(self.keys[path[::-1]])
+
+    def co_occurrence(self, first, second):
+        """
+        Return the number of instances related to both of two instances.
+        """
+        first, second = self._get_node(*first), self._get_node(*second)
+        if first is None or second is None:
+            return 0
+
+        return len(np.intersect1d(self.indices[self.indptr[first]:self.indptr[first + 1]],
+                                  self.indices[self.indptr[second]:self.indptr[second + 1]],
+                                  assume_unique=True))
+
+    def co_occurring(self, content_type_id, instance_id, limit=10, related_content_type_id=None):
+        """
+        Return the ``(content_type_id, id, count)`` of the instances that share the most
+        related instances with an instance, optionally only the ones of a given model.
+        """
+        node = self._get_node(content_type_id, instance_id)
+        if node is None:
+            return []
+
+        neighbors, _ = self._gather(np.array([node], dtype=np.int64))
+        second, _ = self._gather(neighbors)
+        candidates, counts = np.unique(second[second != node], return_counts=True)
+        if related_content_type_id is not None:
+            of_model = (self.keys[candidates] >> 32) == related_content_type_id
+            candidates, counts = candidates[of_model], counts[of_model]
+
+        top = np.argsort(-counts, kind='stable')[:limit]
+
+        return [(*key, count) for key, count in zip(_decode(self.keys[candidates[top]]), counts[top].tolist())]
+
+    def get_stats(self):
+        """
+        Return the size of the graph and the memory its arrays take up, in bytes.
+        """
+        arrays = (self.keys, self.indptr, self.indices, self._sources, self._targets)
+
+        return {
+            'nodes': len(self.keys),
+            'edges': len(self.indices) // 2,
+            'memory': sum(array.nbytes for array in arrays),
+            'max_edges': self.max_edges,
+            'synced_at': self.synced_at.isoformat(),
+        }
+
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_graph(using=MAIN_SITE_DB):
+    """
+    Return this process' graph of the ``using`` database. It is loaded on first
+    use and refreshed from the committed changes once it is older than
+    ``NETWORK_GRAPH_REFRESH_INTERVAL`` seconds.
+    """
+    with _graphs_lock:
+        graph = _graphs.get(using)
+        if graph is None:
+            graph = _graphs[using] = RelationshipGraph.load(using=using)
+        elif time.time() - graph.refreshed_at > settings.NETWORK_GRAPH_REFRESH_INTERVAL:
+            graph.refresh()
+
+    return graph
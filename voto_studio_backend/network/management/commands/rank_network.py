@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voto_studio_backend.network.centrality import rank_network
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--using', action='store', dest='using', type=str, default=settings.MAIN_SITE_DB,
+                            help='The database whose network is ranked')
+
+    def handle(self, *args, **options):
+        using = options.get('using')
+
+        self.stdout.write(f'Ranking the network of the {using} database...')
+        updated = rank_network(using=using, logging=True)
+
+        self.stdout.write(f'Successfully updated the scores of {sum(updated.values())} instances.')
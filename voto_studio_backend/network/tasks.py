@@ -0,0 +1,10 @@
+from django.conf import settings
+
+from .centrality import rank_network as _rank_network
+
+
+def rank_network(job, using=settings.MAIN_SITE_DB):
+    """
+    Compute and store the centrality scores of the network of a database.
+    """
+    return {'updated': _rank_network(using=using)}
@@ -0,0 +1,74 @@
+import numpy as np
+from django.conf import settings
+from django.test import RequestFactory, TestCase
+from ..centrality import compute_centrality, rank_network
+from ..graph import RelationshipGraph, _encode
+from shared.testing.test_app.models import BasicModel
+from shared.testing.utils import create_instance
+from voto_studio_backend.changes.models import Change
+from voto_studio_backend.political.models import Individual
+from voto_studio_backend.users.models import User
+
+
+class CentralityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.instances = [create_instance(user=self.user) for _ in range(4)]
+
+        # 0 - 1 - 2 - 3 and 0 - 2
+        a, b, c, d = self.instances
+        field = BasicModel._meta.get_field('many_to_many_field')
+        a.add_rels(field, [b, c])
+        b.add_rel(field, c)
+        c.add_rel(field, d)
+
+    def test_compute_centrality(self):
+        graph = RelationshipGraph.load(models=[BasicModel], using=settings.STUDIO_DB)
+        scores = compute_centrality(graph, weights=np.array([1., 2., 3., 4.]))
+
+        self.assertEqual(scores['degree'].tolist(), [2, 2, 3, 1])
+        self.assertEqual(scores['weighted_degree'].tolist(), [5, 4, 7, 3])
+        self.assertAlmostEqual(scores['pagerank'].sum(), 1)
+        self.assertEqual(int(np.argmax(scores['pagerank'])), 2)
+        self.assertEqual(int(np.argmin(scores['pagerank'])), 3)
+
+    def test_compute_centrality_self_loop(self):
+        # The third node is only related to itself.
+        keys = _encode(1, np.array([1, 2, 3]))
+        graph = RelationshipGraph([], keys[[0, 2]], keys[[1, 2]])
+        scores = compute_centrality(graph)
+
+        self.assertEqual(scores['degree'].tolist(), [1, 1, 0])
+        self.assertFalse(np.isnan(scores['pagerank']).any())
+        self.assertAlmostEqual(scores['pagerank'].sum(), 1)
+
+
+class RankNetworkTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123',
+            both_db=True,
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    def test_rank_network(self):
+        individuals = [Individual.objects.create(name=name, user=self.user) for name in ('Foo', 'Bar', 'Baz')]
+        individuals[0].add_rels(Individual._meta.get_field('individuals'), individuals[1:])
+        Change.objects.bulk_stage_created(individuals, self.request)
+        Change.objects.bulk_commit(Change.objects.filter(committed=False), to_index=False)
+
+        updated = rank_network(model_labels=(Individual._meta.label,))
+
+        self.assertEqual(updated, {Individual._meta.label: 3})
+        for using in (settings.MAIN_SITE_DB, settings.STUDIO_DB):
+            degrees = dict(Individual.objects.using(using).values_list('id', 'degree'))
+            self.assertEqual([degrees[individual.id] for individual in individuals], [2, 1, 1])
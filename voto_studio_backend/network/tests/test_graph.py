@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from ..graph import RelationshipGraph
+from shared.testing.test_app.models import BasicModel
+from shared.testing.utils import create_instance
+from voto_studio_backend.changes.models import Change, STAGE_UPDATED
+from voto_studio_backend.users.models import User
+
+
+class RelationshipGraphTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        self.content_type_id = ContentType.objects.get_for_model(BasicModel).id
+        self.instances = [create_instance(user=self.user) for _ in range(4)]
+
+        # 0 - 1 - 2 - 3 and 0 - 2
+        a, b, c, d = self.instances
+        field = BasicModel._meta.get_field('many_to_many_field')
+        a.add_rels(field, [b, c])
+        b.add_rel(field, c)
+        c.add_rel(field, d)
+
+    def _key(self, index):
+        return self.content_type_id, self.instances[index].id
+
+    def test_queries(self):
+        graph = RelationshipGraph.load(models=[BasicModel], using=settings.STUDIO_DB)
+
+        self.assertEqual(graph.get_stats()['nodes'], 4)
+        self.assertEqual(graph.get_stats()['edges'], 4)
+        self.assertEqual(graph.neighbors(*self._key(0)), [self._key(1), self._key(2)])
+        self.assertEqual(graph.shortest_path(self._key(0), self._key(3)), [self._key(0), self._key(2), self._key(3)])
+        self.assertIsNone(graph.shortest_path(self._key(0), self._key(3), max_depth=1))
+        self.assertEqual(graph.co_occurrence(self._key(0), self._key(1)), 1)
+        self.assertEqual(graph.co_occurring(*self._key(3), limit=1), [(*self._key(0), 1)])
+
+    def test_refresh(self):
+        graph = RelationshipGraph.load(models=[BasicModel], using=settings.STUDIO_DB)
+        self.instances[0].remove_rel(BasicModel._meta.get_field('many_to_many_field'), self.instances[2])
+
+        # Nothing was committed so the graph doesn't change.
+        self.assertEqual(graph.refresh(), 0)
+        self.assertEqual(graph.neighbors(*self._key(0)), [self._key(1), self._key(2)])
+
+        Change.objects.create(
+            stage_type=STAGE_UPDATED,
+            content_type_id=self.content_type_id,
+            base_id=self.instances[0].id,
+            committed=True,
+            date_committed=timezone.now(),
+            user=self.user,
+        )
+        self.assertEqual(graph.refresh(), 1)
+        self.assertEqual(graph.neighbors(*self._key(0)), [self._key(1)])
+        self.assertEqual(graph.neighbors(*self._key(2)), [self._key(1), self._key(3)])
+
+
+class MainSiteGraphTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123',
+            both_db=True,
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    def test_load_committed_relationships(self):
+        a, b, c = [create_instance(user=self.user) for _ in range(3)]
+        a.add_rels(BasicModel._meta.get_field('many_to_many_field'), [b, c])
+        Change.objects.bulk_stage_created([a, b, c], self.request)
+        Change.objects.bulk_commit(Change.objects.filter(committed=False), to_index=False)
+
+        graph = RelationshipGraph.load(models=[BasicModel], using=settings.MAIN_SITE_DB)
+
+        content_type_id = ContentType.objects.get_for_model(BasicModel).id
+        self.assertEqual(graph.get_stats()['edges'], 2)
+        self.assertEqual(graph.neighbors(content_type_id, a.id), [(content_type_id, b.id), (content_type_id, c.id)])
@@ -0,0 +1,24 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+
+class RelatedContentTests(TestCase):
+    @mock.patch('voto_studio_backend.network.views.get_graph')
+    def test_related_content(self, get_graph):
+        get_graph.return_value.neighbors.return_value = []
+        get_graph.return_value.co_occurring.return_value = []
+        url = reverse('network:related_content')
+
+        for limit, expected in [(5, 5), (0, 1), (-3, 1), (1000, 100)]:
+            response = self.client.get(url, {'ml': 'test_app.BasicModel', 'id': 1, 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_graph.return_value.co_occurring.call_args[1]['limit'], expected)
+
+    def test_related_content_invalid_params(self):
+        url = reverse('network:related_content')
+
+        self.assertEqual(self.client.get(url, {'ml': 'test_app.BasicModel'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ml': 'test_app.BasicModel', 'id': 'foo'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ml': 'test_app.BasicModel', 'id': 1, 'limit': 'foo'}).status_code, 400)
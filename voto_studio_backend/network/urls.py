@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'network'
+
+base_v1 = 'api/v1'
+
+urlpatterns = [
+    # GET Endpoints
+    path(f'{base_v1}/related_content/', views.related_content, name='related_content'),
+    path(f'{base_v1}/graph_stats/', views.graph_stats, name='graph_stats'),
+]
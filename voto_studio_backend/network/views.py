@@ -0,0 +1,60 @@
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .graph import get_graph
+from shared.utils import get_int_param, get_model
+
+
+def _serialize_nodes(nodes):
+    return [{
+        'model_label': ContentType.objects.get_for_id(content_type_id).model_class()._meta.label,
+        'id': instance_id,
+        **({'count': rest[0]} if rest else {}),
+    } for content_type_id, instance_id, *rest in nodes]
+
+
+@api_view()
+def related_content(request):
+    """
+    Return the instances related to an instance and the ones that share
+    the most related instances with it, from the in-memory graph. ``limit``,
+    at most 100, is the number of co-occurring instances returned.
+    """
+    try:
+        instance_id = get_int_param(request, 'id')
+        limit = get_int_param(request, 'limit', default=10, maximum=100)
+    except ValueError as e:
+        return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+
+    model_class = get_model(model_label=request.GET.get('ml'))
+    content_type_id = ContentType.objects.get_for_model(model_class).id
+
+    related_model_label = request.GET.get('rml')
+    related_content_type_id = None
+    if related_model_label is not None:
+        related_content_type_id = ContentType.objects.get_for_model(get_model(model_label=related_model_label)).id
+
+    graph = get_graph()
+    response = {
+        'id': instance_id,
+        'model_label': model_class._meta.label,
+        'related': _serialize_nodes(graph.neighbors(content_type_id, instance_id)),
+        'co_occurring': _serialize_nodes(graph.co_occurring(
+            content_type_id, instance_id, limit=limit, related_content_type_id=related_content_type_id,
+        )),
+    }
+
+    return Response(response, status=status.HTTP_200_OK)
+
+
+@api_view()
+def graph_stats(request):
+    """
+    Return the size and the memory usage of the in-memory graph.
+    """
+    if not request.user.is_authenticated:
+        return Response('User not authenticated', status=status.HTTP_401_UNAUTHORIZED)
+
+    return Response(get_graph().get_stats(), status=status.HTTP_200_OK)
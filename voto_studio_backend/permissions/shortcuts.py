@@ -38,7 +38,7 @@ def get_list_or_403(model_class, operation_tuple, **kwargs):
     instances = get_list_or_404(model_class, **kwargs)
     user, operation = operation_tuple
     for instance in instances:
-        if not instance.is_permitted(user, operation_tuple):
+        if not instance.is_permitted(user, operation):
             raise PermissionDenied(permission_denied_message({
                 'message': f'You do not have {operation} permission on all of this content.',
             }, instances=instances))
@@ -0,0 +1,43 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('political', '0026_auto_20190331_2101'),
+    ]
+
+    # ``jsonb_path_ops`` GIN indexes serve the ``@>`` containment
+    # queries of ``TrackedWorkshopModelManager.referencing()``.
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX political_law_rels_dict_gin ON political_law USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_law_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_individual_rels_dict_gin ON political_individual USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_individual_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_campaign_rels_dict_gin ON political_campaign USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_campaign_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_organization_rels_dict_gin ON political_organization USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_organization_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_promise_rels_dict_gin ON political_promise USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_promise_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_achievement_rels_dict_gin ON political_achievement USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_achievement_rels_dict_gin',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX political_controversy_rels_dict_gin ON political_controversy USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX political_controversy_rels_dict_gin',
+        ),
+    ]
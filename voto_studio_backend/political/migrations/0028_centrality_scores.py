@@ -0,0 +1,43 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('political', '0027_rels_dict_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='individual',
+            name='degree',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Number of related instances'),
+        ),
+        migrations.AddField(
+            model_name='individual',
+            name='pagerank',
+            field=models.FloatField(db_index=True, default=0, verbose_name='PageRank in the relationship network'),
+        ),
+        migrations.AddField(
+            model_name='individual',
+            name='weighted_degree',
+            field=models.FloatField(db_index=True, default=0, verbose_name='Related instances weighted by amount'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='degree',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Number of related instances'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='pagerank',
+            field=models.FloatField(db_index=True, default=0, verbose_name='PageRank in the relationship network'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='weighted_degree',
+            field=models.FloatField(db_index=True, default=0, verbose_name='Related instances weighted by amount'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('political', '0028_centrality_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievement',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='controversy',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='individual',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='law',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='promise',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Date of Last Modification'),
+            preserve_default=False,
+        ),
+    ]
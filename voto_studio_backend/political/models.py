@@ -1,5 +1,3 @@
-from itertools import permutations
-
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.db import models
@@ -79,6 +77,64 @@ POLITICAL_POSITIONS = (
 )
 
 
+def _get_related_ids(instances, field_name):
+    """
+    Return the ids of the instances related to each of a chunk of instances
+    through a field, as listed in their ``rels_dict``. References are left
+    out, like in the ``get_<method_field_name>`` methods.
+    """
+    ret = {}
+    for instance in instances:
+        try:
+            ret[instance.id] = instance.rels_dict[field_name]['rels']
+        except KeyError:
+            continue
+
+    return ret
+
+
+def _prefetch_related_funds(model_class, instances):
+    """
+    Sum the amounts of the financial items of a chunk of instances on the
+    MAIN_SITE_DB, like ``get_related_funds``, with one query for the
+    instances and one for their financial items.
+    """
+    main_site_instances = model_class.objects \
+        .using(settings.MAIN_SITE_DB) \
+        .filter(id__in=[instance.id for instance in instances]) \
+        .only('id', 'rels_dict')
+    related_ids = _get_related_ids(main_site_instances, 'financial_items')
+    amounts = dict(FinancialItem.objects
+                   .using(settings.MAIN_SITE_DB)
+                   .filter(id__in={i for ids in related_ids.values() for i in ids})
+                   .values_list('id', 'amount'))
+
+    return {instance_id: sum(amounts[i] for i in set(ids) if i in amounts)
+            for instance_id, ids in related_ids.items()}
+
+
+def _prefetch_individuals(instances):
+    """
+    Build the ``individuals`` of a chunk of instances, like ``get_individuals``, with
+    one query for the individuals and one for their primary images.
+    """
+    related_ids = _get_related_ids(instances, 'individuals')
+    individuals = Individual.objects \
+        .filter(id__in={i for ids in related_ids.values() for i in ids}) \
+        .only('id', 'name', 'order') \
+        .in_bulk()
+    image_ids = {individual.order['images'][0] for individual in individuals.values()
+                 if len(individual.order['images'])}
+    image_urls = {image.id: image.image.url for image in Image.objects.filter(id__in=image_ids)}
+
+    return {instance_id: [{
+        'id': individual.id,
+        'name': individual.name,
+        'primary_image_url': image_urls.get(individual.order['images'][0]) if len(individual.order['images']) else None,
+    } for individual in (individuals[i] for i in dict.fromkeys(ids) if i in individuals)] or None
+        for instance_id, ids in related_ids.items()}
+
+
 class Law(TrackedWorkshopModel):
     """
     Specifically a class created for individuals with previous political history.
@@ -150,6 +206,9 @@ class Individual(TrackedWorkshopModel):
     instagram_username = models.CharField(_('Instagram Username'), max_length=128, default=str)
     type = models.CharField(_('Type'), choices=INDIVIDUAL_TYPES, max_length=128, blank=True, null=True)
     related_funds = models.FloatField(blank=True, null=True, default=float)
+    degree = models.PositiveIntegerField(_('Number of related instances'), default=0, db_index=True)
+    weighted_degree = models.FloatField(_('Related instances weighted by amount'), default=0, db_index=True)
+    pagerank = models.FloatField(_('PageRank in the relationship network'), default=0, db_index=True)
     experience = JSONField(default=Experience(), blank=True, null=True)
 
     financial_items = models.ManyToManyField('corruption.FinancialItem', blank=True, related_name=related_name)
@@ -210,13 +269,34 @@ class Individual(TrackedWorkshopModel):
         'related_funds',
     )
 
+    # The models read by the method fields, through these relationships.
+    search_dependencies = (
+        'campaigns',
+        'financial_items',
+    )
+
+    # The fields and dependencies each method field is computed from.
+    search_method_field_inputs = {
+        'campaigns': ('rels_dict', 'campaigns'),
+        'related_funds': ('rels_dict', 'financial_items'),
+    }
+
     search_autocomplete_field = 'name'
 
-    hidden_fields = hidden_fields(fields_tuple=('source',))
+    hidden_fields = hidden_fields(fields_tuple=('source', 'degree', 'weighted_degree', 'pagerank'))
 
-    def get_autocomplete_input(self):
-        search_autocomplete_value = getattr(self, self.search_autocomplete_field, '')
-        return [' '.join(p) for p in permutations(search_autocomplete_value.split())]
+    sort_fields = (
+        'degree',
+        'weighted_degree',
+        'pagerank',
+    )
+
+    # Fields computed from the network of the main site, which commits leave as they are.
+    computed_fields = (
+        'degree',
+        'weighted_degree',
+        'pagerank',
+    )
 
     def get_campaigns(self):
         campaigns = get_list_or_404(Campaign, id__in=self.rels_dict['campaigns']['rels'])
@@ -230,6 +310,17 @@ class Individual(TrackedWorkshopModel):
 
         return response
 
+    @classmethod
+    def prefetch_campaigns(cls, instances, using=settings.STUDIO_DB):
+        related_ids = _get_related_ids(instances, 'campaigns')
+        campaigns = Campaign.objects.in_bulk({i for ids in related_ids.values() for i in ids})
+
+        return {instance_id: [{
+            'type': campaign.get_type_display(),
+            'reelection': campaign.reelection,
+        } for campaign in (campaigns[i] for i in dict.fromkeys(ids) if i in campaigns)] or None
+            for instance_id, ids in related_ids.items()}
+
     def get_related_funds(self):
         instance = get_object_or_404(self._meta.model.objects.using(settings.MAIN_SITE_DB), id=self.id)
         financial_items = FinancialItem.objects \
@@ -242,6 +333,10 @@ class Individual(TrackedWorkshopModel):
 
         return total
 
+    @classmethod
+    def prefetch_related_funds(cls, instances, using=settings.STUDIO_DB):
+        return _prefetch_related_funds(cls, instances)
+
 
 class Campaign(TrackedWorkshopModel):
     related_name = 'campaigns'
@@ -297,6 +392,9 @@ class Organization(TrackedWorkshopModel):
     instagram_username = models.CharField(_('Instagram Username'), max_length=128, default=str)
     type = models.CharField(_('Type'), choices=ORGANIZATION_TYPES, max_length=128, blank=True, null=True)
     related_funds = models.FloatField(blank=True, null=True, default=float)
+    degree = models.PositiveIntegerField(_('Number of related instances'), default=0, db_index=True)
+    weighted_degree = models.FloatField(_('Related instances weighted by amount'), default=0, db_index=True)
+    pagerank = models.FloatField(_('PageRank in the relationship network'), default=0, db_index=True)
 
     financial_items = models.ManyToManyField('corruption.FinancialItem', blank=True, related_name=related_name)
     organizations = models.ManyToManyField('self', blank=True, related_name=related_name)
@@ -330,7 +428,20 @@ class Organization(TrackedWorkshopModel):
         'related': (),
     }
 
-    hidden_fields = hidden_fields(fields_tuple=('source',))
+    hidden_fields = hidden_fields(fields_tuple=('source', 'degree', 'weighted_degree', 'pagerank'))
+
+    sort_fields = (
+        'degree',
+        'weighted_degree',
+        'pagerank',
+    )
+
+    # Fields computed from the network of the main site, which commits leave as they are.
+    computed_fields = (
+        'degree',
+        'weighted_degree',
+        'pagerank',
+    )
 
     search_fields = (
         'name',
@@ -350,6 +461,14 @@ class Organization(TrackedWorkshopModel):
         'related_funds',
     )
 
+    search_dependencies = (
+        'financial_items',
+    )
+
+    search_method_field_inputs = {
+        'related_funds': ('rels_dict', 'financial_items'),
+    }
+
     search_autocomplete_field = 'name'
 
     def get_related_funds(self):
@@ -364,6 +483,10 @@ class Organization(TrackedWorkshopModel):
 
         return total
 
+    @classmethod
+    def prefetch_related_funds(cls, instances, using=settings.STUDIO_DB):
+        return _prefetch_related_funds(cls, instances)
+
 
 class Promise(TrackedWorkshopModel):
     title = models.CharField(_('Title'), max_length=2048, default=str)
@@ -397,8 +520,20 @@ class Promise(TrackedWorkshopModel):
         'individuals',
     )
 
+    search_dependencies = (
+        'individuals',
+    )
+
+    search_method_field_inputs = {
+        'individuals': ('rels_dict', 'individuals'),
+    }
+
     search_autocomplete_field = 'title'
 
+    @classmethod
+    def prefetch_individuals(cls, instances, using=settings.STUDIO_DB):
+        return _prefetch_individuals(instances)
+
     def get_individuals(self):
         individuals = get_list_or_404(Individual, id__in=self.rels_dict['individuals']['rels'])
 
@@ -448,8 +583,20 @@ class Achievement(TrackedWorkshopModel):
         'individuals',
     )
 
+    search_dependencies = (
+        'individuals',
+    )
+
+    search_method_field_inputs = {
+        'individuals': ('rels_dict', 'individuals'),
+    }
+
     search_autocomplete_field = 'title'
 
+    @classmethod
+    def prefetch_individuals(cls, instances, using=settings.STUDIO_DB):
+        return _prefetch_individuals(instances)
+
     def get_individuals(self):
         individuals = get_list_or_404(Individual, id__in=self.rels_dict['individuals']['rels'])
 
@@ -499,8 +646,20 @@ class Controversy(TrackedWorkshopModel):
         'individuals',
     )
 
+    search_dependencies = (
+        'individuals',
+    )
+
+    search_method_field_inputs = {
+        'individuals': ('rels_dict', 'individuals'),
+    }
+
     search_autocomplete_field = 'title'
 
+    @classmethod
+    def prefetch_individuals(cls, instances, using=settings.STUDIO_DB):
+        return _prefetch_individuals(instances)
+
     def get_individuals(self):
         individuals = get_list_or_404(Individual, id__in=self.rels_dict['individuals']['rels'])
 
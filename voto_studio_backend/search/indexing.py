@@ -1,12 +1,22 @@
+import hashlib
+import json
 import re
-from itertools import permutations
+from datetime import timedelta
+from functools import partial, reduce
+from itertools import chain, islice
+from operator import or_
+from multiprocessing import Pool
 
 from django.apps import apps
 from django.conf import settings
-from django.core.exceptions import FieldError
-from elasticsearch.helpers import bulk
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import bulk, parallel_bulk, streaming_bulk, BulkIndexError
 from elasticsearch_dsl import (
-    Document, Index, Text, Date, Boolean, Integer, Long, Nested, Completion, analyzer, token_filter, Keyword,
+    Document, Index, Text, Date, Boolean, Integer, Float, Nested, Completion, analyzer, token_filter, Keyword,
 )
 from elasticsearch_dsl.connections import create_connection
 
@@ -14,20 +24,23 @@ from shared.utils import get_model
 from .utils import get_models_to_index, get_fields
 
 
-bonsai = settings.BONSAI_URL
-client = None
-if bonsai:
-    auth = re.search('https\:\/\/(.*)\@', bonsai).group(1).split(':')
-    host = bonsai.replace('https://%s:%s@' % (auth[0], auth[1]), '')
-    client = create_connection(
-        host=host,
-        port=443,
-        use_ssl=True,
-        http_auth=(auth[0], auth[1]),
-        timeout=30,
-    )
-else:
-    client = create_connection()
+def create_client():
+    bonsai = settings.BONSAI_URL
+    if bonsai:
+        auth = re.search('https\:\/\/(.*)\@', bonsai).group(1).split(':')
+        host = bonsai.replace('https://%s:%s@' % (auth[0], auth[1]), '')
+        return create_connection(
+            host=host,
+            port=443,
+            use_ssl=True,
+            http_auth=(auth[0], auth[1]),
+            timeout=30,
+        )
+    else:
+        return create_connection()
+
+
+client = create_client()
 
 
 FIELD_MAP = {
@@ -37,7 +50,7 @@ FIELD_MAP = {
     'URLField': Text,
     'IntegerField': Integer,
     'PositiveIntegerField': Integer,
-    'FloatField': Long,
+    'FloatField': Float,
     'DateField': Date,
     'DateTimeField': Date,
     'BooleanField': Boolean,
@@ -49,13 +62,46 @@ FIELD_MAP = {
 MODELS_TO_INDEX = get_models_to_index()
 
 
+# Instances modified this long before an incremental run are indexed again by the
+# next run, so that instances whose transaction committed during a run are not missed.
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
 def build_index_name(model_label, is_class=False, using=settings.STUDIO_DB):
+    """
+    Return the name documents are read and written through. It is an alias of the
+    current versioned index of the model, see ``build_versioned_index_name``.
+    """
     if is_class:
         return f'{model_label.split(".")[1]}Index{using.capitalize()}' + ('Test' if settings.TESTING else '')
     else:
         return f'{model_label.split(".")[1].lower()}-{using.lower()}' + ('-test' if settings.TESTING else '')
 
 
+def build_versioned_index_name(model_label, version, using=settings.STUDIO_DB):
+    return f'{build_index_name(model_label, using=using)}-v{version}'
+
+
+def get_index_versions(model_label, using=settings.STUDIO_DB):
+    """
+    Return the names of the versioned indices of a model, oldest first.
+    """
+    try:
+        return sorted(client.indices.get(f'{build_index_name(model_label, using=using)}-v*'))
+    except NotFoundError:
+        return []
+
+
+def get_aliased_indices(model_label, using=settings.STUDIO_DB):
+    """
+    Return the names of the indices the alias of a model currently points to.
+    """
+    try:
+        return sorted(client.indices.get_alias(name=build_index_name(model_label, using=using)))
+    except NotFoundError:
+        return []
+
+
 def get_index_name(index_name=None, model_label=None, using=settings.STUDIO_DB):
     if index_name is not None:
         return index_name
@@ -75,34 +121,30 @@ def check_index_exists(index_name=None, model_label=None, using=settings.STUDIO_
     ))
 
 
+ascii_fold_filter = token_filter('ascii_fold', 'asciifolding')
+
+
 ascii_fold = analyzer(
     'ascii_fold',
     tokenizer='whitespace',
     filter=[
         'lowercase',
-        token_filter('ascii_fold', 'asciifolding'),
+        ascii_fold_filter,
     ],
 )
 
 
-def clean(self):
-    """
-    Automatically construct the suggestion input and weight by taking all
-    possible permutation of the instance's ``search_autocomplete_field``
-    as ``input`` and taking 1 as ``weight`` (TODO: Improve weighting).
-    """
-    model_class = get_model(self.model_label)
-    field_value = getattr(self, model_class.search_autocomplete_field, '')
-    if field_value is not None:
-        self.suggest = {
-            'input': [field_value],
-            'weight': 1,
-        }
-    else:
-        self.suggest = {
-            'input': [],
-            'weight': 0,
-        }
+# Indexes the prefixes of each word, up to a bounded length, so
+# that a word can be completed wherever it is in a value.
+autocomplete = analyzer(
+    'autocomplete',
+    tokenizer='whitespace',
+    filter=[
+        'lowercase',
+        ascii_fold_filter,
+        token_filter('autocomplete_edge_ngram', 'edge_ngram', min_gram=1, max_gram=settings.AUTOCOMPLETE_MAX_GRAM),
+    ],
+)
 
 
 def get_field(model_label, field):
@@ -115,10 +157,12 @@ def get_field(model_label, field):
             'boost': 10,
         })
     if field.name in getattr(model_class, 'search_keyword_fields', ()):
-        field_kwargs.update({
-            'fields': {
-                'raw': Keyword(),
-            },
+        field_kwargs.setdefault('fields', {}).update({
+            'raw': Keyword(),
+        })
+    if field.name == getattr(model_class, 'search_autocomplete_field', None):
+        field_kwargs.setdefault('fields', {}).update({
+            'prefix': Text(analyzer=autocomplete, search_analyzer=ascii_fold),
         })
 
     return FIELD_MAP[field_type](**field_kwargs)
@@ -140,7 +184,6 @@ def create_document_class(model_label, using=settings.STUDIO_DB):
     }
     attr_dict.update({
         'model_label': model_label,
-        'clean': clean,
         'suggest': Completion(analyzer=ascii_fold),
     })
     document_class = type(model_label.split('.')[1], (Document,), attr_dict)
@@ -184,21 +227,341 @@ def create_base_index(index_name=None, model_label=None, using=settings.STUDIO_D
     return index
 
 
-def indexing(model_label, using=settings.STUDIO_DB):
+def create_versioned_index(model_label, version, using=settings.STUDIO_DB, bulk_load=False):
     """
-    Index existing instances for each model.
+    Create a new versioned index of a model, with the mapping of its document class, and
+    return its name. When ``bulk_load`` is set the index isn't refreshed and has no replicas
+    until ``finish_bulk_load`` is called.
+    """
+    index_name = build_versioned_index_name(model_label, version, using=using)
+    index = create_base_index(index_name=index_name)
+    if bulk_load:
+        index.settings(refresh_interval='-1', number_of_replicas=0)
+    index.document(get_document_class(model_label, using=using))
+    index.create()
+
+    return index_name
+
+
+def finish_bulk_load(index_name):
+    """
+    Restore the refresh interval and the replicas of an index created
+    with ``bulk_load`` set, and make its documents searchable.
     """
-    if check_index_exists(model_label, using=using):
+    client.indices.put_settings(index=index_name, body={
+        'index': {
+            'refresh_interval': None,
+            'number_of_replicas': settings.NUMBER_OF_REPLICAS,
+        },
+    })
+    client.indices.refresh(index=index_name)
+
+
+def point_alias(model_label, index_name, using=settings.STUDIO_DB):
+    """
+    Point the alias of a model to ``index_name`` instead of its current indices, in a single
+    atomic request, so searches never see a missing or partial index. The previous indices
+    are kept. An index left from before indices were versioned, named like the alias, is
+    deleted in the same request.
+    """
+    alias = build_index_name(model_label, using=using)
+    actions = [{'remove': {'index': name, 'alias': alias}}
+               for name in get_aliased_indices(model_label, using=using) if name != index_name]
+    if client.indices.exists(alias) and not client.indices.exists_alias(name=alias):
+        actions.append({'remove_index': {'index': alias}})
+    actions.append({'add': {'index': index_name, 'alias': alias}})
+
+    client.indices.update_aliases(body={'actions': actions})
+
+
+def get_dependency_fields(model_class):
+    """
+    Return the relationship fields, by name, through which the computed fields of a
+    model's documents read other models, as declared by its ``search_dependencies``.
+    """
+    return {field_name: model_class._meta.get_field(field_name)
+            for field_name in getattr(model_class, 'search_dependencies', ())}
+
+
+def get_stale_dependencies(ids_by_label, using=settings.STUDIO_DB, batch_size=500):
+    """
+    Return the instances whose documents embed data of the instances in ``ids_by_label``
+    and so go stale when they change, as ``{model_label: {instance_id: dependencies}}``
+    where ``dependencies`` are the names of the relationships through which they do.
+    Only the instances directly related are returned. They are found from their
+    ``rels_dict``, which the method fields read and which, unlike the through tables, is
+    committed to the main site, with one query per ``batch_size`` ids of each dependency.
+    """
+    from voto_studio_backend.changes.models import rels_dict_contains
+
+    dependents = {}
+    for model_label in MODELS_TO_INDEX:
         model_class = get_model(model_label=model_label)
-        try:
-            instances = model_class.objects.using(using).filter(tracked=True)
-        except FieldError:
-            instances = model_class.objects.using(using).all()
-        bulk(
-            client=client,
-            actions=(instance.create_document(using=using) for instance in instances.iterator())
+        for field_name, field in get_dependency_fields(model_class).items():
+            ids = sorted(ids_by_label.get(field.related_model._meta.label, ()))
+            for i in range(0, len(ids), batch_size):
+                dependent_ids = model_class.objects \
+                    .using(using) \
+                    .filter(rels_dict_contains(field_name, ids[i:i + batch_size])) \
+                    .values_list('id', flat=True)
+                model_dependents = dependents.setdefault(model_label, {})
+                for dependent_id in dependent_ids:
+                    model_dependents.setdefault(dependent_id, set()).add(field_name)
+
+    return dependents
+
+
+def get_dependents(ids_by_label, using=settings.STUDIO_DB):
+    """
+    Return the ids, by model label, of the instances whose documents embed data
+    of the instances in ``ids_by_label``, see ``get_stale_dependencies``.
+    """
+    return {model_label: set(dependencies)
+            for model_label, dependencies in get_stale_dependencies(ids_by_label, using=using).items()}
+
+
+def _get_instances(model_label, using=settings.STUDIO_DB):
+    model_class = get_model(model_label=model_label)
+    try:
+        instances = model_class.objects.using(using).filter(tracked=True)
+    except FieldError:
+        instances = model_class.objects.using(using).all()
+
+    return instances.select_related(*getattr(model_class, 'search_select_related', ()))
+
+
+def get_chunk_actions(instances, using=settings.STUDIO_DB):
+    """
+    Build the bulk index actions of a chunk of instances of one model. Their media
+    and method fields are computed for the whole chunk by ``get_indexing_context``.
+    """
+    if not len(instances):
+        return []
+
+    context = instances[0].get_indexing_context(instances, using=using)
+
+    return [instance.get_action(using=using, context=context) for instance in instances]
+
+
+def get_field_digests(values):
+    """
+    Return a short digest of each of the values of a document, by field name.
+    """
+    return {name: hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+            for name, value in values.items()}
+
+
+def get_chunk_updates(instances, using=settings.STUDIO_DB, states=None, stale_dependencies=None):
+    """
+    Build the bulk actions that bring the documents of a chunk of instances of one model
+    up to date. ``states`` holds the field digests of the documents as they were last
+    indexed, by instance id. An instance without one is indexed in full, otherwise only
+    the fields whose digest changed are sent, with a partial update, and none at all if
+    nothing changed.
+
+    A method field is only computed again when one of its inputs changed, see
+    ``get_stale_method_fields``: a field of the instance or one of its dependencies named
+    in ``stale_dependencies``, by instance id. The media are always built again, as their
+    items can be edited without the instance changing, and sent if their digest changed.
+    Returns the actions and the new field digests of the instances they update, by
+    instance id.
+    """
+    if not len(instances):
+        return [], {}
+
+    states = states or {}
+    stale_dependencies = stale_dependencies or {}
+    model_class = instances[0]._meta.model
+
+    # The fields of the instances are compared first, to know what has to be computed.
+    values, digests, stale = {}, {}, {}
+    for instance in instances:
+        values[instance.id] = instance.get_values(method_fields=(), media=False)
+        digests[instance.id] = get_field_digests(values[instance.id])
+        state = states.get(instance.id)
+        if state is not None:
+            changed = {name for name, digest in digests[instance.id].items() if not state.get(name) == digest}
+            changed.update(stale_dependencies.get(instance.id, ()))
+            stale[instance.id] = model_class.get_stale_method_fields(changed)
+
+    # What any instance needs is computed in bulk for the whole chunk.
+    if len(stale) < len(instances):
+        context = model_class.get_indexing_context(instances, using=using)
+    else:
+        context = model_class.get_indexing_context(
+            instances,
+            using=using,
+            method_fields={name for method_fields in stale.values() for name in method_fields},
         )
 
+    actions, updated = [], {}
+    for instance in instances:
+        computed = instance.get_method_values(context=context, method_fields=stale.get(instance.id))
+        computed['media'] = instance.get_media(context=context)
+        instance_values = {**values[instance.id], **computed}
+        instance_digests = {**digests[instance.id], **get_field_digests(computed)}
+
+        state = states.get(instance.id)
+        if state is None:
+            document = instance.get_document(using=using, values=instance_values)
+            document.full_clean()
+            actions.append(document.to_dict(include_meta=True))
+        else:
+            instance_digests = {**state, **instance_digests}
+            changed = {name: value for name, value in instance_values.items()
+                       if not state.get(name) == instance_digests[name]}
+            if not len(changed):
+                continue
+            document = get_document_class(instance._meta.label, using=using)(**changed)
+            actions.append({
+                '_op_type': 'update',
+                '_index': build_index_name(instance._meta.label, using=using),
+                '_type': 'doc',
+                '_id': instance.id,
+                'doc': document.to_dict(skip_empty=False),
+            })
+        updated[instance.id] = instance_digests
+
+    return actions, updated
+
+
+def _generate_chunk_actions(instances, using=settings.STUDIO_DB, chunk_size=500, index_name=None):
+    instances = instances.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(instances, chunk_size))
+        if not len(chunk):
+            return
+        for action in get_chunk_actions(chunk, using=using):
+            if index_name is not None:
+                action['_index'] = index_name
+            yield action
+
+
+def generate_actions(model_label, using=settings.STUDIO_DB, chunk_size=500, index_name=None):
+    """
+    Yield the bulk index action of every instance of a model, reading and
+    building the instances ``chunk_size`` at a time. Nothing is sent to Elasticsearch.
+    The documents go to the model's alias unless an ``index_name`` is given.
+    """
+    yield from _generate_chunk_actions(_get_instances(model_label, using=using), using=using,
+                                       chunk_size=chunk_size, index_name=index_name)
+
+
+def _get_delete_action(model_label, instance_id, using=settings.STUDIO_DB):
+    return {
+        '_op_type': 'delete',
+        '_index': build_index_name(model_label, using=using),
+        '_type': 'doc',
+        '_id': instance_id,
+    }
+
+
+def _send_actions(actions, model_label, chunk_size=500, thread_count=1):
+    """
+    Send a stream of actions in bulk requests of ``chunk_size`` actions, by ``thread_count``
+    threads. Deleting a document that doesn't exist isn't an error. Returns the number of
+    documents indexed and deleted.
+    """
+    if thread_count > 1:
+        results = parallel_bulk(client, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                raise_on_error=False)
+    else:
+        results = streaming_bulk(client, actions, chunk_size=chunk_size, raise_on_error=False)
+
+    indexed, deleted, errors = 0, 0, []
+    for ok, item in results:
+        if 'delete' in item and (ok or item['delete'].get('status') == 404):
+            deleted += 1
+        elif ok:
+            indexed += 1
+        else:
+            errors.append(item)
+    if len(errors):
+        raise BulkIndexError(f'{len(errors)} document(s) of {model_label} failed to index.', errors)
+
+    return indexed, deleted
+
+
+def index_model(model_label, using=settings.STUDIO_DB, chunk_size=500, thread_count=1, index_name=None):
+    """
+    Index every instance of a model, sending each document once, in bulk requests of
+    ``chunk_size`` documents. With a ``thread_count`` above 1 the requests are sent by
+    that many threads while the next documents are built. Returns the number of
+    documents indexed.
+    """
+    actions = generate_actions(model_label, using=using, chunk_size=chunk_size, index_name=index_name)
+    indexed, _ = _send_actions(actions, model_label, chunk_size=chunk_size, thread_count=thread_count)
+
+    return indexed
+
+
+def indexing(model_label, using=settings.STUDIO_DB, chunk_size=500, thread_count=1):
+    """
+    Index existing instances for each model.
+    """
+    if check_index_exists(model_label=model_label, using=using):
+        index_model(model_label, using=using, chunk_size=chunk_size, thread_count=thread_count)
+
+
+def index_instances(instances, using=settings.STUDIO_DB, deleted=(), stale_dependencies=None):
+    """
+    Index a collection of instances with a single bulk request, sending only the fields
+    of their documents that changed since they were last indexed, see ``get_chunk_updates``.
+    ``stale_dependencies`` holds the dependencies of the instances that changed, by model
+    label. The documents of the ``(model_label, instance_id)`` pairs in ``deleted`` are
+    deleted in the same request, documents that don't exist are ignored.
+    """
+    from .models import DocumentState
+
+    stale_dependencies = stale_dependencies or {}
+    chunks = {}
+    for instance in instances:
+        if instance._meta.label not in MODELS_TO_INDEX:
+            continue
+        chunks.setdefault(instance._meta.label, []).append(instance)
+
+    actions, digests = [], {}
+    for model_label, chunk in chunks.items():
+        states = DocumentState.objects.get_digests(model_label, [instance.id for instance in chunk], using=using)
+        chunk_actions, digests[model_label] = get_chunk_updates(chunk, using=using, states=states,
+                                                                stale_dependencies=stale_dependencies.get(model_label))
+        actions.extend(chunk_actions)
+    deleted_ids = {}
+    for model_label, instance_id in deleted:
+        if model_label not in MODELS_TO_INDEX:
+            continue
+        actions.append(_get_delete_action(model_label, instance_id, using=using))
+        deleted_ids.setdefault(model_label, []).append(instance_id)
+    for model_label, instance_ids in deleted_ids.items():
+        DocumentState.objects.forget(using, model_label=model_label, instance_ids=instance_ids)
+
+    if not len(actions):
+        return
+
+    _, errors = bulk(client=client, actions=actions, raise_on_error=False)
+    errors = [error for error in errors if not error.get('delete', {}).get('status') == 404]
+
+    # The states of the documents that failed are forgotten, by id as the errors name the
+    # indices rather than the aliases, so they are indexed in full by the next attempt.
+    failed_ids = {str(item['_id']) for error in errors for item in error.values()}
+    for model_label, chunk_digests in digests.items():
+        DocumentState.objects.record(model_label, {
+            instance_id: instance_digests for instance_id, instance_digests in chunk_digests.items()
+            if str(instance_id) not in failed_ids
+        }, using=using)
+        DocumentState.objects.forget(using, model_label=model_label, instance_ids=[
+            instance_id for instance_id in chunk_digests if str(instance_id) in failed_ids
+        ])
+
+    # A document missing from the index can't be updated, so it is indexed in full straight away.
+    missing_ids = {str(error['update']['_id']) for error in errors if error.get('update', {}).get('status') == 404}
+    if len(missing_ids):
+        index_instances([instance for instance in instances if str(instance.id) in missing_ids], using=using)
+        errors = [error for error in errors if not error.get('update', {}).get('status') == 404]
+
+    if len(errors):
+        raise BulkIndexError(f'{len(errors)} document(s) failed to index.', errors)
+
 
 def _parse_using(using):
     if isinstance(using, str):
@@ -211,41 +574,206 @@ def _parse_using(using):
     return using
 
 
-def bulk_indexing(using=settings.STUDIO_DB):
+def _init_process():
+    global client
+    # Forked processes can't share the parent's Elasticsearch connections.
+    client = create_client()
+
+
+def _index_model_into(item, **kwargs):
+    model_label, index_name = item
+
+    return index_model(model_label, index_name=index_name, **kwargs)
+
+
+def _index_models(index_names, using, chunk_size=500, processes=1, thread_count=1):
     """
-    Bulk index existing instances for each model.
+    Index the instances of each model of ``index_names`` into the index it maps to,
+    or into the model's alias for ``None``. With more than one process the models
+    are indexed in parallel, each by a single process.
     """
+    index_model_into = partial(_index_model_into, using=using, chunk_size=chunk_size, thread_count=thread_count)
+    if processes > 1:
+        # Connections can't be shared with forked processes.
+        connections.close_all()
+        with Pool(processes, initializer=_init_process) as pool:
+            pool.map(index_model_into, index_names.items(), chunksize=1)
+    else:
+        for item in index_names.items():
+            index_model_into(item)
+
+
+def _get_version():
+    return timezone.now().strftime('%Y%m%d%H%M%S')
+
+
+def bulk_indexing(using=settings.STUDIO_DB, chunk_size=500, processes=1, thread_count=1):
+    """
+    Bulk index existing instances for each model, through the aliases. Models
+    without an index are given a first versioned index and their alias.
+    """
+    from .models import DocumentState
+
+    using = _parse_using(using)
+    for alias in using:
+        version = _get_version()
+        for model_label in MODELS_TO_INDEX:
+            if not check_index_exists(model_label=model_label, using=alias):
+                index_name = create_versioned_index(model_label, version, using=alias)
+                point_alias(model_label, index_name, using=alias)
+
+        DocumentState.objects.forget(alias)
+        _index_models({model_label: None for model_label in MODELS_TO_INDEX}, using=alias, chunk_size=chunk_size,
+                      processes=processes, thread_count=thread_count)
+
+
+def reindex(using=settings.STUDIO_DB, chunk_size=500, processes=1, thread_count=1, keep=1, logging=False):
+    """
+    Rebuild the indices of every model without downtime. The documents are bulk loaded
+    into new versioned indices, without refreshes or replicas, then each alias is
+    pointed to its new index atomically. The ``keep`` previous versions of each index
+    are kept so ``rollback`` can go back to them, older ones are deleted.
+
+    The search outbox is paused meanwhile, so updates made during the rebuild
+    are sent to the new indices once they are live instead of to the old ones.
+    """
+    from .models import DocumentState, IndexWatermark, OutboxEntry
+
     using = _parse_using(using)
     for alias in using:
-        for index_name, document_class in get_document_classes(using=alias).items():
-            if not check_index_exists(index_name=index_name, using=alias):
-                index = create_base_index(index_name=index_name)
-                index.document(document_class)
-                index.create()
+        version = _get_version()
+        OutboxEntry.objects.pause(using=alias)
+        started = timezone.now()
+        try:
+            index_names = {model_label: create_versioned_index(model_label, version, using=alias, bulk_load=True)
+                           for model_label in MODELS_TO_INDEX}
+            if logging:
+                print(f'Bulk loading {len(index_names)} indices of version {version} of {alias}...')
+            _index_models(index_names, using=alias, chunk_size=chunk_size, processes=processes,
+                          thread_count=thread_count)
+
+            for model_label, index_name in index_names.items():
+                finish_bulk_load(index_name)
+                point_alias(model_label, index_name, using=alias)
+                IndexWatermark.objects.advance(model_label, alias, started - WATERMARK_OVERLAP)
+                for old_index_name in get_index_versions(model_label, using=alias)[:-(keep + 1)]:
+                    client.indices.delete(old_index_name)
+            # The new indices may hold older values than the states, e.g. of the updates
+            # made while they were loaded, so the next update of each document is in full.
+            DocumentState.objects.forget(alias)
+            if logging:
+                print(f'Pointed the aliases of {alias} to version {version}.')
+        finally:
+            OutboxEntry.objects.resume(using=alias)
+
+        OutboxEntry.objects.flush(using=alias)
+
+
+def incremental_indexing(using=settings.STUDIO_DB, chunk_size=500, thread_count=1, logging=False):
+    """
+    Index the instances of each model modified since the model's watermark, and delete
+    the documents of the instances deleted or untracked since then. The watermark only
+    moves forward once a model has been indexed successfully, to when the run started
+    minus ``WATERMARK_OVERLAP``. The first run of a model indexes all of its instances.
+    Models without a ``date_modified`` field are skipped, as are the databases whose
+    indices are being rebuilt. Returns the number of documents indexed and deleted
+    per model label.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from voto_studio_backend.changes.models import Change, STAGE_DELETED
+    from .models import DocumentState, IndexWatermark, OutboxEntry
+
+    using = _parse_using(using)
+    report = {}
+    for alias in using:
+        if OutboxEntry.objects.is_paused(using=alias):
+            continue
 
         for model_label in MODELS_TO_INDEX:
             model_class = get_model(model_label=model_label)
             try:
-                instances = model_class.objects.using(alias).filter(tracked=True)
-            except FieldError:
-                instances = model_class.objects.using(alias).all()
-            bulk(
-                client=client,
-                actions=(instance.create_document(using=alias) for instance in instances.iterator())
+                model_class._meta.get_field('date_modified')
+            except FieldDoesNotExist:
+                continue
+
+            started = timezone.now()
+            watermark = IndexWatermark.objects.get_watermark(model_label, using=alias)
+            instances = model_class.objects.using(alias).all()
+            deleted_changes = Change.objects \
+                .using(settings.STUDIO_DB) \
+                .filter(content_type=ContentType.objects.get_for_model(model_class), stage_type=STAGE_DELETED)
+            if watermark is not None:
+                # Instances whose dependencies were modified are stale too.
+                modified = reduce(or_, [Q(**{f'{field_name}__date_modified__gt': watermark})
+                                        for field_name in get_dependency_fields(model_class)],
+                                  Q(date_modified__gt=watermark))
+                instances = instances.filter(modified).distinct()
+                deleted_changes = deleted_changes.filter(date_created__gt=watermark)
+
+            deleted_ids = {*instances.filter(tracked=False).values_list('id', flat=True),
+                           *deleted_changes.values_list('base_id', flat=True)}
+            tracked_instances = instances \
+                .filter(tracked=True) \
+                .select_related(*getattr(model_class, 'search_select_related', ())) \
+                .order_by('id')
+            # Whole documents are sent, so the states of those documents no longer hold.
+            DocumentState.objects.forget(alias, model_label=model_label, instance_ids=instances.values('id'))
+            DocumentState.objects.forget(alias, model_label=model_label, instance_ids=list(deleted_ids))
+            actions = chain(
+                _generate_chunk_actions(tracked_instances, using=alias, chunk_size=chunk_size),
+                (_get_delete_action(model_label, instance_id, using=alias) for instance_id in deleted_ids),
             )
+            indexed, deleted = _send_actions(actions, model_label, chunk_size=chunk_size, thread_count=thread_count)
+
+            IndexWatermark.objects.advance(model_label, alias, started - WATERMARK_OVERLAP,
+                                           indexed=indexed, deleted=deleted)
+            report[model_label] = {'indexed': indexed, 'deleted': deleted}
+            if logging:
+                print(f'{model_label} ({alias}): {indexed} indexed, {deleted} deleted since {watermark}.')
+
+    return report
+
+
+def rollback(using=settings.STUDIO_DB):
+    """
+    Point the alias of each model back to its previous versioned index. Returns the
+    names of the indices the aliases now point to, by model label.
+    """
+    from .models import DocumentState
+
+    using = _parse_using(using)
+    rolled_back = {}
+    for alias in using:
+        for model_label in MODELS_TO_INDEX:
+            versions = get_index_versions(model_label, using=alias)
+            current = get_aliased_indices(model_label, using=alias)
+            previous = [index_name for index_name in versions if len(current) and index_name < current[0]]
+            if len(previous):
+                point_alias(model_label, previous[-1], using=alias)
+                DocumentState.objects.forget(alias, model_label=model_label)
+                rolled_back[model_label] = previous[-1]
+
+    return rolled_back
 
 
 def clear_indices(using=settings.STUDIO_DB, confirm=False):
     """
-    Delete all current indexes
+    Delete all current indexes, with their previous versions.
     """
+    from .models import DocumentState
+
     using = _parse_using(using)
     for alias in using:
         if not (settings.TESTING or confirm):
             raise Exception('Attempt to clear default indices without confirmation!')
 
         for model_label in MODELS_TO_INDEX:
-            # If the index exists delete it.
-            if check_index_exists(model_label=model_label, using=alias) and not \
-               model_label == settings.AUTH_USER_MODEL:
+            if model_label == settings.AUTH_USER_MODEL:
+                continue
+            # Deleting the indices deletes their alias.
+            for index_name in get_index_versions(model_label, using=alias):
+                client.indices.delete(index_name)
+            # If an index from before indices were versioned exists delete it.
+            if check_index_exists(model_label=model_label, using=alias):
                 client.indices.delete(build_index_name(model_label, using=alias))
+            DocumentState.objects.forget(alias, model_label=model_label)
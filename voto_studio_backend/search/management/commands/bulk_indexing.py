@@ -6,6 +6,12 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('using', type=str)
         parser.add_argument('--bypass', action='store', dest='bypass', help='Bypass the confirmation step')
+        parser.add_argument('--chunk_size', action='store', dest='chunk_size', type=int, default=500,
+                            help='Number of documents sent per bulk request')
+        parser.add_argument('--processes', action='store', dest='processes', type=int, default=1,
+                            help='Number of processes, each indexing one model at a time')
+        parser.add_argument('--thread_count', action='store', dest='thread_count', type=int, default=1,
+                            help='Number of threads sending the bulk requests of each process')
 
     def handle(self, *args, **options):
         using = options.get('using')
@@ -18,7 +24,12 @@ class Command(BaseCommand):
 
         if confirm:
             self.stdout.write('Bulk indexing...')
-            bulk_indexing(using=using)
+            bulk_indexing(
+                using=using,
+                chunk_size=max(options.get('chunk_size'), 1),
+                processes=max(options.get('processes'), 1),
+                thread_count=max(options.get('thread_count'), 1),
+            )
 
             self.stdout.write('Successfully bulk indexed.')
         else:
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from voto_studio_backend.search.models import OutboxEntry
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--using', action='store', dest='using', default=settings.MAIN_SITE_DB,
+                            help='Database whose outbox is flushed')
+        parser.add_argument('--batch_size', action='store', dest='batch_size', default=1000,
+                            help='Number of entries sent per bulk request')
+        parser.add_argument('--retry_parked', action='store_true', dest='retry_parked',
+                            help='Queue the entries parked after failing too many times again')
+
+    def handle(self, *args, **options):
+        using = options.get('using')
+
+        if options.get('retry_parked'):
+            self.stdout.write(f'Queued {OutboxEntry.objects.retry_parked(using=using)} parked entries again.')
+
+        stats = OutboxEntry.objects.get_stats(using=using)
+        self.stdout.write(f'{stats["pending"]} pending entries, lagging {stats["lag"]:.1f}s, '
+                          f'{stats["parked"]} parked.')
+
+        if stats['paused']:
+            self.stdout.write('The outbox is paused while the indices are rebuilt.')
+            return
+
+        flushed = OutboxEntry.objects.flush(using=using, batch_size=int(options.get('batch_size')))
+
+        stats = OutboxEntry.objects.get_stats(using=using)
+        self.stdout.write(f'Successfully flushed {flushed} entries in {stats["last_flush"]["latency"]:.2f}s.')
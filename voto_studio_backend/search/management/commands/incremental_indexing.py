@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from voto_studio_backend.search.indexing import incremental_indexing
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('using', type=str)
+        parser.add_argument('--chunk_size', action='store', dest='chunk_size', type=int, default=500,
+                            help='Number of documents sent per bulk request')
+        parser.add_argument('--thread_count', action='store', dest='thread_count', type=int, default=1,
+                            help='Number of threads sending the bulk requests')
+
+    def handle(self, *args, **options):
+        using = options.get('using')
+
+        self.stdout.write(f'Indexing the changes made on the {using} alias since the last run...')
+        report = incremental_indexing(
+            using=using,
+            chunk_size=max(options.get('chunk_size'), 1),
+            thread_count=max(options.get('thread_count'), 1),
+            logging=True,
+        )
+
+        indexed = sum(counts['indexed'] for counts in report.values())
+        deleted = sum(counts['deleted'] for counts in report.values())
+        self.stdout.write(f'Successfully indexed {indexed} and deleted {deleted} documents.')
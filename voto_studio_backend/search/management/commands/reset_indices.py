@@ -1,27 +1,39 @@
 from django.core.management.base import BaseCommand
-from voto_studio_backend.search.indexing import clear_indices, bulk_indexing
+from voto_studio_backend.search.indexing import reindex
 
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('using', type=str)
         parser.add_argument('--bypass', action='store', dest='bypass', help='Bypass the confirmation step')
+        parser.add_argument('--chunk_size', action='store', dest='chunk_size', type=int, default=500,
+                            help='Number of documents sent per bulk request')
+        parser.add_argument('--processes', action='store', dest='processes', type=int, default=1,
+                            help='Number of processes, each indexing one model at a time')
+        parser.add_argument('--thread_count', action='store', dest='thread_count', type=int, default=1,
+                            help='Number of threads sending the bulk requests of each process')
+        parser.add_argument('--keep', action='store', dest='keep', type=int, default=1,
+                            help='Number of previous versions of each index kept for rollbacks')
 
     def handle(self, *args, **options):
         using = options.get('using')
 
         if not options.get('bypass'):
-            ans = input(f'This will reset ALL indices on the {using} alias! Do you wish to continue? [y/N] ')
+            ans = input(f'This will rebuild ALL indices on the {using} alias! Do you wish to continue? [y/N] ')
             confirm = ans.lower() == 'y'
         else:
             confirm = True
 
         if confirm:
-            self.stdout.write('Clearing indices...')
-            clear_indices(using=using, confirm=confirm)
-
-            self.stdout.write('Bulk indexing...')
-            bulk_indexing(using=using)
+            self.stdout.write('Rebuilding indices...')
+            reindex(
+                using=using,
+                chunk_size=max(options.get('chunk_size'), 1),
+                processes=max(options.get('processes'), 1),
+                thread_count=max(options.get('thread_count'), 1),
+                keep=max(options.get('keep'), 0),
+                logging=True,
+            )
 
             self.stdout.write('Successfully reset indices.')
         else:
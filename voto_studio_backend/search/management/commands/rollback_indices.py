@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from voto_studio_backend.search.indexing import rollback
+
+
+class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('using', type=str)
+        parser.add_argument('--bypass', action='store', dest='bypass', help='Bypass the confirmation step')
+
+    def handle(self, *args, **options):
+        using = options.get('using')
+
+        if not options.get('bypass'):
+            ans = input(f'This will roll back ALL indices on the {using} alias! Do you wish to continue? [y/N] ')
+            confirm = ans.lower() == 'y'
+        else:
+            confirm = True
+
+        if confirm:
+            self.stdout.write('Rolling back indices...')
+            rolled_back = rollback(using=using)
+
+            for model_label, index_name in rolled_back.items():
+                self.stdout.write(f'{model_label} -> {index_name}')
+            self.stdout.write(f'Successfully rolled back {len(rolled_back)} indices.')
+        else:
+            self.stdout.write('Cancelled.')
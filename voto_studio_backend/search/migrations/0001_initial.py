@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-18 14:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=128, verbose_name='Model label')),
+                ('instance_id', models.PositiveIntegerField(verbose_name='Instance id')),
+                ('action', models.CharField(choices=[('index', 'index'), ('delete', 'delete')], default='index', max_length=16, verbose_name='Action')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of creation')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=128, unique=True, verbose_name='Model label')),
+                ('watermark', models.DateTimeField(verbose_name='Date up to which changes have been indexed')),
+                ('indexed', models.PositiveIntegerField(default=0, verbose_name='Number of documents indexed by the last run')),
+                ('deleted', models.PositiveIntegerField(default=0, verbose_name='Number of documents deleted by the last run')),
+                ('date_updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date of the last run')),
+            ],
+        ),
+    ]
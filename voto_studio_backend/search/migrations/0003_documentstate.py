@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-18 17:55
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_indexwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=128, verbose_name='Model label')),
+                ('instance_id', models.PositiveIntegerField(verbose_name='Instance id')),
+                ('digests', django.contrib.postgres.fields.jsonb.JSONField(default=dict, verbose_name='Digest of each field')),
+                ('date_indexed', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date the document was last indexed')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='documentstate',
+            unique_together={('model_label', 'instance_id')},
+        ),
+    ]
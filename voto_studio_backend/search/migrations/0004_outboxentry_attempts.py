@@ -0,0 +1,28 @@
+# Generated by Django 2.1.7 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_documentstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxentry',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Failed attempts'),
+        ),
+        migrations.AddField(
+            model_name='outboxentry',
+            name='last_error',
+            field=models.TextField(blank=True, default=str, verbose_name='Last error'),
+        ),
+        migrations.AddField(
+            model_name='outboxentry',
+            name='parked',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Parked'),
+        ),
+    ]
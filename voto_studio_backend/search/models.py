@@ -1,13 +1,33 @@
-from itertools import permutations
+import logging
+import time
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.core.cache import cache
+from django.db import connections, models, transaction
 from django.http import Http404
-from elasticsearch.exceptions import NotFoundError
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from elasticsearch.exceptions import ConnectionError as ElasticsearchConnectionError, NotFoundError
 from elasticsearch_dsl import Search, Q, Completion
 
-from .indexing import build_index_name, get_document_class
+from .indexing import build_index_name, get_document_class, get_stale_dependencies, index_instances
 from .utils import get_fields
+from shared.db import bulk_upsert
+from shared.utils import get_model
+
+
+logger = logging.getLogger(__name__)
+
+
+OUTBOX_INDEX = 'index'
+OUTBOX_DELETE = 'delete'
+
+
+OUTBOX_ACTION_OPTIONS = (
+    (OUTBOX_INDEX, OUTBOX_INDEX),
+    (OUTBOX_DELETE, OUTBOX_DELETE),
+)
 
 
 def _get_search_type(terms):
@@ -54,7 +74,40 @@ class IndexingMixin:
     Mixin that adds methods allowing a model
     to be indexed by Elasticsearch.
     """
-    def get_kwargs(self):
+    @classmethod
+    def get_indexing_context(cls, instances, using=settings.STUDIO_DB, method_fields=None, media=True):
+        """
+        Compute the media and the method fields of the documents of a chunk of instances
+        with a few queries for the whole chunk. Models can compute a method field in bulk
+        with a ``prefetch_<method_field_name>(instances, using)`` classmethod returning
+        the values by instance id, method fields without one are computed per instance.
+        Only the ``method_fields`` given are computed, all of them by default, and the
+        media only if ``media`` is set.
+        """
+        from voto_studio_backend.media.views import FIELD_SERIALIZER_MAP
+
+        media_field_names = {field_name for instance in instances for field_name in instance.order} if media else ()
+        media = {}
+        for field_name in media_field_names:
+            ids = {media_id for instance in instances for media_id in instance.order[field_name]}
+            media_instances = list(cls._meta.get_field(field_name).related_model.objects.filter(id__in=ids))
+            data = FIELD_SERIALIZER_MAP[field_name](media_instances, many=True).data
+            media[field_name] = {media_instance.id: item for media_instance, item in zip(media_instances, data)}
+
+        if method_fields is None:
+            method_fields = getattr(cls, 'search_method_fields', ())
+        methods = {}
+        for method_field_name in method_fields:
+            prefetch = getattr(cls, f'prefetch_{method_field_name}', None)
+            if prefetch is not None:
+                methods[method_field_name] = prefetch(instances, using=using)
+
+        return {
+            'media': media,
+            'methods': methods,
+        }
+
+    def get_kwargs(self, context=None, method_fields=None):
         from voto_studio_backend.forms.views import parse_value
 
         excluded_fields = (
@@ -80,47 +133,87 @@ class IndexingMixin:
                         field.name: parse_value(field, getattr(self, field.name)),
                     })
 
-        if hasattr(self, 'search_method_fields'):
-            for method_field_name in self.search_method_fields:
+        ret.update(self.get_method_values(context=context, method_fields=method_fields))
+
+        return ret
+
+    def get_method_values(self, context=None, method_fields=None):
+        """
+        Return the values of the ``method_fields`` of the document, all of its
+        ``search_method_fields`` by default.
+        """
+        if method_fields is None:
+            method_fields = getattr(self, 'search_method_fields', ())
+
+        ret = {}
+        for method_field_name in method_fields:
+            if context is not None and method_field_name in context['methods']:
+                method_field_value = context['methods'][method_field_name].get(self.id)
+            else:
                 try:
                     method_field_value = getattr(self, f'get_{method_field_name}')()
                 except (Http404, KeyError):
                     method_field_value = None
-                ret.update({
-                    method_field_name: method_field_value,
-                })
+            ret.update({
+                method_field_name: method_field_value,
+            })
 
         return ret
 
-    def get_media(self):
+    @classmethod
+    def get_stale_method_fields(cls, changed):
+        """
+        Return the method fields that have to be computed again once the fields or the
+        dependencies named in ``changed`` have changed. A method field is only stale when
+        one of its inputs, as declared by ``search_method_field_inputs``, has changed.
+        Method fields without declared inputs are always stale.
+        """
+        method_field_inputs = getattr(cls, 'search_method_field_inputs', {})
+
+        return [method_field_name for method_field_name in getattr(cls, 'search_method_fields', ())
+                if method_field_name not in method_field_inputs or
+                set(method_field_inputs[method_field_name]) & set(changed)]
+
+    def get_media(self, context=None):
         from voto_studio_backend.media.views import FIELD_SERIALIZER_MAP
 
         ret = {}
         for field_name, id_list in self.order.items():
-            media_model_class = getattr(self, field_name).model
-            media_instances = media_model_class.objects.filter(id__in=id_list)
-            ret.update({field_name: FIELD_SERIALIZER_MAP[field_name](media_instances, many=True).data})
+            if context is not None:
+                media = context['media'].get(field_name, {})
+                ret.update({field_name: [media[media_id] for media_id in id_list if media_id in media]})
+            else:
+                media_model_class = getattr(self, field_name).model
+                media_instances = media_model_class.objects.filter(id__in=id_list)
+                ret.update({field_name: FIELD_SERIALIZER_MAP[field_name](media_instances, many=True).data})
 
         return ret
 
     def get_user(self):
-        user = getattr(self, 'user', None)
-        if user is not None:
-            return user.id
-        return None
+        # The id is read from the foreign key column rather than from the user.
+        return getattr(self, 'user_id', None)
+
+    def get_autocomplete_input(self):
+        """
+        Return the inputs whose prefixes complete to this instance: the value of its
+        ``search_autocomplete_field`` from each of its first ``AUTOCOMPLETE_MAX_INPUTS``
+        words on, so a later word can be completed too without every permutation of
+        the words being indexed.
+        """
+        words = (getattr(self, self.search_autocomplete_field, None) or '').split()
+
+        return [' '.join(words[i:]) for i in range(min(len(words), settings.AUTOCOMPLETE_MAX_INPUTS))]
 
     def get_suggest(self):
-        search_autocomplete_field = self.search_autocomplete_field
-        search_autocomplete_value = getattr(self, search_autocomplete_field, '')
-        if search_autocomplete_value is not None:
+        """
+        Return the completion suggester's inputs for this instance. Instances related
+        to more instances, see ``network.centrality``, are suggested first.
+        """
+        search_autocomplete_input = self.get_autocomplete_input()
+        if len(search_autocomplete_input):
             return {
-                # 'input': [
-                #     ' '.join(p) for p in permutations(search_autocomplete_value.split(), r=2)
-                # ],
-                'input': [
-                    search_autocomplete_value,
-                ],
-                'weight': 0.5,
+                'input': search_autocomplete_input,
+                'weight': 1 + int(getattr(self, 'degree', 0)),
             }
         else:
             return {
@@ -128,33 +221,62 @@ class IndexingMixin:
                 'weight': 0,
             }
 
-    def create_document(self, using=settings.STUDIO_DB):
+    def get_values(self, context=None, method_fields=None, media=True):
+        """
+        Return the fields of the document, with only the ``method_fields`` given,
+        all of them by default, and the media only if ``media`` is set.
+        """
+        values = {
+            'user': self.get_user(),
+            'suggest': self.get_suggest(),
+            **self.get_kwargs(context=context, method_fields=method_fields),
+        }
+        if media:
+            values['media'] = self.get_media(context=context)
+
+        return values
+
+    def get_document(self, using=settings.STUDIO_DB, context=None, values=None):
+        """
+        Build the document for this instance without sending it to Elasticsearch.
+        ``context`` is the ``get_indexing_context`` of a chunk of instances including it,
+        ``values`` the ``get_values`` of the instance if they are already computed.
+        """
         model_label = self._meta.label
+        if values is None:
+            values = self.get_values(context=context)
         obj = get_document_class(model_label, using=using)(
             meta={'id': self.id},
             model_label=model_label,
             size='full',
-            user=self.get_user(),
-            media=self.get_media(),
-            # suggest=self.get_suggest(),
-            **self.get_kwargs(),
+            **values,
         )
+
+        return obj
+
+    def get_action(self, using=settings.STUDIO_DB, context=None):
+        """
+        Build the bulk index action of this instance's document. Bulk indexing
+        only sends actions, so each document is written to Elasticsearch once.
+        """
+        document = self.get_document(using=using, context=context)
+        document.full_clean()
+
+        return document.to_dict(include_meta=True)
+
+    def create_document(self, using=settings.STUDIO_DB):
+        model_label = self._meta.label
+        obj = self.get_document(using=using)
         obj.save(index=build_index_name(model_label=model_label, using=using))
 
         return obj.to_dict(include_meta=True)
 
     def update_document(self, using=settings.STUDIO_DB):
-        model_label = self._meta.label
-        document_class = get_document_class(model_label, using=using)
-        document = document_class.get(id=self.id, index=build_index_name(model_label=model_label, using=using))
-        document.update(
-            user=self.get_user(),
-            media=self.get_media(),
-            # suggest=self.get_suggest(),
-            **self.get_kwargs(),
-        )
-
-        return document
+        """
+        Send the fields of this instance's document that changed since it was last
+        indexed, without reading the document back, see ``get_chunk_updates``.
+        """
+        index_instances([self], using=using)
 
     def delete_document(self, using=settings.STUDIO_DB):
         try:
@@ -162,3 +284,314 @@ class IndexingMixin:
             query.delete()
         except NotFoundError:
             pass
+
+
+def _get_flush_stats_key(using):
+    return f'search-outbox-flush-{using}'
+
+
+def _get_pause_key(using):
+    return f'search-outbox-paused-{using}'
+
+
+class OutboxEntryManager(models.Manager):
+    """Custom model manager for OutboxEntry"""
+    def enqueue(self, entries, using):
+        """
+        Record that the documents of some instances need to be indexed or deleted. ``entries``
+        is a list of ``(model_label, instance_id, action)`` tuples. The rows are written on the
+        same database, and so in the same transaction, as the instances. A flush is scheduled
+        for when that transaction commits, once per transaction.
+        """
+        if not len(entries):
+            return
+
+        self.using(using).bulk_create([
+            self.model(model_label=model_label, instance_id=instance_id, action=action)
+            for model_label, instance_id, action in entries
+        ])
+
+        connection = connections[using]
+        if any(getattr(func, 'is_outbox_flush', False) for _, func in connection.run_on_commit):
+            return
+
+        def _flush():
+            try:
+                self.flush(using=using)
+            except Exception:
+                # The entries are kept, they will be sent by the next flush.
+                logger.exception(f'Failed to flush the search outbox of {using}.')
+        _flush.is_outbox_flush = True
+        transaction.on_commit(_flush, using=using)
+
+    def pause(self, using, timeout=6 * 60 * 60):
+        """
+        Stop flushing the entries of a database, e.g. while its indices are rebuilt. The
+        entries are kept until ``resume`` is called, or until ``timeout`` seconds have passed.
+        """
+        cache.set(_get_pause_key(using), True, timeout)
+
+    def resume(self, using):
+        cache.delete(_get_pause_key(using))
+
+    def is_paused(self, using):
+        return bool(cache.get(_get_pause_key(using)))
+
+    def flush(self, using, batch_size=1000):
+        """
+        Send the pending entries to Elasticsearch. Entries are coalesced so each instance
+        is indexed or deleted once per batch, using a single bulk request, and are only
+        deleted once the request succeeds. The instances depending on the indexed ones,
+        see ``get_dependents``, are indexed in the same request. Only the fields that changed
+        since the documents were last indexed are sent, see ``get_chunk_updates``. Entries
+        locked by another flush are skipped. Returns the number of entries flushed, nothing is
+        flushed while paused.
+
+        When a batch fails its instances are sent one at a time, so the others go through.
+        The entries of an instance that fails count an attempt and are left for the next
+        flush, or parked after ``OUTBOX_MAX_ATTEMPTS`` attempts, see ``retry_parked``. If
+        Elasticsearch can't be reached the entries are kept as they are and the error is
+        raised.
+        """
+        if self.is_paused(using):
+            return 0
+
+        start = time.time()
+        flushed = 0
+        failed_ids = set()
+        while True:
+            with transaction.atomic(using=using):
+                entries = list(self
+                               .using(using)
+                               .select_for_update(skip_locked=True)
+                               .filter(parked=False)
+                               .exclude(id__in=failed_ids)
+                               .order_by('id')[:batch_size])
+                if not len(entries):
+                    break
+
+                try:
+                    with transaction.atomic(using=using):
+                        self._send(entries, using=using)
+                    flushed += len(entries)
+                    continue
+                except ElasticsearchConnectionError:
+                    raise
+                except Exception:
+                    logger.exception(f'Failed to flush a batch of the search outbox of {using}, '
+                                     f'flushing its instances one at a time.')
+
+                entries_by_instance = {}
+                for entry in entries:
+                    entries_by_instance.setdefault((entry.model_label, entry.instance_id), []).append(entry)
+                for instance_entries in entries_by_instance.values():
+                    try:
+                        with transaction.atomic(using=using):
+                            self._send(instance_entries, using=using)
+                        flushed += len(instance_entries)
+                    except ElasticsearchConnectionError:
+                        raise
+                    except Exception as e:
+                        self._record_attempt(instance_entries, e, using=using)
+                        failed_ids.update(entry.id for entry in instance_entries)
+
+        cache.set(_get_flush_stats_key(using), {
+            'date': timezone.now().isoformat(),
+            'entries': flushed,
+            'latency': time.time() - start,
+        }, None)
+
+        return flushed
+
+    def _send(self, entries, using):
+        """
+        Send a batch of entries to Elasticsearch and delete them.
+        """
+        latest_actions = {}
+        for entry in entries:
+            latest_actions[(entry.model_label, entry.instance_id)] = entry.action
+
+        ids_by_label = {}
+        deleted = []
+        for (model_label, instance_id), action in latest_actions.items():
+            if action == OUTBOX_INDEX:
+                ids_by_label.setdefault(model_label, set()).add(instance_id)
+            else:
+                deleted.append((model_label, instance_id))
+
+        # The documents that embed data of the indexed instances are indexed
+        # again in the same request, once each.
+        stale_dependencies = get_stale_dependencies(ids_by_label, using=using)
+        for model_label, dependencies in stale_dependencies.items():
+            dependent_ids = set(dependencies) - {i for label, i in deleted if label == model_label}
+            ids_by_label.setdefault(model_label, set()).update(dependent_ids)
+
+        instances = []
+        for model_label, instance_ids in ids_by_label.items():
+            model_class = get_model(model_label=model_label)
+            found = model_class.objects \
+                .using(using) \
+                .select_related(*getattr(model_class, 'search_select_related', ())) \
+                .in_bulk(list(instance_ids))
+            instances.extend(found.values())
+            # Instances deleted since they were saved lose their document.
+            deleted.extend((model_label, i) for i in instance_ids if i not in found)
+
+        index_instances(instances, using=using, deleted=deleted, stale_dependencies=stale_dependencies)
+        self.using(using).filter(id__in=[entry.id for entry in entries]).delete()
+
+    def _record_attempt(self, entries, error, using):
+        """
+        Count a failed attempt on the entries of an instance, parking them once
+        they reach ``OUTBOX_MAX_ATTEMPTS`` attempts.
+        """
+        entry_ids = [entry.id for entry in entries]
+        self.using(using).filter(id__in=entry_ids).update(attempts=models.F('attempts') + 1, last_error=str(error))
+        parked = self \
+            .using(using) \
+            .filter(id__in=entry_ids, attempts__gte=settings.OUTBOX_MAX_ATTEMPTS) \
+            .update(parked=True)
+        if parked:
+            logger.error(f'Parked {parked} search outbox entries of {entries[0].model_label} '
+                         f'{entries[0].instance_id} on {using}: {error}')
+
+    def retry_parked(self, using):
+        """
+        Queue the parked entries again, e.g. once the error that parked them is fixed.
+        Returns the number of entries queued.
+        """
+        return self.using(using).filter(parked=True).update(parked=False, attempts=0, last_error='')
+
+    def get_stats(self, using):
+        """
+        Return the number of pending and parked entries, the lag in seconds of the
+        oldest pending one and the stats of the latest flush of the given database.
+        """
+        pending = self \
+            .using(using) \
+            .filter(parked=False) \
+            .aggregate(count=models.Count('id'), oldest=models.Min('date_created'))
+
+        return {
+            'pending': pending['count'],
+            'parked': self.using(using).filter(parked=True).count(),
+            'lag': (timezone.now() - pending['oldest']).total_seconds() if pending['oldest'] else 0,
+            'last_flush': cache.get(_get_flush_stats_key(using)),
+            'paused': self.is_paused(using),
+        }
+
+
+class OutboxEntry(models.Model):
+    """
+    A pending Elasticsearch update for an instance. Entries are written in the
+    same transaction as the instance so the index follows what was committed.
+    """
+    model_label = models.CharField(_('Model label'), max_length=128)
+    instance_id = models.PositiveIntegerField(_('Instance id'))
+    action = models.CharField(_('Action'), max_length=16, choices=OUTBOX_ACTION_OPTIONS, default=OUTBOX_INDEX)
+    date_created = models.DateTimeField(_('Date of creation'), default=timezone.now)
+    attempts = models.PositiveIntegerField(_('Failed attempts'), default=0)
+    last_error = models.TextField(_('Last error'), blank=True, default=str)
+    parked = models.BooleanField(_('Parked'), default=False, db_index=True)
+
+    objects = OutboxEntryManager()
+
+    def __str__(self):
+        return f'{self.action} {self.model_label} {self.instance_id}'
+
+
+class IndexWatermarkManager(models.Manager):
+    """Custom model manager for IndexWatermark"""
+    def get_watermark(self, model_label, using):
+        """
+        Return the date up to which the instances of a model have been indexed,
+        or ``None`` if they never have been.
+        """
+        watermark = self.using(using).filter(model_label=model_label).first()
+
+        return watermark.watermark if watermark is not None else None
+
+    def advance(self, model_label, using, watermark, indexed=0, deleted=0):
+        self.using(using).update_or_create(model_label=model_label, defaults={
+            'watermark': watermark,
+            'indexed': indexed,
+            'deleted': deleted,
+            'date_updated': timezone.now(),
+        })
+
+
+class IndexWatermark(models.Model):
+    """
+    The date up to which the changes to the instances of a model have been indexed, stored
+    on the database the instances are indexed from. It only moves forward once a run succeeds.
+    """
+    model_label = models.CharField(_('Model label'), max_length=128, unique=True)
+    watermark = models.DateTimeField(_('Date up to which changes have been indexed'))
+    indexed = models.PositiveIntegerField(_('Number of documents indexed by the last run'), default=0)
+    deleted = models.PositiveIntegerField(_('Number of documents deleted by the last run'), default=0)
+    date_updated = models.DateTimeField(_('Date of the last run'), default=timezone.now)
+
+    objects = IndexWatermarkManager()
+
+    def __str__(self):
+        return f'{self.model_label} <{self.watermark}>'
+
+
+class DocumentStateManager(models.Manager):
+    """Custom model manager for DocumentState"""
+    def get_digests(self, model_label, instance_ids, using):
+        """
+        Return the field digests of the documents of some instances, by instance id. The
+        instances whose document was never indexed, or whose state was forgotten, are left out.
+        """
+        states = self \
+            .using(using) \
+            .filter(model_label=model_label, instance_id__in=list(instance_ids)) \
+            .values_list('instance_id', 'digests')
+
+        return dict(states)
+
+    def record(self, model_label, digests, using):
+        """
+        Record the field digests of the documents just indexed, by instance
+        id, with a single upsert per batch of documents.
+        """
+        now = timezone.now()
+        bulk_upsert(self.model, [
+            self.model(model_label=model_label, instance_id=instance_id, digests=instance_digests, date_indexed=now)
+            for instance_id, instance_digests in digests.items()
+        ], using=using, unique_fields=('model_label', 'instance_id'))
+
+    def forget(self, using, model_label=None, instance_ids=None):
+        """
+        Forget the states of some documents, of every document of a model if no ``instance_ids``
+        are given and of every document if no ``model_label`` is given either. Their next update
+        sends the whole document. States are forgotten whenever documents are written, or may
+        have been lost, by anything else than the outbox, so they never claim a field is indexed
+        when it isn't.
+        """
+        states = self.using(using).all()
+        if model_label is not None:
+            states = states.filter(model_label=model_label)
+        if instance_ids is not None:
+            states = states.filter(instance_id__in=instance_ids)
+        states.delete()
+
+
+class DocumentState(models.Model):
+    """
+    The digests of the fields of a document as it was last indexed, stored on the database the
+    instance is indexed from. They allow an update to only send the fields that changed.
+    """
+    model_label = models.CharField(_('Model label'), max_length=128)
+    instance_id = models.PositiveIntegerField(_('Instance id'))
+    digests = JSONField(_('Digest of each field'), default=dict)
+    date_indexed = models.DateTimeField(_('Date the document was last indexed'), default=timezone.now)
+
+    objects = DocumentStateManager()
+
+    class Meta:
+        unique_together = ('model_label', 'instance_id')
+
+    def __str__(self):
+        return f'{self.model_label} {self.instance_id}'
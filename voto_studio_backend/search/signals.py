@@ -2,6 +2,8 @@ from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from .models import OUTBOX_DELETE, OUTBOX_INDEX, OutboxEntry
+
 
 def to_index(sender, instance, using=settings.STUDIO_DB):
     if not getattr(instance, 'to_index', True):
@@ -19,15 +21,12 @@ def create_or_update_document(sender, instance, created, using, **kwargs):
     if not to_index(sender, instance, using=using):
         return
 
-    if created:
-        obj = instance.create_document(using=using)
-    else:
-        obj = instance.update_document(using=using)
+    OutboxEntry.objects.enqueue([(sender._meta.label, instance.id, OUTBOX_INDEX)], using=using)
 
 
 @receiver(post_delete)
 def delete_document(sender, instance, using, **kwargs):
-    if not to_index(sender, instance):
+    if not to_index(sender, instance, using=using):
         return
 
-    obj = instance.delete_document(using=using)
+    OutboxEntry.objects.enqueue([(sender._meta.label, instance.id, OUTBOX_DELETE)], using=using)
@@ -0,0 +1,254 @@
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+from elasticsearch.exceptions import TransportError
+from elasticsearch_dsl import Search
+
+from .indexing import MODELS_TO_INDEX, build_index_name
+from shared.utils import get_model
+
+
+logger = logging.getLogger(__name__)
+
+
+MAIN_SITE_DB = settings.MAIN_SITE_DB
+
+
+SUGGEST_ELASTICSEARCH = 'elasticsearch'
+SUGGEST_TRIE = 'trie'
+
+
+def normalize(text):
+    """
+    Lowercase a text and strip its accents, like the ``ascii_fold`` analyzer.
+    """
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c)).lower()
+
+
+def get_autocomplete_models(model_labels=None):
+    """
+    Return the labels of the indexed models that can be autocompleted, only
+    the ones in ``model_labels`` if given.
+    """
+    return [model_label for model_label in MODELS_TO_INDEX
+            if (model_labels is None or model_label in model_labels) and
+            getattr(get_model(model_label=model_label), 'search_autocomplete_field', None)]
+
+
+class PrefixTrie:
+    """
+    The autocomplete inputs of the instances of one model, held in memory to suggest
+    instances while Elasticsearch is slow. The trie is flattened to keep it small: the
+    nodes of its first ``depth`` levels hold the ``size`` heaviest instances below them,
+    so short prefixes, which match the most inputs, are looked up directly. Longer
+    prefixes are looked up by bisecting the sorted inputs.
+    """
+    def __init__(self, entries, size=25, depth=3):
+        """
+        ``entries`` are the ``(input, weight, instance_id, text)`` of the instances.
+        """
+        entries = sorted((normalize(search_autocomplete_input), weight, instance_id, text)
+                         for search_autocomplete_input, weight, instance_id, text in entries)
+        self.keys = [entry[0] for entry in entries]
+        self.suggestions = [entry[1:] for entry in entries]
+        self.size = size
+        self.depth = depth
+
+        heads = {}
+        for key, suggestion in zip(self.keys, self.suggestions):
+            for length in range(1, min(len(key), depth) + 1):
+                _add(heads.setdefault(key[:length], {}), suggestion)
+        self.heads = {prefix: _get_heaviest(suggestions.values(), size) for prefix, suggestions in heads.items()}
+
+    @classmethod
+    def load(cls, model_label, using=MAIN_SITE_DB, size=25):
+        """
+        Build the trie of a model from the instances of the ``using`` database, with
+        the same inputs and weights as their documents' suggestions.
+        """
+        model_class = get_model(model_label=model_label)
+        fields = ['id', model_class.search_autocomplete_field]
+        if hasattr(model_class, 'degree'):
+            fields.append('degree')
+
+        entries = []
+        for instance in model_class.objects.using(using).filter(tracked=True).only(*fields).iterator():
+            suggest = instance.get_suggest()
+            text = getattr(instance, model_class.search_autocomplete_field)
+            entries.extend((search_autocomplete_input, suggest['weight'], instance.id, text)
+                           for search_autocomplete_input in suggest['input'])
+
+        return cls(entries, size=size)
+
+    def lookup(self, text, size=10):
+        """
+        Return the ``(weight, instance_id, text)`` of the heaviest instances with
+        an input starting with ``text``, the heaviest first.
+        """
+        prefix = ' '.join(normalize(text).split())
+        if not prefix:
+            return []
+        if len(prefix) <= self.depth:
+            return self.heads.get(prefix, [])[:size]
+
+        suggestions = {}
+        start = bisect_left(self.keys, prefix)
+        for key, suggestion in zip(islice(self.keys, start, None), islice(self.suggestions, start, None)):
+            if not key.startswith(prefix):
+                break
+            _add(suggestions, suggestion)
+
+        return _get_heaviest(suggestions.values(), size)
+
+
+def _add(suggestions, suggestion):
+    # An instance is only suggested once, whichever of its inputs matched.
+    suggestions.setdefault(suggestion[1], suggestion)
+
+
+def _get_heaviest(suggestions, size):
+    return heapq.nlargest(size, suggestions, key=lambda suggestion: suggestion[0])
+
+
+_tries = {}
+_tries_lock = threading.Lock()
+_warming = set()
+
+
+def _load_tries(using):
+    tries = {model_label: PrefixTrie.load(model_label, using=using) for model_label in get_autocomplete_models()}
+
+    return time.time(), tries
+
+
+def get_tries(using=MAIN_SITE_DB):
+    """
+    Return this process' tries of the ``using`` database by model label,
+    loading them from the database if they haven't been yet.
+    """
+    with _tries_lock:
+        if using not in _tries:
+            _tries[using] = _load_tries(using)
+
+        return _tries[using][1]
+
+
+def warm_tries(using=MAIN_SITE_DB):
+    """
+    Rebuild this process' tries of the ``using`` database in a background thread if they
+    are missing or older than ``AUTOCOMPLETE_TRIE_REFRESH_INTERVAL`` seconds, so they
+    are ready by the time Elasticsearch is slow. The current tries are used meanwhile.
+    """
+    with _tries_lock:
+        loaded = _tries.get(using)
+        if using in _warming or (loaded is not None and
+                                 time.time() - loaded[0] < settings.AUTOCOMPLETE_TRIE_REFRESH_INTERVAL):
+            return
+        _warming.add(using)
+
+    def _warm():
+        try:
+            tries = _load_tries(using)
+            with _tries_lock:
+                _tries[using] = tries
+        except Exception:
+            logger.exception(f'Failed to warm the autocomplete tries of {using}.')
+        finally:
+            with _tries_lock:
+                _warming.discard(using)
+
+    threading.Thread(target=_warm, daemon=True).start()
+
+
+def _get_model_label(index_name, labels_by_alias):
+    # The hits name the versioned index rather than the alias.
+    return labels_by_alias.get(index_name) or labels_by_alias.get(index_name.rsplit('-v', 1)[0])
+
+
+def suggest_elasticsearch(text, model_labels, size=10, using=MAIN_SITE_DB):
+    """
+    Suggest instances with a single request, which combines the completion suggester,
+    matching the start of the inputs, with a match on the edge n-grams of the autocomplete
+    fields, matching the start of any of their words in any order. The completions come
+    first. Raises a ``TransportError`` if Elasticsearch doesn't answer within
+    ``AUTOCOMPLETE_TIMEOUT`` seconds.
+    """
+    labels_by_alias = {build_index_name(model_label, using=using): model_label for model_label in model_labels}
+    fields = {model_label: get_model(model_label=model_label).search_autocomplete_field
+              for model_label in model_labels}
+
+    search = Search(index=list(labels_by_alias)) \
+        .params(request_timeout=settings.AUTOCOMPLETE_TIMEOUT) \
+        .source(list(set(fields.values()))) \
+        .suggest('autocomplete', text, completion={'field': 'suggest', 'size': size, 'skip_duplicates': True}) \
+        .query('multi_match', query=text, fields=[f'{field}.prefix' for field in set(fields.values())],
+               operator='and')[:size]
+    response = search.execute()
+
+    results, seen = [], set()
+    options = [(option._index, option._id, option._source, option._score)
+               for option in response.suggest.autocomplete[0].options]
+    hits = [(hit.meta.index, hit.meta.id, hit, hit.meta.score) for hit in response.hits]
+    for index_name, instance_id, source, score in options + hits:
+        model_label = _get_model_label(index_name, labels_by_alias)
+        if model_label is None or (model_label, instance_id) in seen:
+            continue
+        seen.add((model_label, instance_id))
+        results.append({
+            'model_label': model_label,
+            'id': int(instance_id),
+            'text': getattr(source, fields[model_label], None),
+            'score': score,
+        })
+
+    return results[:size]
+
+
+def suggest_trie(text, model_labels, size=10, using=MAIN_SITE_DB):
+    """
+    Suggest instances from this process' tries, the heaviest first.
+    """
+    tries = get_tries(using=using)
+    suggestions = [(weight, model_label, instance_id, suggestion_text)
+                   for model_label in model_labels if model_label in tries
+                   for weight, instance_id, suggestion_text in tries[model_label].lookup(text, size=size)]
+
+    return [{
+        'model_label': model_label,
+        'id': instance_id,
+        'text': suggestion_text,
+        'score': weight,
+    } for weight, model_label, instance_id, suggestion_text in _get_heaviest(suggestions, size)]
+
+
+def suggest(text, model_labels=None, size=10, using=MAIN_SITE_DB):
+    """
+    Suggest the instances of ``model_labels``, by default of every model that can be
+    autocompleted, completing ``text``. They come from Elasticsearch unless it fails
+    or is slow, then from the tries of this process. Returns the suggestions and
+    where they come from.
+    """
+    model_labels = get_autocomplete_models(model_labels)
+    if not len(model_labels):
+        return {
+            'results': [],
+            'source': None,
+        }
+
+    try:
+        results, source = suggest_elasticsearch(text, model_labels, size=size, using=using), SUGGEST_ELASTICSEARCH
+        warm_tries(using=using)
+    except TransportError:
+        logger.warning(f'Elasticsearch failed to suggest completions of {text!r}, falling back to the tries.')
+        results, source = suggest_trie(text, model_labels, size=size, using=using), SUGGEST_TRIE
+
+    return {
+        'results': results,
+        'source': source,
+    }
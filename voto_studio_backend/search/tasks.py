@@ -0,0 +1,10 @@
+from django.conf import settings
+
+from .indexing import incremental_indexing as _incremental_indexing
+
+
+def incremental_indexing(job, using=settings.MAIN_SITE_DB):
+    """
+    Index the changes made since the last run, as a safety net for the outbox.
+    """
+    return _incremental_indexing(using=using)
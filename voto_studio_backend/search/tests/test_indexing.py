@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+from ..indexing import get_chunk_actions, get_chunk_updates, get_dependents
+from ..models import DocumentState, IndexWatermark
+from shared.testing.test_app.models import BasicModel
+from shared.testing.utils import create_instance
+from voto_studio_backend.corruption.models import FinancialItem
+from voto_studio_backend.media.models import Video
+from voto_studio_backend.political.models import Individual, Organization, Promise
+from voto_studio_backend.users.models import User
+
+
+class IndexingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+        for _ in range(3):
+            create_instance(user=self.user)
+
+    def test_get_chunk_actions(self):
+        instances = list(BasicModel.objects.all())
+        expected = [instance.get_action() for instance in instances]
+
+        # The user is never loaded and the model has no media or method fields.
+        with self.assertNumQueries(0):
+            actions = get_chunk_actions(instances)
+
+        self.assertEqual(actions, expected)
+        self.assertEqual([action['_id'] for action in actions], [instance.id for instance in instances])
+        self.assertEqual(actions[0]['_source']['user'], self.user.id)
+
+    def test_watermark(self):
+        model_label = BasicModel._meta.label
+        self.assertIsNone(IndexWatermark.objects.get_watermark(model_label, using=settings.STUDIO_DB))
+
+        first, second = timezone.now() - timedelta(minutes=5), timezone.now()
+        IndexWatermark.objects.advance(model_label, settings.STUDIO_DB, first, indexed=3)
+        IndexWatermark.objects.advance(model_label, settings.STUDIO_DB, second, deleted=1)
+
+        self.assertEqual(IndexWatermark.objects.get_watermark(model_label, using=settings.STUDIO_DB), second)
+        self.assertEqual(IndexWatermark.objects.using(settings.STUDIO_DB).get(model_label=model_label).deleted, 1)
+
+    def test_date_modified(self):
+        instance = BasicModel.objects.first()
+        date_modified = instance.date_modified
+        instance.char_field = 'Foo'
+        instance.save()
+
+        self.assertGreater(instance.date_modified, date_modified)
+
+    def test_get_dependents(self):
+        financial_item = FinancialItem.objects.create(title='Foo', amount=10, user=self.user)
+        individual = Individual.objects.create(name='Bar', user=self.user)
+        promise = Promise.objects.create(title='Baz', user=self.user)
+        individual.add_rel(Individual._meta.get_field('financial_items'), financial_item)
+        individual.add_rel(Individual._meta.get_field('promises'), promise)
+
+        dependents = get_dependents({FinancialItem._meta.label: {financial_item.id}})
+        self.assertEqual(dependents[Individual._meta.label], {individual.id})
+        self.assertEqual(dependents[Organization._meta.label], set())
+        self.assertNotIn(Promise._meta.label, dependents)
+
+        dependents = get_dependents({Individual._meta.label: {individual.id}})
+        self.assertEqual(dependents[Promise._meta.label], {promise.id})
+
+    def test_get_chunk_updates(self):
+        instances = list(BasicModel.objects.all())
+
+        # Documents that were never indexed are sent in full.
+        actions, digests = get_chunk_updates(instances)
+        self.assertEqual(actions, get_chunk_actions(instances))
+        self.assertEqual(set(digests), {instance.id for instance in instances})
+
+        actions, _ = get_chunk_updates(instances, states=digests)
+        self.assertEqual(actions, [])
+
+        instances[0].views += 1
+        instances[1].char_field = 'Foo'
+        actions, updated = get_chunk_updates(instances, states=digests)
+        self.assertEqual([action['_op_type'] for action in actions], ['update', 'update'])
+        self.assertEqual(actions[0]['doc'], {'views': instances[0].views})
+        self.assertEqual(actions[1]['doc']['char_field'], 'Foo')
+        self.assertEqual(actions[1]['doc']['suggest']['input'], ['Foo'])
+        self.assertNotEqual(updated[instances[0].id]['views'], digests[instances[0].id]['views'])
+
+    def test_get_chunk_updates_media(self):
+        instance = BasicModel.objects.first()
+        video = Video.objects.create(title='Foo', user=self.user)
+        instance.order['videos'] = [video.id]
+        _, digests = get_chunk_updates([instance])
+
+        # Editing a media item leaves the instance as it is.
+        Video.objects.filter(id=video.id).update(title='Bar')
+        actions, _ = get_chunk_updates([instance], states=digests)
+        self.assertEqual(list(actions[0]['doc']), ['media'])
+        self.assertEqual(actions[0]['doc']['media']['videos'][0]['title'], 'Bar')
+
+    def test_get_stale_method_fields(self):
+        self.assertEqual(Individual.get_stale_method_fields({'views'}), [])
+        self.assertEqual(Individual.get_stale_method_fields({'financial_items'}), ['related_funds'])
+        self.assertEqual(Individual.get_stale_method_fields({'rels_dict'}), ['campaigns', 'related_funds'])
+
+    def test_document_state(self):
+        model_label = BasicModel._meta.label
+        DocumentState.objects.record(model_label, {1: {'views': 'a'}, 2: {'views': 'b'}}, using=settings.STUDIO_DB)
+        DocumentState.objects.record(model_label, {2: {'views': 'c'}}, using=settings.STUDIO_DB)
+
+        digests = DocumentState.objects.get_digests(model_label, [1, 2, 3], using=settings.STUDIO_DB)
+        self.assertEqual(digests, {1: {'views': 'a'}, 2: {'views': 'c'}})
+
+        DocumentState.objects.forget(settings.STUDIO_DB, model_label=model_label, instance_ids=[1])
+        self.assertEqual(list(DocumentState.objects.get_digests(model_label, [1, 2], using=settings.STUDIO_DB)), [2])
+
+
+class PrefetchTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123',
+            both_db=True,
+        )
+
+    def test_prefetch_method_fields(self):
+        individuals = [Individual.objects.create(name=name, user=self.user) for name in ('Foo', 'Bar')]
+        promise = Promise.objects.create(title='Baz', user=self.user)
+        financial_items = [FinancialItem.objects.create(title='Foo', amount=amount, user=self.user)
+                           for amount in (10, 20)]
+        for individual in individuals:
+            individual.promises.add(promise)
+        individuals[0].financial_items.add(*financial_items)
+
+        # Only the first individual and financial item are relationships, the others are references.
+        Promise.objects.filter(id=promise.id).update(rels_dict={
+            'individuals': {'rels': [individuals[0].id], 'refs': [individuals[1].id]},
+        })
+        Individual.objects.filter(id=individuals[0].id).update(rels_dict={
+            'financial_items': {'rels': [financial_items[0].id], 'refs': [financial_items[1].id]},
+        })
+        # The related funds are read from the main site.
+        for instance in [Individual.objects.get(id=individuals[0].id), *financial_items]:
+            instance.save(using=settings.MAIN_SITE_DB)
+
+        promise = Promise.objects.get(id=promise.id)
+        self.assertEqual(Promise.prefetch_individuals([promise])[promise.id], promise.get_individuals())
+        self.assertEqual(len(promise.get_individuals()), 1)
+
+        individual = Individual.objects.get(id=individuals[0].id)
+        self.assertEqual(Individual.prefetch_related_funds([individual])[individual.id], individual.get_related_funds())
+        self.assertEqual(individual.get_related_funds(), 10)
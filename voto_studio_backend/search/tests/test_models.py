@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, TestCase
+from elasticsearch.exceptions import ConnectionError as ElasticsearchConnectionError
+from ..models import OUTBOX_INDEX, OutboxEntry
+from voto_studio_backend.changes.models import Change
+from voto_studio_backend.corruption.models import FinancialItem
+from voto_studio_backend.political.models import Individual
+from voto_studio_backend.users.models import User
+
+
+class OutboxEntryManagerTests(TestCase):
+    def setUp(self):
+        OutboxEntry.objects.bulk_create([
+            OutboxEntry(model_label='test_app.BasicModel', instance_id=instance_id, action=OUTBOX_INDEX)
+            for instance_id in (1, 2, 2, 3)
+        ])
+
+    @staticmethod
+    def _send(entries, using):
+        # The document of instance 2 can't be indexed.
+        if any(entry.instance_id == 2 for entry in entries):
+            raise ValueError('Foo')
+        OutboxEntry.objects.using(using).filter(id__in=[entry.id for entry in entries]).delete()
+
+    def test_flush_parks_failing_entries(self):
+        using = settings.STUDIO_DB
+        with mock.patch.object(OutboxEntry.objects, '_send', side_effect=self._send):
+            # The instances after the failing one are still flushed.
+            self.assertEqual(OutboxEntry.objects.flush(using=using), 2)
+            self.assertEqual(set(OutboxEntry.objects.values_list('instance_id', 'attempts', 'parked')),
+                             {(2, 1, False)})
+
+            for _ in range(settings.OUTBOX_MAX_ATTEMPTS - 1):
+                OutboxEntry.objects.flush(using=using)
+
+        self.assertEqual(set(OutboxEntry.objects.values_list('instance_id', 'parked', 'last_error')),
+                         {(2, True, 'Foo')})
+        stats = OutboxEntry.objects.get_stats(using=using)
+        self.assertEqual((stats['pending'], stats['parked']), (0, 2))
+
+        self.assertEqual(OutboxEntry.objects.retry_parked(using=using), 2)
+        self.assertEqual(OutboxEntry.objects.get_stats(using=using)['pending'], 2)
+
+    def test_flush_keeps_entries_while_unreachable(self):
+        side_effect = ElasticsearchConnectionError('N/A', 'Foo', None)
+        with mock.patch.object(OutboxEntry.objects, '_send', side_effect=side_effect):
+            with self.assertRaises(ElasticsearchConnectionError):
+                OutboxEntry.objects.flush(using=settings.STUDIO_DB)
+
+        self.assertEqual(OutboxEntry.objects.filter(attempts=0, parked=False).count(), 4)
+
+
+class OutboxDependentsTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123',
+            both_db=True,
+        )
+        self.request = RequestFactory()
+        self.request.user = self.user
+
+    def test_flush_indexes_dependents_on_main_site(self):
+        individual = Individual.objects.create(name='Foo', user=self.user)
+        financial_item = FinancialItem.objects.create(title='Bar', amount=10, user=self.user)
+        individual.add_rel(Individual._meta.get_field('financial_items'), financial_item)
+        Change.objects.bulk_stage_created([individual, financial_item], self.request)
+        Change.objects.bulk_commit(Change.objects.filter(committed=False))
+
+        # Commits don't copy the through tables, only the rels_dict.
+        using = settings.MAIN_SITE_DB
+        self.assertFalse(Individual.financial_items.through.objects.using(using).exists())
+        OutboxEntry.objects.using(using).filter(model_label=Individual._meta.label).delete()
+
+        with mock.patch('voto_studio_backend.search.models.index_instances') as index_instances:
+            OutboxEntry.objects.flush(using=using)
+
+        instances = index_instances.call_args[0][0]
+        self.assertIn((Individual, individual.id), [(type(instance), instance.id) for instance in instances])
+        self.assertEqual(index_instances.call_args[1]['stale_dependencies'][Individual._meta.label],
+                         {individual.id: {'financial_items'}})
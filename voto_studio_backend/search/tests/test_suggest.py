@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+from ..suggest import PrefixTrie
+from shared.testing.test_app.models import BasicModel
+from shared.testing.utils import create_instance
+from voto_studio_backend.users.models import User
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='foo@bar.com',
+            name='Baz',
+            password='Foobarbaz123'
+        )
+
+    def test_get_autocomplete_input(self):
+        instance = BasicModel(char_field='Juan  Carlos Varela')
+        self.assertEqual(instance.get_autocomplete_input(), ['Juan Carlos Varela', 'Carlos Varela', 'Varela'])
+        self.assertEqual(instance.get_suggest()['weight'], 1)
+
+        # The inputs grow linearly with the number of words, up to a bound.
+        instance.char_field = ' '.join(['Foo'] * 20)
+        self.assertEqual(len(instance.get_autocomplete_input()), settings.AUTOCOMPLETE_MAX_INPUTS)
+
+        instance.char_field = ''
+        self.assertEqual(instance.get_suggest(), {'input': [], 'weight': 0})
+
+    def test_prefix_trie(self):
+        entries = []
+        for instance_id, (text, weight) in enumerate([
+            ('Juan Carlos Varela', 5),
+            ('Juana Pérez', 3),
+            ('Carlos Juan', 1),
+            ('José Varela Ávila', 2),
+        ]):
+            words = text.split()
+            entries.extend((' '.join(words[i:]), weight, instance_id, text) for i in range(len(words)))
+        trie = PrefixTrie(entries, size=3, depth=3)
+
+        self.assertEqual([instance_id for _, instance_id, _ in trie.lookup('ju')], [0, 1, 2])
+        self.assertEqual([instance_id for _, instance_id, _ in trie.lookup('juan', size=2)], [0, 1])
+        self.assertEqual([instance_id for _, instance_id, _ in trie.lookup('VARE')], [0, 3])
+        self.assertEqual([instance_id for _, instance_id, _ in trie.lookup('avila')], [3])
+        self.assertEqual([instance_id for _, instance_id, _ in trie.lookup('carlos  va')], [0])
+        self.assertEqual(trie.lookup('zz'), [])
+        self.assertEqual(trie.lookup(' '), [])
+
+    def test_load_prefix_trie(self):
+        instance = create_instance(user=self.user)
+        instance.char_field = 'Qwertyuiop Zxcvbnm'
+        instance.save()
+        trie = PrefixTrie.load(BasicModel._meta.label, using=settings.STUDIO_DB)
+
+        self.assertEqual(trie.lookup('zxcvb'), [(1, instance.id, 'Qwertyuiop Zxcvbnm')])
+
+    @mock.patch('voto_studio_backend.search.views.suggest', return_value=[])
+    def test_suggest_api_size(self, suggest):
+        url = reverse('search:suggest')
+        for size, expected in [(5, 5), (0, 1), (-3, 1), (100, 25)]:
+            response = self.client.get(url, {'q': 'Juan', 'size': size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(suggest.call_args[1]['size'], expected)
+
+        self.assertEqual(self.client.get(url, {'q': 'Juan', 'size': 'foo'}).status_code, 400)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.urls import path
+from . import views
+
+
+app_name = 'search'
+api_v1 = settings.API_URL_V1
+
+
+urlpatterns = [
+    path(
+        f'{api_v1}/outbox_stats/',
+        views.OutboxStatsAPI.as_view(),
+        name='outbox_stats',
+    ),
+    path(
+        f'{api_v1}/suggest/',
+        views.SuggestAPI.as_view(),
+        name='suggest',
+    ),
+]
@@ -1,3 +1,51 @@
-from django.shortcuts import render
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .models import OutboxEntry
+from .suggest import suggest
+from shared.utils import get_int_param
+
+
+class OutboxStatsAPI(APIView):
+    """
+    Class providing API endpoints used to monitor the search outbox.
+    """
+    @staticmethod
+    def get(request):
+        """
+        Return the number of pending outbox entries, the lag of
+        the oldest one and the latency of the latest flush.
+        """
+        if not request.user.is_authenticated:
+            return Response('User not authenticated', status=status.HTTP_401_UNAUTHORIZED)
+
+        response = OutboxEntry.objects.get_stats(using=settings.MAIN_SITE_DB)
+
+        return Response(response, status=status.HTTP_200_OK)
+
+
+class SuggestAPI(APIView):
+    """
+    Class providing the API endpoint used to autocomplete searches.
+    """
+    @staticmethod
+    def get(request):
+        """
+        Return the instances completing the text ``q``, the most related first. ``ml``
+        restricts them to some models and ``size``, at most 25, is the number of instances
+        returned.
+        """
+        text = request.GET.get('q', '').strip()
+        model_labels = request.GET.getlist('ml') or None
+        if not len(text):
+            return Response('No text to complete', status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = get_int_param(request, 'size', default=10, maximum=25)
+        except ValueError as e:
+            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+
+        response = suggest(text, model_labels=model_labels, size=size, using=settings.MAIN_SITE_DB)
+
+        return Response(response, status=status.HTTP_200_OK)
@@ -0,0 +1,19 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0001_initial'),
+    ]
+
+    # ``jsonb_path_ops`` GIN indexes serve the ``@>`` containment
+    # queries of ``TrackedWorkshopModelManager.referencing()``.
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX voting_tutorial_rels_dict_gin ON voting_tutorial USING gin (rels_dict jsonb_path_ops)',
+            reverse_sql='DROP INDEX voting_tutorial_rels_dict_gin',
+        ),
+    ]